@@ -41,6 +41,10 @@ def create_app(config_name=None):
             print(f"❌ Database setup failed: {e}")
             # Continue anyway for demo purposes
     
+    # Share one pooled connection per request, released on teardown
+    from utils.db_connection import init_app as init_db
+    init_db(app)
+    
     # Initialize Flask-Login
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -54,16 +58,11 @@ def create_app(config_name=None):
             with get_db() as db:
                 result = db.execute(
                     "SELECT id, username, full_name, email, role FROM tutors WHERE id = ? AND active = true",
-                    (user_id,)
+                    (user_id,), prepare=True
                 ).fetchone()
                 
                 if result:
-                    if isinstance(result, dict):
-                        return Tutor(result['id'], result['username'], result['full_name'], result['email'], result.get('role', 'tutor'))
-                    else:
-                        # Handle Row object - assume order: id, username, full_name, email, role
-                        role = result[4] if len(result) > 4 else 'tutor'
-                        return Tutor(result[0], result[1], result[2], result[3], role)
+                    return Tutor(result.id, result.username, result.full_name, result.email, result.role or 'tutor')
         except Exception as e:
             print(f"Error loading user {user_id}: {e}")
         return None
@@ -119,10 +118,7 @@ def test_db():
         from utils.db_connection import get_db
         with get_db() as db:
             result = db.execute("SELECT COUNT(*) as count FROM tutors").fetchone()
-            if isinstance(result, dict):
-                count = result['count']
-            else:
-                count = result[0]
+            count = result['count']
             return f"✅ Database connected! Found {count} tutors | <a href='/auth/login'>Login</a>"
     except Exception as e:
         return f"❌ Database error: {e}"
@@ -41,22 +41,12 @@ def verify_tutor_login(username, password):
             """, (username,)).fetchone()
             
             if result:
-                # Handle both dict (PostgreSQL) and Row (SQLite) objects
-                if isinstance(result, dict):
-                    tutor_id = result['id']
-                    tutor_username = result['username']
-                    tutor_fullname = result['full_name']
-                    tutor_email = result['email']
-                    tutor_role = result.get('role', 'tutor')
-                    stored_hash = result.get('password_hash')
-                else:
-                    # SQLite Row object
-                    tutor_id = result['id']
-                    tutor_username = result['username']
-                    tutor_fullname = result['full_name']
-                    tutor_email = result['email']
-                    tutor_role = result['role'] if 'role' in result.keys() else 'tutor'
-                    stored_hash = result['password_hash'] if 'password_hash' in result.keys() else None
+                tutor_id = result['id']
+                tutor_username = result['username']
+                tutor_fullname = result['full_name']
+                tutor_email = result['email']
+                tutor_role = result.get('role') or 'tutor'
+                stored_hash = result.get('password_hash')
                 
                 # Verify password
                 if stored_hash and stored_hash != 'temp_password_hash':
@@ -15,6 +15,53 @@ class Config:
     # Database - Use environment variable or default
     DATABASE_PATH = os.environ.get('DATABASE_PATH') or '../data/tutor_ai.db'
     
+    # Connection pool (one pool per gunicorn worker)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # max connection age in seconds
+    DB_POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', 30))  # ping connections idle this long
+    DB_POOL_WAIT_WARN_MS = float(os.environ.get('DB_POOL_WAIT_WARN_MS', 100))
+    
+    # Server-side prepared statements for hot queries (PostgreSQL only)
+    DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', 'true').lower() == 'true'
+    
+    # Read replicas (DATABASE_REPLICA_URLS, comma-separated) serve read-only
+    # scopes; after a write a user's reads stay on the primary this long
+    DB_READ_YOUR_WRITES_SECONDS = float(os.environ.get('DB_READ_YOUR_WRITES_SECONDS', 5))
+    
+    # Per-request query count/DB time (Server-Timing header) and slow-query log
+    DB_QUERY_STATS = os.environ.get('DB_QUERY_STATS', 'true').lower() == 'true'
+    DB_SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', 200))  # 0 disables the slow-query log
+    
+    # N+1 detector: report a statement run more than this many times in one
+    # request (0 = off); DB_N_PLUS_ONE_RAISE turns reports into errors for tests
+    DB_N_PLUS_ONE_THRESHOLD = int(os.environ.get('DB_N_PLUS_ONE_THRESHOLD', 0))
+    DB_N_PLUS_ONE_RAISE = os.environ.get('DB_N_PLUS_ONE_RAISE', 'false').lower() == 'true'
+    
+    # Progress summary cache: per-worker LRU size, and an optional SQLite file
+    # shared by every worker (e.g. ../data/progress_cache.db; empty = off)
+    PROGRESS_CACHE_SIZE = int(os.environ.get('PROGRESS_CACHE_SIZE', 512))
+    PROGRESS_CACHE_PATH = os.environ.get('PROGRESS_CACHE_PATH', '')
+    
+    # In-memory question bank index: subtopics held per worker
+    QUESTION_INDEX_SIZE = int(os.environ.get('QUESTION_INDEX_SIZE', 256))
+    
+    # Background PDF rendering: concurrent renders across all workers
+    # (0 = render inline), and seconds before a stuck render is retried
+    PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+    PDF_RENDER_TIMEOUT = int(os.environ.get('PDF_RENDER_TIMEOUT', 300))
+    
+    # Content-addressed PDF cache (files at <dir>/<hash[:2]>/<hash>.pdf)
+    PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', os.path.join('web', 'static', 'worksheets'))
+    
+    # SQLite performance profile, applied once per pooled connection
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64000))  # negative = KiB
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))
+    SQLITE_TEMP_STORE = os.environ.get('SQLITE_TEMP_STORE', 'MEMORY')
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # ms
+    
     # Session Configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=2)
     SESSION_COOKIE_NAME = 'tutor_ai_session'
@@ -15,6 +15,7 @@ os.environ['DATABASE_URL'] = DATABASE_URL
 # Import our database wrapper
 from app import app
 from utils.db_connection import get_db
+from utils import progress_cache, progress_rollup, question_index
 
 def create_worksheet_questions():
     """Create and populate questions from the worksheets"""
@@ -417,6 +418,8 @@ def insert_questions_into_database():
             # Track topics and subtopics we need to create
             topics_created = {}
             subtopics_created = {}
+            subtopics_added = False
+            question_rows = []
             
             for i, q in enumerate(questions, 1):
                 try:
@@ -432,17 +435,10 @@ def insert_questions_into_database():
                                 topics_created[topic_name] = topic_result[0]
                         else:
                             # Create new topic
-                            db.execute("""
+                            topics_created[topic_name] = db.insert_returning_id("""
                                 INSERT INTO main_topics (topic_name, description, target_year_groups, color_code)
                                 VALUES (?, ?, ?, ?)
                             """, (topic_name, f"{topic_name} curriculum area", "Year 2-6", "#607EBC"))
-                            
-                            # Get the inserted ID
-                            new_topic = db.execute("SELECT id FROM main_topics WHERE topic_name = ?", (topic_name,)).fetchone()
-                            if isinstance(new_topic, dict):
-                                topics_created[topic_name] = new_topic['id']
-                            else:
-                                topics_created[topic_name] = new_topic[0]
                             print(f"Created new topic: {topic_name}")
                     
                     main_topic_id = topics_created[topic_name]
@@ -462,40 +458,43 @@ def insert_questions_into_database():
                                 subtopics_created[subtopic_key] = subtopic_result[0]
                         else:
                             # Create new subtopic
-                            db.execute("""
+                            subtopics_created[subtopic_key] = db.insert_returning_id("""
                                 INSERT INTO subtopics (main_topic_id, subtopic_name, description, difficulty_order)
                                 VALUES (?, ?, ?, ?)
                             """, (main_topic_id, subtopic_name, f"{subtopic_name} skills", q['difficulty']))
-                            
-                            # Get the inserted ID
-                            new_subtopic = db.execute("SELECT id FROM subtopics WHERE subtopic_name = ? AND main_topic_id = ?", 
-                                                    (subtopic_name, main_topic_id)).fetchone()
-                            if isinstance(new_subtopic, dict):
-                                subtopics_created[subtopic_key] = new_subtopic['id']
-                            else:
-                                subtopics_created[subtopic_key] = new_subtopic[0]
+                            # A new subtopic changes every student's completion for the topic
+                            progress_rollup.refresh_topic(db, main_topic_id)
+                            subtopics_added = True
                             print(f"Created new subtopic: {subtopic_name}")
                     
                     subtopic_id = subtopics_created[subtopic_key]
                     
-                    # Insert the question
-                    db.execute("""
-                        INSERT INTO questions 
-                        (subtopic_id, question_text, difficulty_level, time_estimate_minutes, 
-                         space_required, question_type, created_by_tutor_id, active)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (subtopic_id, q['question'], q['difficulty'], q['time_estimate'], 
-                          q['space_required'], q['question_type'], admin_id, True))
+                    # Queue the question for the bulk insert below
+                    question_rows.append((subtopic_id, q['question'], q['difficulty'], q['time_estimate'],
+                                          q['space_required'], q['question_type'], admin_id, True))
                     
                     print(f"Question {i:2d}: {q['question'][:50]}...")
                     
                 except Exception as e:
-                    print(f"Error inserting question {i}: {e}")
+                    print(f"Error preparing question {i}: {e}")
                     import traceback
                     traceback.print_exc()
                     continue
             
-            print(f"\nSuccessfully imported {len(questions)} questions!")
+            # Insert all questions in one batch
+            db.insert_many(
+                'questions',
+                ('subtopic_id', 'question_text', 'difficulty_level', 'time_estimate_minutes',
+                 'space_required', 'question_type', 'created_by_tutor_id', 'active'),
+                question_rows
+            )
+            # Running workers reload their question index on the next request
+            question_index.bump_all(db)
+            if subtopics_added:
+                # Subtopic counts changed, so cached progress summaries are stale
+                progress_cache.bump_all(db)
+            
+            print(f"\nSuccessfully imported {len(question_rows)} questions!")
             print(f"Created {len(topics_created)} topics and {len(subtopics_created)} subtopics")
 
 def main():
@@ -1,6 +1,6 @@
 from flask import Blueprint, render_template, redirect, url_for
 from flask_login import login_required, current_user
-from utils.database import get_db_connection
+from utils.db_connection import get_db
 from datetime import datetime
 
 main_bp = Blueprint('main', __name__)
@@ -15,13 +15,13 @@ def index():
 @login_required
 def dashboard():
     try:
-        with get_db_connection() as conn:
+        with get_db(readonly=True) as conn:
             # Get statistics
-            total_students = conn.execute('SELECT COUNT(*) FROM students').fetchone()[0]
-            total_tutors = conn.execute('SELECT COUNT(*) FROM tutors WHERE active = 1').fetchone()[0]
+            total_students = conn.execute('SELECT COUNT(*) AS count FROM students').fetchone()['count']
+            total_tutors = conn.execute('SELECT COUNT(*) AS count FROM tutors WHERE active = true').fetchone()['count']
             
             # Get total topics (main topics)
-            total_topics = conn.execute('SELECT COUNT(*) FROM main_topics').fetchone()[0]
+            total_topics = conn.execute('SELECT COUNT(*) AS count FROM main_topics').fetchone()['count']
             
             # Get recent sessions with tutor names
             recent_sessions = []
@@ -21,13 +21,12 @@ def entry():
     # Get all topics with subtopics
     topics = SessionService.get_session_entry_data()
     
-    # If a student is selected, get their current progress
+    # If a student is selected, get their current progress in one query
     if selected_student_id:
+        mastery_levels = StudentService.get_mastery_levels(selected_student_id)
         for topic in topics:
             for subtopic in topic['subtopics']:
-                # Add current mastery level for each subtopic
-                progress = StudentService.get_subtopic_progress(selected_student_id, subtopic['id'])
-                subtopic['current_level'] = progress['mastery_level'] if progress else 0
+                subtopic['current_level'] = mastery_levels.get(subtopic['id'], 0)
     
     return render_template('session/entry.html', 
                          students=students, 
@@ -98,10 +97,10 @@ def quick_update(student_id):
     topics = SessionService.get_session_entry_data()
     
     # Add current progress for each subtopic
+    mastery_levels = StudentService.get_mastery_levels(student_id)
     for topic in topics:
         for subtopic in topic['subtopics']:
-            progress = StudentService.get_subtopic_progress(student_id, subtopic['id'])
-            subtopic['current_level'] = progress['mastery_level'] if progress else 0
+            subtopic['current_level'] = mastery_levels.get(subtopic['id'], 0)
     
     return render_template('session/quick_update.html',
                          student=student,
@@ -1,8 +1,18 @@
 # web/session/services.py
 from utils.db_connection import get_db
+from utils import mastery_history, progress_cache, progress_rollup
 from datetime import datetime
 import json
 
+def _format_assessed(value):
+    """Display format for a last_assessed timestamp; unparseable values pass through."""
+    if not value:
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace('T', ' ')).strftime('%d-%m-%y @ %H:%M')
+    except ValueError:
+        return value
+
 class SessionService:
     @staticmethod
     def create_session_with_progress(student_id, tutor_id, duration_minutes, 
@@ -11,78 +21,80 @@ class SessionService:
         with get_db() as db:
             try:
                 # 1. Create the session
-                db.execute('''
+                session_id = db.insert_returning_id('''
                     INSERT INTO sessions (student_id, tutor_id, session_date, duration_minutes, tutor_notes)
                     VALUES (?, ?, ?, ?, ?)
                 ''', (student_id, tutor_id, datetime.now().isoformat(), duration_minutes, session_notes))
-                
-                # Get the inserted session ID
-                result = db.execute('''
-                    SELECT id FROM sessions 
-                    WHERE student_id = ? AND tutor_id = ? AND session_date >= ? 
-                    ORDER BY id DESC LIMIT 1
-                ''', (student_id, tutor_id, datetime.now().isoformat()[:10])).fetchone()
-                
-                if isinstance(result, dict):
-                    session_id = result['id']
-                else:
-                    session_id = result[0] if result else None
-                
+
                 if not session_id:
                     raise Exception("Failed to get session ID after insert")
                 
-                # 2. Update subtopic progress and track what was assessed
-                topics_covered = set()
+                # 2. Record each assessment with the level it replaces, then
+                # upsert progress for every assessed subtopic in one batch
+                # (PostgreSQL compatible upsert)
+                subtopic_ids = list(subtopic_assessments.keys())
+                old_levels = {}
+                if subtopic_ids:
+                    placeholders = ', '.join(['?'] * len(subtopic_ids))
+                    old_levels = {
+                        row.subtopic_id: row.mastery_level
+                        for row in db.execute(f'''
+                            SELECT subtopic_id, mastery_level FROM subtopic_progress
+                            WHERE student_id = ? AND subtopic_id IN ({placeholders})
+                        ''', [student_id, *subtopic_ids]).fetchall()
+                    }
+                db.insert_many(
+                    'session_assessments',
+                    ('session_id', 'subtopic_id', 'old_level', 'new_level', 'notes'),
+                    [
+                        (session_id, subtopic_id, old_levels.get(subtopic_id), assessment_data['level'],
+                         assessment_data.get('notes', ''))
+                        for subtopic_id, assessment_data in subtopic_assessments.items()
+                    ]
+                )
                 
-                for subtopic_id, assessment_data in subtopic_assessments.items():
-                    mastery_level = assessment_data['level']
-                    notes = assessment_data.get('notes', '')
-                    
-                    # Get current level for comparison
-                    current_result = db.execute('''
-                        SELECT mastery_level FROM subtopic_progress 
-                        WHERE student_id = ? AND subtopic_id = ?
-                    ''', (student_id, subtopic_id))
-                    current = current_result.fetchone()
-                    
-                    if isinstance(current, dict):
-                        old_level = current['mastery_level'] if current else 0
-                    else:
-                        old_level = current[0] if current else 0
-                    
-                    # PostgreSQL compatible upsert
-                    db.execute('''
-                        INSERT INTO subtopic_progress 
-                        (student_id, subtopic_id, mastery_level, last_assessed, notes)
-                        VALUES (?, ?, ?, ?, ?)
-                        ON CONFLICT (student_id, subtopic_id) 
-                        DO UPDATE SET 
+                assessed_at = datetime.now().isoformat()
+                db.insert_many(
+                    'subtopic_progress',
+                    ('student_id', 'subtopic_id', 'mastery_level', 'last_assessed', 'notes'),
+                    [
+                        (student_id, subtopic_id, assessment_data['level'], assessed_at,
+                         assessment_data.get('notes', ''))
+                        for subtopic_id, assessment_data in subtopic_assessments.items()
+                    ],
+                    suffix='''
+                        ON CONFLICT (student_id, subtopic_id)
+                        DO UPDATE SET
                             mastery_level = EXCLUDED.mastery_level,
                             last_assessed = EXCLUDED.last_assessed,
                             notes = EXCLUDED.notes
-                    ''', (student_id, subtopic_id, mastery_level, datetime.now().isoformat(), notes))
-                    
-                    # Track which main topic this belongs to
-                    topic_result = db.execute('''
-                        SELECT mt.topic_name FROM subtopics s
+                    '''
+                )
+                mastery_history.record(db, student_id, {
+                    subtopic_id: assessment_data['level']
+                    for subtopic_id, assessment_data in subtopic_assessments.items()
+                }, session_id=session_id)
+
+                # Track which main topics were covered, in one query
+                topics_covered = set()
+                if subtopic_ids:
+                    topic_rows = db.execute(f'''
+                        SELECT DISTINCT mt.id, mt.topic_name FROM subtopics s
                         JOIN main_topics mt ON s.main_topic_id = mt.id
-                        WHERE s.id = ?
-                    ''', (subtopic_id,))
-                    topic = topic_result.fetchone()
-                    
-                    if topic:
-                        if isinstance(topic, dict):
-                            topics_covered.add(topic['topic_name'])
-                        else:
-                            topics_covered.add(topic[0])
-                
+                        WHERE s.id IN ({placeholders})
+                    ''', subtopic_ids).fetchall()
+
+                    topics_covered.update(topic.topic_name for topic in topic_rows)
+                    # Keep the per-topic rollup in step with the new progress
+                    progress_rollup.refresh_student_topics(db, student_id, [topic.id for topic in topic_rows])
+
                 # 3. Update session with topics covered
                 if topics_covered:
                     db.execute('''
-                        UPDATE sessions 
+                        UPDATE sessions
                         SET main_topics_covered = ?
                         WHERE id = ?
-                    ''', (', '.join(topics_covered), session_id))
+                    ''', (', '.join(sorted(topics_covered)), session_id))
                 
                 # 4. Update student's last session date
                 db.execute('''
@@ -91,6 +103,9 @@ class SessionService:
                     WHERE id = ?
                 ''', (student_id,))
                 
+                # 5. Invalidate the student's cached progress summary
+                progress_cache.bump(db, student_id)
+                
                 print(f"✅ Session created with {len(subtopic_assessments)} subtopic updates")
                 return session_id
                 
@@ -100,247 +115,231 @@ class SessionService:
     
     @staticmethod
     def get_student_progress_summary(student_id):
-        """Get comprehensive progress data for a student."""
-        with get_db() as db:
-            # Get topic summaries with progress
-            result = db.execute('''
+        """Get comprehensive progress data for a student.
+        
+        Topic summaries are keyed reads of student_topic_rollup. One ordered
+        join over every topic and subtopic gives the detailed view, weak
+        areas and ready-to-advance in a single pass. Results are cached per
+        progress version, so a repeat view costs one keyed lookup; treat
+        them as read-only.
+        """
+        with get_db(readonly=True) as db:
+            version = progress_cache.get_version(db, student_id)
+            cached = progress_cache.get(student_id, version)
+            if cached is not None:
+                return cached
+            topic_summaries = [row.to_dict() for row in db.execute('''
                 SELECT 
                     mt.id,
                     mt.topic_name,
                     mt.color_code,
-                    COUNT(s.id) as total_subtopics,
-                    COUNT(sp.id) as assessed_subtopics,
-                    ROUND(AVG(CASE WHEN sp.mastery_level IS NOT NULL THEN sp.mastery_level ELSE 0 END), 1) as avg_mastery,
-                    ROUND(CASE 
-                        WHEN COUNT(s.id) > 0 THEN (COUNT(sp.id) * 100.0 / COUNT(s.id))
-                        ELSE 0.0 
-                    END, 1) as completion_percentage
+                    t.total_subtopics,
+                    COALESCE(r.assessed_subtopics, 0) as assessed_subtopics,
+                    -- A float on both backends (PostgreSQL's ROUND returns NUMERIC),
+                    -- so the summary stays JSON-serializable for the shared cache
+                    CAST(ROUND(CASE 
+                        WHEN t.total_subtopics > 0 THEN COALESCE(r.mastery_sum, 0) * 1.0 / t.total_subtopics
+                        ELSE 0 
+                    END, 1) AS DOUBLE PRECISION) as avg_mastery,
+                    COALESCE(r.completion_percentage, 0.0) as completion_percentage
                 FROM main_topics mt
-                LEFT JOIN subtopics s ON mt.id = s.main_topic_id
-                LEFT JOIN subtopic_progress sp ON s.id = sp.subtopic_id AND sp.student_id = ?
-                GROUP BY mt.id, mt.topic_name
-                ORDER BY mt.topic_name
-            ''', (student_id,))
-            topic_summaries = result.fetchall()
-            
-            # Convert to consistent format
-            if topic_summaries and isinstance(topic_summaries[0], dict):
-                topic_summaries_list = topic_summaries
-            else:
-                topic_summaries_list = [dict(row) for row in topic_summaries]
-            
-            # detailed progress:
-            detailed_progress = []
-            for topic in topic_summaries_list:
-                subtopics_result = db.execute('''
-                    SELECT 
-                        s.id,
-                        s.subtopic_name,
-                        s.difficulty_order,
-                        COALESCE(sp.mastery_level, 0) as mastery_level,
-                        sp.last_assessed,
-                        sp.questions_attempted,
-                        sp.questions_correct,
-                        sp.notes
-                    FROM subtopics s
-                    LEFT JOIN subtopic_progress sp ON s.id = sp.subtopic_id AND sp.student_id = ?
-                    WHERE s.main_topic_id = ?
-                    ORDER BY s.difficulty_order
-                ''', (student_id, topic['id']))
-                subtopics = subtopics_result.fetchall()
-                
-                # Format the dates for each subtopic
-                formatted_subtopics = []
-                for subtopic in subtopics:
-                    if isinstance(subtopic, dict):
-                        subtopic_dict = subtopic
-                    else:
-                        subtopic_dict = dict(subtopic)
-                        
-                    if subtopic_dict['last_assessed']:
-                        try:
-                            from datetime import datetime
-                            dt = datetime.fromisoformat(subtopic_dict['last_assessed'].replace('T', ' '))
-                            subtopic_dict['last_assessed'] = dt.strftime('%d-%m-%y @ %H:%M')
-                        except:
-                            pass  # Keep original if parsing fails
-                    formatted_subtopics.append(subtopic_dict)
-                
-                detailed_progress.append({
-                    'topic_name': topic['topic_name'],
-                    'color_code': topic['color_code'],
-                    'subtopics': formatted_subtopics
-                })
-            
-            # Get weak areas (mastery level 3-6)
-            weak_areas_result = db.execute('''
+                JOIN (
+                    SELECT mt2.id as main_topic_id, COUNT(s.id) as total_subtopics
+                    FROM main_topics mt2
+                    LEFT JOIN subtopics s ON s.main_topic_id = mt2.id
+                    GROUP BY mt2.id
+                ) t ON t.main_topic_id = mt.id
+                LEFT JOIN student_topic_rollup r ON r.student_id = ? AND r.main_topic_id = mt.id
+                ORDER BY mt.topic_name, mt.id
+            ''', (student_id,), prepare=True).fetchall()]
+            rows = db.execute('''
                 SELECT 
-                    s.subtopic_name,
+                    mt.id as topic_id,
                     mt.topic_name,
-                    sp.mastery_level
-                FROM subtopic_progress sp
-                JOIN subtopics s ON sp.subtopic_id = s.id
-                JOIN main_topics mt ON s.main_topic_id = mt.id
-                WHERE sp.student_id = ? AND sp.mastery_level BETWEEN 3 AND 6
-                ORDER BY sp.mastery_level ASC
-                LIMIT 5
-            ''', (student_id,))
-            weak_areas_raw = weak_areas_result.fetchall()
-            
-            # Convert to consistent format
-            if weak_areas_raw and isinstance(weak_areas_raw[0], dict):
-                weak_areas = weak_areas_raw
-            else:
-                weak_areas = [dict(row) for row in weak_areas_raw]
-            
-            # Get areas ready to advance (mastery level >= 8)
-            ready_to_advance_result = db.execute('''
-                SELECT 
-                    s.subtopic_name,
+                    mt.color_code,
                     s.id,
-                    next_s.subtopic_name as next_subtopic
-                FROM subtopic_progress sp
-                JOIN subtopics s ON sp.subtopic_id = s.id
-                LEFT JOIN subtopics next_s ON next_s.main_topic_id = s.main_topic_id 
-                    AND next_s.difficulty_order = s.difficulty_order + 1
-                WHERE sp.student_id = ? AND sp.mastery_level >= 8
-                    AND (next_s.id IS NULL OR next_s.id NOT IN (
-                        SELECT subtopic_id FROM subtopic_progress 
-                        WHERE student_id = ? AND mastery_level > 0
-                    ))
-                LIMIT 3
-            ''', (student_id, student_id))
-            ready_to_advance_raw = ready_to_advance_result.fetchall()
+                    s.subtopic_name,
+                    s.difficulty_order,
+                    sp.id as progress_id,
+                    COALESCE(sp.mastery_level, 0) as mastery_level,
+                    sp.last_assessed,
+                    sp.questions_attempted,
+                    sp.questions_correct,
+                    sp.notes
+                FROM main_topics mt
+                LEFT JOIN subtopics s ON s.main_topic_id = mt.id
+                LEFT JOIN subtopic_progress sp ON sp.subtopic_id = s.id AND sp.student_id = ?
+                ORDER BY mt.topic_name, mt.id, s.difficulty_order, s.id
+            ''', (student_id,), prepare=True).fetchall()
+        
+        detailed_progress = []
+        topics = []
+        for row in rows:
+            if not topics or topics[-1]['id'] != row.topic_id:
+                topics.append({
+                    'id': row.topic_id,
+                    'topic_name': row.topic_name,
+                    'color_code': row.color_code,
+                    'rows': [],
+                })
+            if row.id is not None:
+                topics[-1]['rows'].append(row)
+        
+        weak_areas = []
+        ready_to_advance = []
+        for topic in topics:
+            subtopic_rows = topic.pop('rows')
+            assessed = [row for row in subtopic_rows if row.progress_id is not None]
             
-            # Convert to consistent format
-            if ready_to_advance_raw and isinstance(ready_to_advance_raw[0], dict):
-                ready_to_advance = ready_to_advance_raw
-            else:
-                ready_to_advance = [dict(row) for row in ready_to_advance_raw]
+            formatted_subtopics = []
+            by_order = {}
+            for row in subtopic_rows:
+                by_order.setdefault(row.difficulty_order, []).append(row)
+                formatted_subtopics.append({
+                    'id': row.id,
+                    'subtopic_name': row.subtopic_name,
+                    'difficulty_order': row.difficulty_order,
+                    'mastery_level': row.mastery_level,
+                    'last_assessed': _format_assessed(row.last_assessed),
+                    'questions_attempted': row.questions_attempted,
+                    'questions_correct': row.questions_correct,
+                    'notes': row.notes,
+                })
+            detailed_progress.append({
+                'topic_name': topic['topic_name'],
+                'color_code': topic['color_code'],
+                'subtopics': formatted_subtopics
+            })
             
-            return {
-                'topic_summaries': topic_summaries_list,
-                'detailed_progress': detailed_progress,
-                'weak_areas': weak_areas,
-                'ready_to_advance': ready_to_advance
-            }
+            for row in assessed:
+                # Weak areas: mastery level 3-6
+                if 3 <= row.mastery_level <= 6:
+                    weak_areas.append({
+                        'subtopic_name': row.subtopic_name,
+                        'topic_name': topic['topic_name'],
+                        'mastery_level': row.mastery_level,
+                    })
+                # Ready to advance: mastered (8+) and the next subtopic by
+                # difficulty hasn't been started yet
+                if row.mastery_level >= 8:
+                    next_rows = by_order.get(row.difficulty_order + 1) if row.difficulty_order is not None else None
+                    if not next_rows:
+                        ready_to_advance.append({'subtopic_name': row.subtopic_name, 'id': row.id,
+                                                 'next_subtopic': None})
+                    for next_row in next_rows or ():
+                        if next_row.progress_id is None or next_row.mastery_level <= 0:
+                            ready_to_advance.append({'subtopic_name': row.subtopic_name, 'id': row.id,
+                                                     'next_subtopic': next_row.subtopic_name})
+        
+        weak_areas.sort(key=lambda area: area['mastery_level'])
+        
+        summary = {
+            'topic_summaries': topic_summaries,
+            'detailed_progress': detailed_progress,
+            'weak_areas': weak_areas[:5],
+            'ready_to_advance': ready_to_advance[:3]
+        }
+        progress_cache.put(student_id, version, summary)
+        return summary
     
     @staticmethod
     def get_session_entry_data():
-        """Get data needed for session entry form."""
-        with get_db() as db:
-            # Get all topics with their subtopics and include current progress if student is selected
-            topics_result = db.execute('''
+        """Get data needed for session entry form.
+        
+        One ordered join of topics and their subtopics, grouped per topic;
+        topics without subtopics get an empty list.
+        """
+        with get_db(readonly=True) as db:
+            rows = db.execute('''
                 SELECT 
-                    mt.id,
+                    mt.id as topic_id,
                     mt.topic_name,
-                    mt.color_code
+                    mt.color_code,
+                    s.id,
+                    s.subtopic_name,
+                    s.difficulty_order
                 FROM main_topics mt
-                ORDER BY mt.topic_name
-            ''')
-            topics = topics_result.fetchall()
-            
-            topics_with_subtopics = []
-            for topic in topics:
-                if isinstance(topic, dict):
-                    topic_dict = topic
-                else:
-                    topic_dict = dict(topic)
-                    
-                subtopics_result = db.execute('''
-                    SELECT 
-                        s.id,
-                        s.subtopic_name,
-                        s.difficulty_order
-                    FROM subtopics s
-                    WHERE s.main_topic_id = ?
-                    ORDER BY s.difficulty_order
-                ''', (topic_dict['id'],))
-                subtopics = subtopics_result.fetchall()
-                
-                # Convert Row objects to dictionaries
-                subtopic_list = []
-                for sub in subtopics:
-                    if isinstance(sub, dict):
-                        sub_dict = sub
-                    else:
-                        sub_dict = dict(sub)
-                        
-                    subtopic_list.append({
-                        'id': sub_dict['id'],
-                        'subtopic_name': sub_dict['subtopic_name'],
-                        'difficulty_order': sub_dict['difficulty_order']
-                    })
-                
+                LEFT JOIN subtopics s ON s.main_topic_id = mt.id
+                ORDER BY mt.topic_name, mt.id, s.difficulty_order, s.id
+            ''', prepare=True).fetchall()
+        
+        # Routes add current_level to each subtopic, so hand out dicts
+        topics_with_subtopics = []
+        for row in rows:
+            if not topics_with_subtopics or topics_with_subtopics[-1]['id'] != row.topic_id:
                 topics_with_subtopics.append({
-                    'id': topic_dict['id'],
-                    'topic_name': topic_dict['topic_name'],
-                    'color_code': topic_dict['color_code'],
-                    'subtopics': subtopic_list
+                    'id': row.topic_id,
+                    'topic_name': row.topic_name,
+                    'color_code': row.color_code,
+                    'subtopics': [],
                 })
-            
-            return topics_with_subtopics
+            if row.id is not None:
+                topics_with_subtopics[-1]['subtopics'].append({
+                    'id': row.id,
+                    'subtopic_name': row.subtopic_name,
+                    'difficulty_order': row.difficulty_order,
+                })
+        
+        return topics_with_subtopics
     
     @staticmethod
     def get_recent_sessions_with_progress(student_id, limit=5):
-        """Get recent sessions with subtopic progress changes."""
-        with get_db() as db:
-            sessions_result = db.execute('''
+        """Get recent sessions with the subtopics each one assessed.
+        
+        One join of the latest sessions against session_assessments; each
+        assessment carries the level before and after the session. Assessments
+        of since-deleted subtopics stay in the history under a placeholder name.
+        """
+        with get_db(readonly=True) as db:
+            rows = db.execute('''
                 SELECT 
                     s.id,
                     s.session_date,
                     s.duration_minutes,
                     s.main_topics_covered,
                     s.tutor_notes,
-                    t.full_name as tutor_name
-                FROM sessions s
-                JOIN tutors t ON s.tutor_id = t.id
-                WHERE s.student_id = ?
-                ORDER BY s.session_date DESC
-                LIMIT ?
-            ''', (student_id, limit))
-            sessions = sessions_result.fetchall()
-            
-            # For each session, get what subtopics were assessed
-            sessions_with_progress = []
-            for session in sessions:
-                if isinstance(session, dict):
-                    session_dict = session
-                else:
-                    session_dict = dict(session)
-                    
-                # Format the date here
-                from datetime import datetime
-                try:
-                    # Parse the ISO format datetime
-                    dt = datetime.fromisoformat(session_dict['session_date'].replace('T', ' '))
-                    formatted_date = dt.strftime('%d-%m-%y @ %H:%M')
-                except:
-                    # Fallback if parsing fails
-                    formatted_date = session_dict['session_date']
-                
-                # This is approximate - in a real system, you'd track session-subtopic relationships
-                subtopics_result = db.execute('''
+                    s.tutor_name,
+                    COALESCE(st.subtopic_name, 'Deleted subtopic') as subtopic_name,
+                    sa.old_level,
+                    sa.new_level,
+                    sa.notes as assessment_notes
+                FROM (
                     SELECT 
-                        s.subtopic_name,
-                        sp.mastery_level as new_level
-                    FROM subtopic_progress sp
-                    JOIN subtopics s ON sp.subtopic_id = s.id
-                    WHERE sp.student_id = ? 
-                        AND DATE(sp.last_assessed) = DATE(?)
-                ''', (student_id, session_dict['session_date']))
-                subtopics_assessed_raw = subtopics_result.fetchall()
-                
-                # Convert to consistent format
-                if subtopics_assessed_raw and isinstance(subtopics_assessed_raw[0], dict):
-                    subtopics_assessed = subtopics_assessed_raw
-                else:
-                    subtopics_assessed = [dict(row) for row in subtopics_assessed_raw]
-                
+                        s.id,
+                        s.session_date,
+                        s.duration_minutes,
+                        s.main_topics_covered,
+                        s.tutor_notes,
+                        t.full_name as tutor_name
+                    FROM sessions s
+                    JOIN tutors t ON s.tutor_id = t.id
+                    WHERE s.student_id = ?
+                    ORDER BY s.session_date DESC
+                    LIMIT ?
+                ) s
+                LEFT JOIN session_assessments sa ON sa.session_id = s.id
+                LEFT JOIN subtopics st ON st.id = sa.subtopic_id
+                ORDER BY s.session_date DESC, s.id DESC, sa.id
+            ''', (student_id, limit), prepare=True).fetchall()
+        
+        sessions_with_progress = []
+        for row in rows:
+            if not sessions_with_progress or sessions_with_progress[-1]['id'] != row.id:
                 sessions_with_progress.append({
-                    **session_dict,
-                    'session_date': formatted_date,  # Use formatted date
-                    'subtopics_assessed': subtopics_assessed
+                    'id': row.id,
+                    'session_date': _format_assessed(row.session_date),
+                    'duration_minutes': row.duration_minutes,
+                    'main_topics_covered': row.main_topics_covered,
+                    'tutor_notes': row.tutor_notes,
+                    'tutor_name': row.tutor_name,
+                    'subtopics_assessed': [],
                 })
-            
-            return sessions_with_progress
\ No newline at end of file
+            if row.new_level is not None:
+                sessions_with_progress[-1]['subtopics_assessed'].append({
+                    'subtopic_name': row.subtopic_name,
+                    'old_level': row.old_level,
+                    'new_level': row.new_level,
+                    'notes': row.assessment_notes,
+                })
+        
+        return sessions_with_progress
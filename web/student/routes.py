@@ -1,55 +1,107 @@
 # web/student/routes.py - UPDATED WITH VALIDATION
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required
+from datetime import datetime, timedelta, timezone
 from .services import StudentService
 from session.services import SessionService
 from utils.validators import StudentValidator, ValidationError, sanitize_html
-from utils.decorators import admin_required
+from utils.decorators import admin_required, progress_etag
+from utils.mastery_history import MIN_BUCKET_SECONDS
 
 student_bp = Blueprint('student', __name__, url_prefix='/students')
 
+def _page_args(args):
+    """get_students_page arguments from the query string; raises ValueError."""
+    active = args.get('active', '').lower()
+    if active not in ('', 'true', 'false'):
+        raise ValueError('active must be true or false')
+    no_session_days = args.get('no_session_days', '').strip()
+    if no_session_days and (not no_session_days.isdigit()):
+        raise ValueError('no_session_days must be a whole number of days')
+    return {
+        'after': args.get('after') or None,
+        'limit': args.get('limit', 20, type=int),
+        'year_group': args.get('year_group', '').strip() or None,
+        'active': {'true': True, 'false': False}.get(active),
+        'target_school': args.get('target_school', '').strip() or None,
+        'no_session_days': int(no_session_days) if no_session_days else None,
+    }
+
+def _with_progress(students):
+    """Student dicts with roster progress for just these students."""
+    roster_progress = StudentService.get_roster_progress([s.id for s in students])
+    no_progress = {'overall_progress': 0, 'topics_assessed': 0}
+    return [
+        {**student.to_dict(), **roster_progress.get(student.id, no_progress)}
+        for student in students
+    ]
+
+def _page_with_progress(page_args):
+    """A page of students with roster progress for just that page."""
+    page = StudentService.get_students_page(**page_args)
+    return _with_progress(page['students']), page['next_cursor']
+
+def _search_with_progress(query, page_args):
+    """Ranked search results, filtered like the page, with roster progress."""
+    search_args = {key: value for key, value in page_args.items() if key != 'after'}
+    return _with_progress(StudentService.search_students(query, **search_args))
+
 @student_bp.route('/')
 @login_required
 def list_students():
-    """Show all students with or without management options."""
+    """Show a page of students with or without management options."""
     view_only = request.args.get('view_only', 'false').lower() == 'true'
+    filters = {key: request.args[key] for key in
+               ('year_group', 'active', 'target_school', 'no_session_days')
+               if request.args.get(key)}
+    
+    query = request.args.get('q', '').strip()
     
     try:
-        students = StudentService.get_all_students()
-        
-        # Add progress summary for each student
-        students_with_progress = []
-        for student in students:
-            progress_data = StudentService.get_student_progress_summary(student['id'])
-            overall_progress = 0
-            topics_assessed = 0
-            
-            for topic in progress_data['topic_summaries']:
-                assessed_subtopics = topic['assessed_subtopics'] or 0
-                completion_percentage = float(topic['completion_percentage'] or 0)
-                if assessed_subtopics > 0:
-                    topics_assessed += assessed_subtopics
-                    overall_progress += completion_percentage
-            
-            if len(progress_data['topic_summaries']) > 0:
-                overall_progress = overall_progress / len(progress_data['topic_summaries'])
-            
-            students_with_progress.append({
-                **dict(student),
-                'overall_progress': round(overall_progress, 1),
-                'topics_assessed': topics_assessed
-            })
+        page_args = _page_args(request.args)
+        if query:
+            students, next_cursor = _search_with_progress(query, page_args), None
+        else:
+            students, next_cursor = _page_with_progress(page_args)
         
         return render_template('student/list.html', 
-                             students=students_with_progress,
+                             query=query,
+                             students=students,
+                             next_cursor=next_cursor,
+                             filters=filters,
                              view_only=view_only)
     
     except Exception as e:
         flash(f'Error loading students: {str(e)}', 'error')
-        return render_template('student/list.html', students=[], view_only=view_only)
+        return render_template('student/list.html', students=[], next_cursor=None,
+                               query=query, filters=filters, view_only=view_only)
+
+@student_bp.route('/api')
+@login_required
+def list_students_json():
+    """JSON page of students; pass next_cursor back as ?after= for the next page."""
+    try:
+        students, next_cursor = _page_with_progress(_page_args(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'students': students, 'next_cursor': next_cursor})
+
+@student_bp.route('/api/search')
+@login_required
+def search_students_json():
+    """Ranked prefix search over students and their session notes, as JSON."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    try:
+        students = _search_with_progress(query, _page_args(request.args))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'query': query, 'students': students})
 
 @student_bp.route('/<int:student_id>')
 @login_required
+@progress_etag()
 def student_detail(student_id):
     """Show comprehensive student progress report."""
     try:
@@ -249,6 +301,7 @@ def delete_student(student_id):
 
 @student_bp.route('/<int:student_id>/progress-chart')
 @login_required
+@progress_etag()
 def progress_chart(student_id):
     """Show visual progress chart for student."""
     # Validate student_id
@@ -270,4 +323,44 @@ def progress_chart(student_id):
                              progress_data=progress_data)
     except Exception as e:
         flash(f'Error loading progress chart: {str(e)}', 'error')
-        return redirect(url_for('student.student_detail', student_id=student_id))
\ No newline at end of file
+        return redirect(url_for('student.student_detail', student_id=student_id))
+
+def _timestamp_arg(args, key, default):
+    """Unix time from an ISO date/datetime query arg (UTC); raises ValueError."""
+    value = args.get(key)
+    if not value:
+        return default
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+def _default_until():
+    """Now, rounded up to the hour so the default window only moves hourly."""
+    now = int(datetime.now(timezone.utc).timestamp())
+    return now - now % MIN_BUCKET_SECONDS + MIN_BUCKET_SECONDS
+
+@student_bp.route('/<int:student_id>/mastery-history')
+@login_required
+@progress_etag(vary=lambda: (request.full_path, _default_until()))
+def mastery_history_json(student_id):
+    """Downsampled mastery series per topic (or ?by=subtopic) as JSON.
+    
+    Window: ?since=&until= (ISO dates) or ?days= back from now (default 365).
+    ?points= caps the points per series; ?topic_id= / ?subtopic_id= narrow it.
+    Points are [unix_seconds, average_level].
+    """
+    try:
+        days = request.args.get('days', 365, type=int)
+        until = _timestamp_arg(request.args, 'until', _default_until())
+        since = _timestamp_arg(request.args, 'since', until - int(timedelta(days=days).total_seconds()))
+        history = StudentService.get_mastery_history(
+            student_id, since, until,
+            by=request.args.get('by', 'topic'),
+            points=request.args.get('points', 60, type=int),
+            main_topic_id=request.args.get('topic_id', type=int),
+            subtopic_id=request.args.get('subtopic_id', type=int),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'student_id': student_id, 'since': since, 'until': until, **history})
@@ -1,50 +1,126 @@
 # web/student/services.py
 from utils.db_connection import get_db
+from utils import mastery_history, progress_cache, progress_rollup, student_search
+from datetime import datetime, timedelta, timezone
+import base64
+import json
+
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(name, student_id):
+    """Opaque page cursor for the (name, id) of the last student on a page."""
+    raw = json.dumps([name, student_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """(name, id) from a page cursor; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        name, student_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid page cursor') from e
+    if not isinstance(name, str) or not isinstance(student_id, int):
+        raise ValueError('Invalid page cursor')
+    return name, student_id
+
+def _student_filters(year_group=None, active=None, target_school=None, no_session_days=None, alias=''):
+    """SQL conditions and params for the student list filters.
+    
+    ``no_session_days`` keeps students with no session in that many days
+    (including those never seen). ``alias`` prefixes the column names.
+    """
+    column = f"{alias}." if alias else ''
+    conditions = []
+    params = []
+    if year_group:
+        conditions.append(f'{column}year_group = ?')
+        params.append(year_group)
+    if active is not None:
+        conditions.append(f'{column}active = ?')
+        params.append(bool(active))
+    if target_school:
+        conditions.append(f'{column}target_school = ?')
+        params.append(target_school)
+    if no_session_days is not None:
+        # Same text format as CURRENT_TIMESTAMP, so it compares on SQLite too
+        cutoff = datetime.now(timezone.utc) - timedelta(days=int(no_session_days))
+        conditions.append(f'({column}last_session_date IS NULL OR {column}last_session_date < ?)')
+        params.append(cutoff.strftime('%Y-%m-%d %H:%M:%S'))
+    return conditions, params
 
 class StudentService:
     @staticmethod
     def get_all_students():
         """Get all students with basic info."""
-        with get_db() as db:
+        with get_db(readonly=True) as db:
             result = db.execute('''
                 SELECT * FROM students 
                 ORDER BY name
             ''')
-            results = result.fetchall()
-            
-            # Convert to list of dictionaries
-            if results and isinstance(results[0], dict):
-                return results
-            else:
-                return [dict(row) for row in results]
+            return result.fetchall()
+    
+    @staticmethod
+    def search_students(query, limit=20, year_group=None, active=None,
+                        target_school=None, no_session_days=None):
+        """Students matching every word of ``query`` as a prefix, best first.
+        
+        Searches name, target school, parent contact, notes and session
+        tutor notes through the full-text index; the filters are the same
+        as get_students_page.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        conditions, params = _student_filters(year_group, active, target_school, no_session_days, alias='s')
+        with get_db(readonly=True) as db:
+            return student_search.search(db, query, limit, conditions, params)
+    
+    @staticmethod
+    def get_students_page(after=None, limit=20, year_group=None, active=None,
+                          target_school=None, no_session_days=None):
+        """One page of students ordered by (name, id), with optional filters.
+        
+        Keyset pagination: ``after`` is the cursor returned with the previous
+        page, so each page is an index range scan whatever its position.
+        ``no_session_days`` keeps students with no session in that many days
+        (including those never seen). Returns {'students', 'next_cursor'}.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        conditions, params = _student_filters(year_group, active, target_school, no_session_days)
+        if after:
+            last_name, last_id = decode_cursor(after)
+            # Row-value comparison, so both backends seek the (name, id) index
+            conditions.insert(0, '(name, id) > (?, ?)')
+            params[:0] = [last_name, last_id]
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        with get_db(readonly=True) as db:
+            # One extra row tells us whether there is a next page
+            students = db.execute(f'''
+                SELECT * FROM students
+                {where}
+                ORDER BY name, id
+                LIMIT ?
+            ''', [*params, limit + 1]).fetchall()
+        
+        next_cursor = None
+        if len(students) > limit:
+            students = students[:limit]
+            next_cursor = encode_cursor(students[-1].name, students[-1].id)
+        return {'students': students, 'next_cursor': next_cursor}
     
     @staticmethod
     def get_student(student_id):
         """Get a student by ID."""
         with get_db() as db:
-            result_query = db.execute('SELECT * FROM students WHERE id = ?', (student_id,))
-            result = result_query.fetchone()
-            
-            if result:
-                return dict(result) if isinstance(result, dict) else dict(result)
-            return None
+            return db.execute('SELECT * FROM students WHERE id = ?', (student_id,)).fetchone()
     
     @staticmethod
     def create_student(name, age, year_group, target_school=None, parent_contact=None, notes=None):
         """Create a new student."""
         with get_db() as db:
-            db.execute('''
+            return db.insert_returning_id('''
                 INSERT INTO students (name, age, year_group, target_school, parent_contact, notes)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (name, age, year_group, target_school, parent_contact, notes))
-            
-            # Get the inserted ID
-            result = db.execute("SELECT id FROM students WHERE name = ? AND age = ? ORDER BY id DESC LIMIT 1", 
-                              (name, age)).fetchone()
-            if isinstance(result, dict):
-                return result['id']
-            else:
-                return result[0] if result else None
     
     @staticmethod
     def update_student(student_id, name, age, year_group, target_school=None, parent_contact=None, notes=None):
@@ -62,52 +138,113 @@ class StudentService:
         with get_db() as db:
             # Delete in order due to foreign key constraints
             db.execute('DELETE FROM subtopic_progress WHERE student_id = ?', (student_id,))
+            progress_rollup.delete_student(db, student_id)
+            progress_cache.bump(db, student_id)
+            mastery_history.delete_student(db, student_id)
+            db.execute('''
+                DELETE FROM session_assessments
+                WHERE session_id IN (SELECT id FROM sessions WHERE student_id = ?)
+            ''', (student_id,))
             db.execute('DELETE FROM sessions WHERE student_id = ?', (student_id,))
             db.execute('DELETE FROM students WHERE id = ?', (student_id,))
     
     @staticmethod
     def get_student_progress_summary(student_id):
         """Get summary of student progress across all topics."""
-        with get_db() as db:
+        with get_db(readonly=True) as db:
             # Get topic-level summary
             result = db.execute('''
                 SELECT 
                     mt.topic_name,
                     mt.color_code,
-                    COUNT(s.id) as total_subtopics,
-                    COUNT(sp.id) as assessed_subtopics,
-                    ROUND(AVG(CASE WHEN sp.mastery_level IS NOT NULL THEN sp.mastery_level ELSE 0 END), 1) as avg_mastery,
+                    t.total_subtopics,
+                    COALESCE(r.assessed_subtopics, 0) as assessed_subtopics,
                     ROUND(CASE 
-                        WHEN COUNT(s.id) > 0 THEN (COUNT(sp.id) * 100.0 / COUNT(s.id))
-                        ELSE 0.0 
-                    END, 1) as completion_percentage
+                        WHEN t.total_subtopics > 0 THEN COALESCE(r.mastery_sum, 0) * 1.0 / t.total_subtopics
+                        ELSE 0 
+                    END, 1) as avg_mastery,
+                    COALESCE(r.completion_percentage, 0.0) as completion_percentage
                 FROM main_topics mt
-                LEFT JOIN subtopics s ON mt.id = s.main_topic_id
-                LEFT JOIN subtopic_progress sp ON s.id = sp.subtopic_id AND sp.student_id = ?
-                GROUP BY mt.id, mt.topic_name
+                JOIN (
+                    SELECT mt2.id as main_topic_id, COUNT(s.id) as total_subtopics
+                    FROM main_topics mt2
+                    LEFT JOIN subtopics s ON s.main_topic_id = mt2.id
+                    GROUP BY mt2.id
+                ) t ON t.main_topic_id = mt.id
+                LEFT JOIN student_topic_rollup r ON r.student_id = ? AND r.main_topic_id = mt.id
                 ORDER BY mt.topic_name
             ''', (student_id,))
-            topic_summaries = result.fetchall()
+            return {'topic_summaries': result.fetchall()}
+    
+    @staticmethod
+    def get_roster_progress(student_ids=None):
+        """Overall progress and assessed-subtopic counts for many students at once.
+        
+        Same figures as summing get_student_progress_summary per student, but
+        in one grouped query over student_topic_rollup. Pass a page of ``student_ids`` to limit the work,
+        or None for every student. Returns {student_id: {'overall_progress',
+        'topics_assessed'}}; students with no progress are omitted.
+        """
+        if student_ids is not None and not student_ids:
+            return {}
+        
+        params = []
+        student_filter = ''
+        if student_ids is not None:
+            student_filter = f"WHERE r.student_id IN ({', '.join(['?'] * len(student_ids))})"
+            params.extend(student_ids)
+        
+        with get_db(readonly=True) as db:
+            rows = db.execute(f'''
+                SELECT 
+                    r.student_id,
+                    SUM(r.assessed_subtopics) AS topics_assessed,
+                    SUM(r.completion_percentage) AS completion_sum,
+                    (SELECT COUNT(*) FROM main_topics) AS topic_count
+                FROM student_topic_rollup r
+                JOIN main_topics mt ON mt.id = r.main_topic_id
+                {student_filter}
+                GROUP BY r.student_id
+            ''', params).fetchall()
             
-            # Convert to consistent format
-            if topic_summaries and isinstance(topic_summaries[0], dict):
-                return {'topic_summaries': topic_summaries}
-            else:
-                return {'topic_summaries': [dict(row) for row in topic_summaries]}
+            # Overall progress averages completion over every topic, assessed or not
+            return {
+                row.student_id: {
+                    'overall_progress': round(float(row.completion_sum or 0) / row.topic_count, 1),
+                    'topics_assessed': row.topics_assessed,
+                }
+                for row in rows
+            }
     
     @staticmethod
     def get_subtopic_progress(student_id, subtopic_id):
         """Get progress for a specific subtopic."""
         with get_db() as db:
-            result = db.execute('''
+            return db.execute('''
                 SELECT * FROM subtopic_progress
                 WHERE student_id = ? AND subtopic_id = ?
             ''', (student_id, subtopic_id)).fetchone()
-            
-            # Return as a dictionary for consistent access
-            if result:
-                return dict(result) if isinstance(result, dict) else dict(result)
-            return None
+    
+    @staticmethod
+    def get_mastery_levels(student_id):
+        """{subtopic_id: mastery_level} for every subtopic the student has progress on."""
+        with get_db(readonly=True) as db:
+            rows = db.execute('''
+                SELECT subtopic_id, mastery_level FROM subtopic_progress
+                WHERE student_id = ?
+            ''', (student_id,), prepare=True).fetchall()
+            return {row.subtopic_id: row.mastery_level for row in rows}
+    
+    @staticmethod
+    def get_mastery_history(student_id, since, until, by='topic', points=60,
+                            main_topic_id=None, subtopic_id=None):
+        """Downsampled mastery series between two Unix times; see utils/mastery_history.py."""
+        with get_db(readonly=True) as db:
+            bucket_seconds, series = mastery_history.series(
+                db, student_id, since, until, by=by, points=points,
+                main_topic_id=main_topic_id, subtopic_id=subtopic_id
+            )
+        return {'bucket_seconds': bucket_seconds, 'series': series}
     
     @staticmethod
     def get_session_count(student_id):
@@ -116,11 +253,7 @@ class StudentService:
             result = db.execute('''
                 SELECT COUNT(*) FROM sessions WHERE student_id = ?
             ''', (student_id,)).fetchone()
-            
-            if isinstance(result, dict):
-                return list(result.values())[0] if result else 0
-            else:
-                return result[0] if result else 0
+            return result[0] if result else 0
     
     @staticmethod
     def get_recent_activity(student_id, days=30):
@@ -139,13 +272,7 @@ class StudentService:
                     AND sp.last_assessed >= (CURRENT_DATE - ? * INTERVAL '1 day')
                 ORDER BY sp.last_assessed DESC
             ''', (student_id, days))
-            activities = result.fetchall()
-            
-            # Convert to consistent format
-            if activities and isinstance(activities[0], dict):
-                return activities
-            else:
-                return [dict(row) for row in activities]
+            return result.fetchall()
     
     @staticmethod
     def get_mastery_distribution(student_id):
@@ -170,10 +297,4 @@ class StudentService:
                 END
                 ORDER BY MIN(mastery_level) DESC
             ''', (student_id,))
-            distributions = result.fetchall()
-            
-            # Convert to consistent format
-            if distributions and isinstance(distributions[0], dict):
-                return distributions
-            else:
-                return [dict(row) for row in distributions]
\ No newline at end of file
+            return result.fetchall()
\ No newline at end of file
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Test that init_sqlite brings an existing development database up to date"""
+
+import sys
+import time
+import sqlite3
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+sys.path.append('.')
+from session.services import SessionService
+from student.services import StudentService
+from utils import db_pool
+from utils.database_init import init_sqlite
+from utils.db_connection import get_db, init_app
+
+# What a database created before the rollup and friends looked like
+EXISTING_SCHEMA = '''
+    CREATE TABLE students (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, age INTEGER,
+                           year_group TEXT, target_school TEXT, parent_contact TEXT, notes TEXT,
+                           created_date TEXT DEFAULT CURRENT_TIMESTAMP, last_session_date TEXT,
+                           active BOOLEAN DEFAULT 1);
+    CREATE TABLE tutors (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL,
+                         password_hash TEXT NOT NULL, full_name TEXT NOT NULL, email TEXT,
+                         created_date TEXT DEFAULT CURRENT_TIMESTAMP, last_login TEXT, active BOOLEAN DEFAULT 1);
+    CREATE TABLE main_topics (id INTEGER PRIMARY KEY AUTOINCREMENT, topic_name TEXT UNIQUE NOT NULL,
+                              description TEXT, target_year_groups TEXT, color_code TEXT);
+    CREATE TABLE subtopics (id INTEGER PRIMARY KEY AUTOINCREMENT, main_topic_id INTEGER,
+                            subtopic_name TEXT NOT NULL, description TEXT, difficulty_order INTEGER,
+                            prerequisite_subtopic_id INTEGER);
+    CREATE TABLE subtopic_progress (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER,
+                                    subtopic_id INTEGER, mastery_level INTEGER DEFAULT 1,
+                                    last_assessed TEXT, questions_attempted INTEGER DEFAULT 0,
+                                    questions_correct INTEGER DEFAULT 0, notes TEXT,
+                                    UNIQUE(student_id, subtopic_id));
+    CREATE TABLE questions (id INTEGER PRIMARY KEY AUTOINCREMENT, subtopic_id INTEGER,
+                            question_text TEXT NOT NULL, answer TEXT, difficulty_level INTEGER,
+                            time_estimate_minutes INTEGER, space_required TEXT, question_type TEXT,
+                            created_date TEXT DEFAULT CURRENT_TIMESTAMP, created_by_tutor_id INTEGER,
+                            active BOOLEAN DEFAULT 1, is_template BOOLEAN DEFAULT 0, template_params TEXT);
+    CREATE TABLE sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER, tutor_id INTEGER,
+                           session_date TEXT DEFAULT CURRENT_TIMESTAMP, duration_minutes INTEGER,
+                           main_topics_covered TEXT, tutor_notes TEXT, homework_set TEXT);
+'''
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """An existing database: one student assessed on one of two Number subtopics, one question"""
+    path = str(tmp_path / 'tutor_ai.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(EXISTING_SCHEMA)
+    conn.execute("INSERT INTO students (name) VALUES ('Ann')")
+    conn.execute("INSERT INTO main_topics (topic_name) VALUES ('Number')")
+    conn.execute("INSERT INTO subtopics (main_topic_id, subtopic_name) VALUES (1, 'Addition'), (1, 'Subtraction')")
+    conn.execute("INSERT INTO subtopic_progress (student_id, subtopic_id, mastery_level, last_assessed) "
+                 "VALUES (1, 1, 3, '2025-09-01 10:00:00')")
+    conn.execute("INSERT INTO questions (subtopic_id, question_text, difficulty_level) VALUES (1, '1 + 1', 1)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _tables(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+
+
+def _query(path, sql):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_existing_database_gets_a_backfilled_rollup(db_path):
+    assert 'student_topic_rollup' not in _tables(db_path)
+    init_sqlite(db_path)
+    assert _query(db_path, 'SELECT * FROM student_topic_rollup') == [(1, 1, 1, 3, 50.0)]
+
+    # Later startups leave the rows alone
+    init_sqlite(db_path)
+    assert _query(db_path, 'SELECT COUNT(*) FROM student_topic_rollup') == [(1,)]
+    assert _query(db_path, "SELECT username FROM tutors") == [('admin',)]
+
+
+def test_existing_database_gets_seeded_mastery_history(db_path, monkeypatch):
+    # last_assessed is local time; off UTC, reading it as UTC would shift the point
+    monkeypatch.setenv('TZ', 'Europe/London')
+    time.tzset()
+    try:
+        init_sqlite(db_path)
+        expected = int(datetime(2025, 9, 1, 10).timestamp())
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+    assert expected == 1756717200
+    assert _query(db_path, 'SELECT student_id, subtopic_id, ts, mastery_level FROM mastery_history') == [
+        (1, 1, expected, 3)]
+    init_sqlite(db_path)
+    assert _query(db_path, 'SELECT COUNT(*) FROM mastery_history') == [(1,)]
+
+
+def test_existing_database_gets_progress_versions(db_path):
+    init_sqlite(db_path)
+    (global_version,) = _query(db_path, 'SELECT version FROM progress_versions WHERE student_id = 0')
+    init_sqlite(db_path)
+    assert _query(db_path, 'SELECT version FROM progress_versions') == [global_version]
+
+
+def test_existing_students_are_searchable(db_path, monkeypatch):
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO students (name, target_school) VALUES ('Anna Smith', 'Tiffin')")
+    conn.execute("INSERT INTO sessions (student_id, tutor_notes) VALUES (1, 'Quadratics need work')")
+    conn.commit()
+    conn.close()
+    init_sqlite(db_path)
+    init_sqlite(db_path)
+
+    app = Flask(__name__)
+    app.config.update(DATABASE_PATH=db_path, SECRET_KEY='test')
+    init_app(app)
+    try:
+        with app.app_context():
+            assert {s.name for s in StudentService.search_students('ann')} == {'Ann', 'Anna Smith'}
+            assert [s.name for s in StudentService.search_students('quadr')] == ['Ann']
+    finally:
+        db_pool.close_pools()
+    assert _query(db_path, 'SELECT COUNT(*) FROM student_search') == [(2,)]
+
+def test_sessions_save_on_a_migrated_database(db_path, monkeypatch):
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    init_sqlite(db_path)
+    app = Flask(__name__)
+    app.config.update(DATABASE_PATH=db_path, SECRET_KEY='test')
+    init_app(app)
+    try:
+        with app.app_context():
+            session_id = SessionService.create_session_with_progress(1, 1, 60, {2: {'level': 2, 'notes': 'ok'}})
+            with get_db(readonly=True) as db:
+                assessments = db.execute('SELECT subtopic_id, old_level, new_level FROM session_assessments '
+                                         'WHERE session_id = ?', (session_id,)).fetchall()
+                rollup = db.execute('SELECT assessed_subtopics, completion_percentage FROM student_topic_rollup').fetchone()
+        assert [tuple(row) for row in assessments] == [(2, None, 2)]
+        assert tuple(rollup) == (2, 100.0)
+        assert _query(db_path, 'SELECT subtopic_id, mastery_level FROM mastery_history ORDER BY ts') == [(1, 3), (2, 2)]
+    finally:
+        db_pool.close_pools()
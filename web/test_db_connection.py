@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""Test the pooled database wrapper against a throwaway SQLite database"""
+
+import os
+import sys
+import sqlite3
+
+import pytest
+from flask import Flask
+
+sys.path.append('.')
+from utils import db_pool
+from utils.db_connection import get_db, init_app
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Minimal Flask app pointing the wrapper at a temporary SQLite file"""
+    # Other test modules point DATABASE_URL at PostgreSQL at import time
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+
+    db_path = str(tmp_path / 'test.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE students (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT)")
+    conn.commit()
+    conn.close()
+
+    app = Flask(__name__)
+    app.config.update(DATABASE_PATH=db_path, DB_POOL_SIZE=2, DB_POOL_TIMEOUT=0.2)
+    init_app(app)
+
+    yield app
+    db_pool.close_pools()
+
+
+def test_connections_are_reused(app):
+    """Sequential get_db() blocks should share one physical connection"""
+    with app.app_context():
+        with get_db() as db:
+            first = db.connection
+            db.execute("INSERT INTO students (name) VALUES (?)", ('Ada',))
+        with get_db() as db:
+            assert db.connection is first
+            row = db.execute("SELECT COUNT(*) AS count FROM students").fetchone()
+            assert row['count'] == 1
+
+        stats = db_pool.get_pool_stats()['sqlite']
+        assert stats['created'] == 1
+        assert stats['checkouts'] == 2
+
+
+def test_sqlite_profile_applied(app):
+    """New pooled SQLite connections get the configured PRAGMA profile"""
+    app.config.update(SQLITE_JOURNAL_MODE='WAL', SQLITE_BUSY_TIMEOUT=1234)
+    with app.app_context():
+        with get_db() as db:
+            assert db.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+            assert db.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+            assert db.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+
+def test_pool_is_bounded(app):
+    """Checking out more than DB_POOL_SIZE connections times out"""
+    with app.app_context():
+        first, second = get_db().connect(), get_db().connect()
+        try:
+            with pytest.raises(db_pool.PoolTimeout):
+                get_db().connect()
+        finally:
+            first.close()
+            second.close()
+
+        assert db_pool.get_pool_stats()['sqlite']['timeouts'] == 1
+
+
+def test_old_connections_are_recycled(app):
+    """Connections older than DB_POOL_RECYCLE are replaced on checkout"""
+    app.config['DB_POOL_RECYCLE'] = 0.001
+    with app.app_context():
+        with get_db() as db:
+            first = db.connection
+        import time
+        time.sleep(0.01)
+        with get_db() as db:
+            assert db.connection is not first
+
+        assert db_pool.get_pool_stats()['sqlite']['recycled'] == 1
+
+
+def test_failed_transaction_is_rolled_back(app):
+    """An exception inside get_db() rolls back before the connection is reused"""
+    with app.app_context():
+        with pytest.raises(RuntimeError):
+            with get_db() as db:
+                db.execute("INSERT INTO students (name) VALUES (?)", ('Grace',))
+                raise RuntimeError("boom")
+
+        with get_db() as db:
+            row = db.execute("SELECT COUNT(*) AS count FROM students").fetchone()
+            assert row['count'] == 0
+
+
+def test_request_shares_one_connection(app):
+    """Every get_db() scope in a request uses the same checked-out connection"""
+    with app.test_request_context('/'):
+        with get_db() as outer:
+            first = outer.connection
+            with get_db() as inner:
+                assert inner.connection is first
+        with get_db() as later:
+            assert later.connection is first
+
+    stats = db_pool.get_pool_stats()['sqlite']
+    assert stats['checkouts'] == 1
+    assert stats['idle'] == 1
+
+
+def test_nested_scope_rolls_back_to_savepoint(app):
+    """A failing nested scope only undoes its own writes"""
+    with app.test_request_context('/'):
+        with get_db() as outer:
+            outer.execute("INSERT INTO students (name) VALUES (?)", ('Outer',))
+            with pytest.raises(RuntimeError):
+                with get_db() as inner:
+                    inner.execute("INSERT INTO students (name) VALUES (?)", ('Inner',))
+                    raise RuntimeError("boom")
+
+        with get_db() as db:
+            names = [row['name'] for row in db.execute("SELECT name FROM students").fetchall()]
+            assert names == ['Outer']
+
+
+def test_outer_rollback_undoes_nested_writes(app):
+    """Writes committed by a nested scope are still part of the outer transaction"""
+    with app.test_request_context('/'):
+        with pytest.raises(RuntimeError):
+            with get_db() as outer:
+                outer.execute("SELECT COUNT(*) FROM students").fetchone()
+                with get_db() as inner:
+                    inner.execute("INSERT INTO students (name) VALUES (?)", ('Inner',))
+                raise RuntimeError("boom")
+
+        with get_db() as db:
+            row = db.execute("SELECT COUNT(*) AS count FROM students").fetchone()
+            assert row['count'] == 0
+
+
+def test_postgres_translation_is_cached():
+    """'?' placeholders are rewritten once per SQL text, escaping literal '%'"""
+    from utils.db_connection import _translate_postgres
+
+    query = "SELECT * FROM students WHERE name LIKE '%a%' AND id = ?"
+    assert _translate_postgres(query) == "SELECT * FROM students WHERE name LIKE '%%a%%' AND id = %s"
+    hits = _translate_postgres.cache_info().hits
+    _translate_postgres(query)
+    assert _translate_postgres.cache_info().hits == hits + 1
+
+
+def test_prepared_statement_body():
+    """PREPARE bodies use numbered parameters and a stable name"""
+    from utils.db_connection import _prepared_statement
+
+    name, body, count = _prepared_statement("SELECT * FROM tutors WHERE id = ? AND role = ?")
+    assert body == "SELECT * FROM tutors WHERE id = $1 AND role = $2"
+    assert count == 2
+    assert name.startswith('tutorai_')
+    assert _prepared_statement("SELECT * FROM tutors WHERE id = ? AND role = ?")[0] == name
+
+
+def test_insert_many_and_upsert(app):
+    """insert_many writes every row and honours an ON CONFLICT suffix"""
+    with app.app_context():
+        with get_db() as db:
+            db.execute("CREATE TABLE progress (student_id INTEGER, subtopic_id INTEGER, level INTEGER, "
+                       "UNIQUE(student_id, subtopic_id))")
+            db.insert_many('progress', ('student_id', 'subtopic_id', 'level'),
+                           [(1, s, 1) for s in range(40)])
+            db.insert_many('progress', ('student_id', 'subtopic_id', 'level'),
+                           [(1, s, 5) for s in range(20)],
+                           suffix='ON CONFLICT (student_id, subtopic_id) DO UPDATE SET level = EXCLUDED.level')
+            db.executemany("UPDATE progress SET level = ? WHERE subtopic_id = ?", [(9, 0), (9, 1)])
+
+        with get_db() as db:
+            rows = db.execute("SELECT level, COUNT(*) AS count FROM progress GROUP BY level ORDER BY level").fetchall()
+            assert [(row['level'], row['count']) for row in rows] == [(1, 20), (5, 18), (9, 2)]
+
+
+def test_insert_returning_id(app):
+    """insert_returning_id hands back the id of the row just inserted"""
+    with app.app_context():
+        with get_db() as db:
+            first = db.insert_returning_id("INSERT INTO students (name) VALUES (?)", ('Ada',))
+            second = db.insert_returning_id("INSERT INTO students (name) VALUES (?)", ('Ada',))
+            assert second == first + 1
+            row = db.execute("SELECT name FROM students WHERE id = ?", (second,)).fetchone()
+            assert row['name'] == 'Ada'
+
+
+def test_rows_support_key_attribute_and_index_access(app):
+    """Rows are tuples that also answer to column names"""
+    with app.app_context():
+        with get_db() as db:
+            db.execute("INSERT INTO students (name) VALUES (?)", ('Ada',))
+            row = db.execute("SELECT id, name, COUNT(*) AS count FROM students").fetchone()
+
+            assert row['name'] == row.name == row[1] == 'Ada'
+            assert row.count == 1
+            assert 'name' in row and 'missing' not in row
+            assert row.get('missing', 'x') == 'x'
+            assert {**row.to_dict()} == {'id': row.id, 'name': 'Ada', 'count': 1}
+            with pytest.raises(KeyError):
+                row['missing']
+
+
+def test_rows_share_one_class_per_shape(app):
+    """Every row of a result shape reuses the same cached class"""
+    import pickle
+
+    with app.app_context():
+        with get_db() as db:
+            db.executemany("INSERT INTO students (name) VALUES (?)", [('Ada',), ('Bo',)])
+            rows = db.execute("SELECT id, name FROM students ORDER BY id").fetchall()
+            assert type(rows[0]) is type(rows[1])
+            assert pickle.loads(pickle.dumps(rows[1])).name == 'Bo'
+
+
+def test_request_reports_server_timing(app):
+    """Each request carries its query count and DB time in Server-Timing"""
+    @app.route('/students')
+    def students():
+        with get_db() as db:
+            db.execute("INSERT INTO students (name) VALUES (?)", ('Ada',))
+            names = [row.name for row in db.execute("SELECT name FROM students").fetchall()]
+        return ', '.join(names)
+
+    response = app.test_client().get('/students')
+    assert response.status_code == 200
+    timing = response.headers['Server-Timing']
+    assert timing.startswith('db;dur=')
+    assert 'desc="2 queries"' in timing
+    assert 'db-slowest;dur=' in timing and 'app;dur=' in timing
+
+
+def test_slow_queries_are_logged(app, caplog):
+    """Statements over DB_SLOW_QUERY_MS log their SQL template and bind count"""
+    import json
+    app.config.update(DB_SLOW_QUERY_MS=0.000001)
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        with get_db() as db:
+            with caplog.at_level('WARNING', logger='utils.query_stats'):
+                db.execute("SELECT *\n    FROM students WHERE id = ? AND name = ?", (1, 'secret')).fetchall()
+
+    entry = json.loads(caplog.records[-1].getMessage())
+    assert entry['event'] == 'slow_query'
+    assert entry['sql'] == "SELECT * FROM students WHERE id = ? AND name = ?"
+    assert entry['binds'] == 2
+    assert 'secret' not in caplog.text
+
+
+def _lookup_each(ids):
+    with get_db() as db:
+        return [db.execute("SELECT name FROM students WHERE id = ?", (student_id,)).fetchone()
+                for student_id in ids]
+
+
+def test_repeated_statement_reports_call_site(app, caplog):
+    """The N+1 detector warns once per statement, naming where it was issued"""
+    import json
+    app.config.update(DB_N_PLUS_ONE_THRESHOLD=3)
+    with app.test_request_context('/students'):
+        app.preprocess_request()
+        with caplog.at_level('WARNING', logger='utils.query_stats'):
+            _lookup_each(range(3))
+            assert not caplog.records
+            _lookup_each(range(5))
+
+    reports = [json.loads(r.getMessage()) for r in caplog.records]
+    assert len(reports) == 1
+    assert reports[0]['event'] == 'n_plus_one'
+    assert reports[0]['count'] == 4
+    assert reports[0]['call_site'].startswith('test_db_connection.py:')
+    assert 'in _lookup_each' in reports[0]['call_site']
+
+
+def test_repeated_statement_can_fail(app):
+    """With DB_N_PLUS_ONE_RAISE the detector raises instead of warning"""
+    from utils.query_stats import NPlusOneQueryError
+    app.config.update(DB_N_PLUS_ONE_THRESHOLD=2, DB_N_PLUS_ONE_RAISE=True)
+    with app.test_request_context('/students'):
+        app.preprocess_request()
+        with pytest.raises(NPlusOneQueryError, match='_lookup_each'):
+            _lookup_each(range(3))
+
+
+@pytest.fixture
+def replica_app(app, tmp_path, monkeypatch):
+    """App whose 'primary' and 'replica' are two SQLite files standing in for PostgreSQL"""
+    from utils import db_connection
+
+    replica_path = str(tmp_path / 'replica.db')
+    conn = sqlite3.connect(replica_path)
+    conn.execute("CREATE TABLE students (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT)")
+    conn.execute("INSERT INTO students (name) VALUES ('from replica')")
+    conn.commit()
+    conn.close()
+
+    primary_path = app.config['DATABASE_PATH']
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://primary/tutor_ai')
+    monkeypatch.setenv('DATABASE_REPLICA_URLS', 'postgresql://replica/tutor_ai')
+    monkeypatch.setattr(db_connection.DatabaseConnection, '_get_pool',
+                        lambda self: (db_pool.get_pool(('sqlite', primary_path),
+                                                       lambda: db_connection._sqlite_pool(primary_path)), False))
+    monkeypatch.setattr(db_connection.DatabaseConnection, '_get_replica_pool',
+                        lambda self, urls: (db_pool.get_pool(('sqlite', replica_path),
+                                                             lambda: db_connection._sqlite_pool(replica_path)), False))
+    app.config.update(SECRET_KEY='test', DB_READ_YOUR_WRITES_SECONDS=60)
+
+    @app.route('/names')
+    def names():
+        with get_db(readonly=True) as db:
+            return ', '.join(row.name for row in db.execute("SELECT name FROM students").fetchall())
+
+    @app.route('/add')
+    def add():
+        with get_db() as db:
+            db.execute("INSERT INTO students (name) VALUES (?)", ('from primary',))
+        return names()
+
+    return app
+
+
+def test_readonly_scopes_use_replica(replica_app):
+    """Read-only scopes go to the replica; other scopes stay on the primary"""
+    with replica_app.test_request_context('/'):
+        with get_db(readonly=True) as db:
+            assert db.replica
+            assert db.execute("SELECT name FROM students").fetchone().name == 'from replica'
+        with get_db() as db:
+            assert not db.replica
+
+
+def test_reads_stay_on_primary_after_a_write(replica_app):
+    """A write pins the rest of the request and the user's next requests to the primary"""
+    client = replica_app.test_client()
+    assert client.get('/names').get_data(as_text=True) == 'from replica'
+    assert client.get('/add').get_data(as_text=True) == 'from primary'
+    assert client.get('/names').get_data(as_text=True) == 'from primary'
+    # Another user without the recent write still reads from the replica
+    assert replica_app.test_client().get('/names').get_data(as_text=True) == 'from replica'
+
+
+def test_write_detection():
+    """Only data-modifying statements count as writes"""
+    from utils.db_connection import _is_write
+
+    assert not _is_write("  select * from students")
+    assert not _is_write("WITH x AS (SELECT 1) SELECT * FROM x")
+    assert _is_write("INSERT INTO students (name) VALUES (?)")
+    assert _is_write("\n UPDATE students SET name = ?")
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""Test the progress read paths against a throwaway SQLite database"""
+
+import sys
+import random
+import sqlite3
+from decimal import Decimal
+
+import pytest
+from flask import Flask, jsonify
+from flask_login import LoginManager
+
+sys.path.append('.')
+from utils import db_pool, mastery_history, progress_cache, progress_rollup
+from utils.db_connection import get_db, init_app
+from utils.query_stats import get_request_stats
+from utils.decorators import progress_etag
+from session.services import SessionService
+from student.services import StudentService
+from topic.services import TopicService
+
+SCHEMA = '''
+    CREATE TABLE students (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, age INTEGER,
+                           year_group TEXT, target_school TEXT, parent_contact TEXT, notes TEXT,
+                           created_date TEXT DEFAULT CURRENT_TIMESTAMP, last_session_date TEXT,
+                           active BOOLEAN DEFAULT 1);
+    CREATE TABLE tutors (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL,
+                         password_hash TEXT NOT NULL, full_name TEXT NOT NULL, email TEXT,
+                         active BOOLEAN DEFAULT 1, role TEXT DEFAULT 'tutor');
+    CREATE TABLE main_topics (id INTEGER PRIMARY KEY AUTOINCREMENT, topic_name TEXT UNIQUE NOT NULL,
+                              description TEXT, target_year_groups TEXT, color_code TEXT);
+    CREATE TABLE subtopics (id INTEGER PRIMARY KEY AUTOINCREMENT, main_topic_id INTEGER,
+                            subtopic_name TEXT NOT NULL, description TEXT, difficulty_order INTEGER,
+                            prerequisite_subtopic_id INTEGER);
+    CREATE TABLE subtopic_progress (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER,
+                                    subtopic_id INTEGER, mastery_level INTEGER DEFAULT 1,
+                                    last_assessed TEXT, questions_attempted INTEGER DEFAULT 0,
+                                    questions_correct INTEGER DEFAULT 0, notes TEXT,
+                                    UNIQUE(student_id, subtopic_id));
+    CREATE TABLE sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER, tutor_id INTEGER,
+                           session_date TEXT DEFAULT CURRENT_TIMESTAMP, duration_minutes INTEGER,
+                           main_topics_covered TEXT, tutor_notes TEXT, homework_set TEXT);
+    CREATE TABLE session_assessments (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id INTEGER NOT NULL,
+                                      subtopic_id INTEGER NOT NULL, old_level INTEGER,
+                                      new_level INTEGER NOT NULL, notes TEXT);
+    CREATE INDEX idx_session_assessments_session ON session_assessments(session_id);
+'''
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App with three topics of five subtopics and random progress for four students"""
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    db_path = str(tmp_path / 'progress.db')
+
+    rng = random.Random(11)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    conn.execute(progress_rollup.CREATE_TABLE_SQL)
+    conn.execute("INSERT INTO tutors (username, password_hash, full_name) VALUES ('tutor', 'x', 'Tutor')")
+    for topic in range(1, 4):
+        conn.execute("INSERT INTO main_topics (topic_name, color_code) VALUES (?, '#fff')", (f"Topic {topic}",))
+        for order in range(1, 6):
+            conn.execute("INSERT INTO subtopics (main_topic_id, subtopic_name, difficulty_order) VALUES (?, ?, ?)",
+                         (topic, f"Subtopic {topic}.{order}", order))
+    # A topic with no subtopics still counts towards overall progress
+    conn.execute("INSERT INTO main_topics (topic_name, color_code) VALUES ('Empty', '#000')")
+    for name in ('Ann', 'Bob', 'Cat', 'Dan'):
+        conn.execute("INSERT INTO students (name, age, year_group) VALUES (?, 10, 'Year 5')", (name,))
+    for student_id in (1, 2, 3):
+        for subtopic_id in rng.sample(range(1, 16), rng.randint(1, 15)):
+            conn.execute("INSERT INTO subtopic_progress (student_id, subtopic_id, mastery_level, last_assessed) "
+                         "VALUES (?, ?, ?, '2025-01-01T10:00:00')", (student_id, subtopic_id, rng.randint(0, 10)))
+    conn.execute(progress_rollup.REBUILD_SQL)
+    progress_cache.create_table(conn)
+    conn.execute(mastery_history.CREATE_TABLE_SQL)
+    conn.execute(mastery_history.CREATE_INDEX_SQL)
+    conn.commit()
+    conn.close()
+
+    app = Flask(__name__)
+    app.config.update(DATABASE_PATH=db_path, SECRET_KEY='test')
+    init_app(app)
+
+    yield app
+    db_pool.close_pools()
+    progress_cache.clear_local()
+
+
+# The topic summary aggregate the rollup replaces
+AGGREGATE_SUMMARY_SQL = '''
+    SELECT
+        mt.topic_name,
+        mt.color_code,
+        COUNT(s.id) as total_subtopics,
+        COUNT(sp.id) as assessed_subtopics,
+        ROUND(AVG(CASE WHEN sp.mastery_level IS NOT NULL THEN sp.mastery_level ELSE 0 END), 1) as avg_mastery,
+        ROUND(CASE
+            WHEN COUNT(s.id) > 0 THEN (COUNT(sp.id) * 100.0 / COUNT(s.id))
+            ELSE 0.0
+        END, 1) as completion_percentage
+    FROM main_topics mt
+    LEFT JOIN subtopics s ON mt.id = s.main_topic_id
+    LEFT JOIN subtopic_progress sp ON s.id = sp.subtopic_id AND sp.student_id = ?
+    GROUP BY mt.id, mt.topic_name
+    ORDER BY mt.topic_name
+'''
+
+
+def _aggregate_summary(student_id):
+    with get_db() as db:
+        return [row.to_dict() for row in db.execute(AGGREGATE_SUMMARY_SQL, (student_id,)).fetchall()]
+
+
+def _rollup_summary(student_id):
+    summaries = StudentService.get_student_progress_summary(student_id)['topic_summaries']
+    return [row.to_dict() for row in summaries]
+
+
+def _assert_rollup_current():
+    with get_db() as db:
+        student_ids = [row.id for row in db.execute("SELECT id FROM students").fetchall()]
+    for student_id in student_ids:
+        assert _rollup_summary(student_id) == _aggregate_summary(student_id)
+
+
+def _progress_from_summary(student_id):
+    """Roster figures as list_students used to compute them, one summary per student"""
+    summaries = _aggregate_summary(student_id)
+    overall, assessed = 0, 0
+    for topic in summaries:
+        if topic['assessed_subtopics']:
+            assessed += topic['assessed_subtopics']
+            overall += float(topic['completion_percentage'])
+    return {'overall_progress': round(overall / len(summaries), 1), 'topics_assessed': assessed}
+
+
+def test_roster_progress_matches_per_student_summaries(app):
+    """One grouped query gives the same figures as a summary per student"""
+    with app.app_context():
+        roster = StudentService.get_roster_progress()
+        assert set(roster) == {1, 2, 3}
+        for student_id in (1, 2, 3):
+            assert roster[student_id] == _progress_from_summary(student_id)
+
+        assert StudentService.get_roster_progress([2, 4]) == {2: roster[2]}
+        assert StudentService.get_roster_progress([]) == {}
+
+
+def test_rollup_summary_matches_aggregate(app):
+    """Topic summaries read from the rollup equal the full aggregate"""
+    with app.app_context():
+        _assert_rollup_current()
+
+
+def test_rollup_follows_progress_and_subtopic_changes(app):
+    """Sessions, subtopic create/delete and student delete keep the rollup current"""
+    with app.app_context():
+        SessionService.create_session_with_progress(4, 1, 60, {1: {'level': 7}, 6: {'level': 3}, 7: {'level': 9}})
+        SessionService.create_session_with_progress(1, 1, 45, {2: {'level': 10}})
+        _assert_rollup_current()
+
+        TopicService.create_subtopic(1, 'Subtopic 1.6', difficulty_order=6)
+        _assert_rollup_current()
+
+        TopicService.delete_subtopic(7)
+        _assert_rollup_current()
+
+        StudentService.delete_student(4)
+        with get_db() as db:
+            assert db.execute("SELECT COUNT(*) AS count FROM student_topic_rollup WHERE student_id = 4"
+                              ).fetchone()['count'] == 0
+
+        with get_db() as db:
+            before = db.execute("SELECT * FROM student_topic_rollup ORDER BY student_id, main_topic_id").fetchall()
+            assert progress_rollup.rebuild(db) == len(before)
+            after = db.execute("SELECT * FROM student_topic_rollup ORDER BY student_id, main_topic_id").fetchall()
+        assert after == before
+
+
+WEAK_AREAS_SQL = '''
+    SELECT s.subtopic_name, mt.topic_name, sp.mastery_level
+    FROM subtopic_progress sp
+    JOIN subtopics s ON sp.subtopic_id = s.id
+    JOIN main_topics mt ON s.main_topic_id = mt.id
+    WHERE sp.student_id = ? AND sp.mastery_level BETWEEN 3 AND 6
+'''
+
+READY_TO_ADVANCE_SQL = '''
+    SELECT s.subtopic_name, s.id, next_s.subtopic_name as next_subtopic
+    FROM subtopic_progress sp
+    JOIN subtopics s ON sp.subtopic_id = s.id
+    LEFT JOIN subtopics next_s ON next_s.main_topic_id = s.main_topic_id
+        AND next_s.difficulty_order = s.difficulty_order + 1
+    WHERE sp.student_id = ? AND sp.mastery_level >= 8
+        AND (next_s.id IS NULL OR next_s.id NOT IN (
+            SELECT subtopic_id FROM subtopic_progress WHERE student_id = ? AND mastery_level > 0
+        ))
+'''
+
+
+def _summary_and_query_count(app, student_id):
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        summary = SessionService.get_student_progress_summary(student_id)
+        return summary, get_request_stats().count
+
+
+def test_session_summary_reads_the_rollup_and_matches_sql(app):
+    """The detail-page summary is the rollup read plus one ordered join (and the version lookup), and agrees with the per-section SQL"""
+    with app.app_context():
+        for student_id in (1, 2, 3, 4):
+            summary, queries = _summary_and_query_count(app, student_id)
+            assert queries == 3
+
+            topics = [{k: v for k, v in topic.items() if k != 'id'} for topic in summary['topic_summaries']]
+            assert topics == _aggregate_summary(student_id)
+            assert [len(t['subtopics']) for t in summary['detailed_progress']] == [t['total_subtopics'] for t in topics]
+
+            with get_db() as db:
+                weak = [row.to_dict() for row in db.execute(WEAK_AREAS_SQL, (student_id,)).fetchall()]
+                ready = [row.to_dict() for row in
+                         db.execute(READY_TO_ADVANCE_SQL, (student_id, student_id)).fetchall()]
+            assert [a['mastery_level'] for a in summary['weak_areas']] == \
+                sorted(a['mastery_level'] for a in weak)[:5]
+            assert all(area in weak for area in summary['weak_areas'])
+            assert len(summary['ready_to_advance']) == min(3, len(ready))
+            assert all(item in ready for item in summary['ready_to_advance'])
+
+
+def test_session_summary_topics_come_from_the_rollup(app):
+    with app.app_context():
+        with get_db() as db:
+            db.execute("UPDATE student_topic_rollup SET completion_percentage = 12.5 WHERE student_id = 1")
+            progress_cache.bump(db, 1)
+        summaries = SessionService.get_student_progress_summary(1)['topic_summaries']
+        assert 12.5 in [topic['completion_percentage'] for topic in summaries]
+
+
+def test_summary_cache_follows_progress_version(app):
+    """Repeat summaries come from the cache until a write bumps the version"""
+    with app.app_context():
+        first, _ = _summary_and_query_count(app, 1)
+        cached, queries = _summary_and_query_count(app, 1)
+        assert cached is first and queries == 1
+
+        # Another student's session leaves this student's entry alone
+        SessionService.create_session_with_progress(2, 1, 30, {3: {'level': 4}})
+        assert _summary_and_query_count(app, 1) == (first, 1)
+
+        SessionService.create_session_with_progress(1, 1, 30, {3: {'level': 9}})
+        after_session, queries = _summary_and_query_count(app, 1)
+        assert queries == 3 and after_session['topic_summaries'] == _rollup_summary_with_ids(1)
+
+        TopicService.delete_subtopic(4)
+        after_delete, queries = _summary_and_query_count(app, 1)
+        assert queries == 3 and after_delete['topic_summaries'] == _rollup_summary_with_ids(1)
+
+        TopicService.delete_main_topic(3)
+        assert 'Topic 3' not in [t['topic_name'] for t in
+                                 SessionService.get_student_progress_summary(1)['topic_summaries']]
+
+        version = _version(1)
+        StudentService.delete_student(1)
+        assert _version(1) != version
+
+
+def _version(student_id):
+    with get_db() as db:
+        return progress_cache.get_version(db, student_id)
+
+
+def _rollup_summary_with_ids(student_id):
+    with get_db() as db:
+        topic_ids = {row.topic_name: row.id for row in db.execute("SELECT id, topic_name FROM main_topics")}
+    return [{'id': topic_ids[topic['topic_name']], **topic} for topic in _aggregate_summary(student_id)]
+
+
+def test_shared_cache_tier_serves_other_workers(app, tmp_path):
+    """A summary stored in the shared file is found after the local LRU is gone"""
+    app.config.update(PROGRESS_CACHE_PATH=str(tmp_path / 'progress_cache.db'), PROGRESS_CACHE_SIZE=2)
+    with app.app_context():
+        expected = SessionService.get_student_progress_summary(2)
+        for student_id in (1, 3, 4):
+            SessionService.get_student_progress_summary(student_id)
+
+        # Student 2 has been evicted from the two-entry LRU
+        progress_cache.clear_local()
+        shared, queries = _summary_and_query_count(app, 2)
+        assert shared == expected and shared is not expected and queries == 1
+
+        SessionService.create_session_with_progress(2, 1, 30, {5: {'level': 2}})
+        progress_cache.clear_local()
+        assert _summary_and_query_count(app, 2)[1] == 3
+
+
+def test_lru_cache_is_bounded():
+    cache = progress_cache.LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c'), len(cache)) == (1, None, 3, 2)
+
+
+def test_shared_cache_stores_decimals_and_skips_unserializable_summaries(app, tmp_path):
+    """PostgreSQL NUMERICs come back as Decimal; anything else JSON can't hold is a cache miss"""
+    app.config.update(PROGRESS_CACHE_PATH=str(tmp_path / 'progress_cache.db'))
+    with app.app_context():
+        progress_cache.put(1, 'v1', {'avg_mastery': Decimal('3.5')})
+        progress_cache.put(2, 'v1', {'seen': object()})
+        progress_cache.clear_local()
+        assert progress_cache.get(1, 'v1') == {'avg_mastery': 3.5}
+        assert progress_cache.get(2, 'v1') is None
+
+
+def test_mastery_levels_match_per_subtopic_lookups(app):
+    """One query gives every subtopic's level, as the per-subtopic lookup did"""
+    with app.app_context():
+        for student_id in (1, 2, 4):
+            levels = StudentService.get_mastery_levels(student_id)
+            for subtopic_id in range(1, 16):
+                progress = StudentService.get_subtopic_progress(student_id, subtopic_id)
+                assert levels.get(subtopic_id, 0) == (progress['mastery_level'] if progress else 0)
+        assert StudentService.get_mastery_levels(4) == {}
+
+
+def test_session_entry_data_loads_in_one_query(app):
+    """Topics and their subtopics come from one join, subtopics in difficulty order"""
+    with app.app_context():
+        with get_db() as db:
+            db.execute("INSERT INTO main_topics (topic_name) VALUES ('AAA Empty')")
+            expected = {}
+            for topic in db.execute('SELECT id FROM main_topics').fetchall():
+                expected[topic.id] = [row.id for row in db.execute(
+                    'SELECT id FROM subtopics WHERE main_topic_id = ? ORDER BY difficulty_order, id',
+                    (topic.id,)).fetchall()]
+
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        entry_data = SessionService.get_session_entry_data()
+        assert get_request_stats().count == 1
+
+    names = [topic['topic_name'] for topic in entry_data]
+    assert names[0] == 'AAA Empty' and names == sorted(names)
+    assert entry_data[0]['subtopics'] == []
+    assert {topic['id']: [s['id'] for s in topic['subtopics']] for topic in entry_data} == expected
+
+
+def test_recent_sessions_come_from_the_assessment_ledger(app):
+    """Each session lists exactly what it assessed, old and new level, in one query"""
+    with app.app_context():
+        first = SessionService.create_session_with_progress(4, 1, 60, {1: {'level': 3, 'notes': 'new'}, 6: {'level': 5}})
+        second = SessionService.create_session_with_progress(4, 1, 30, {1: {'level': 7}})
+        with get_db() as db:
+            # Same timestamp for both, which fooled the old DATE() match
+            db.execute("UPDATE sessions SET session_date = '2025-02-01T10:00:00' WHERE id = ?", (first,))
+            db.execute("UPDATE sessions SET session_date = '2025-02-01T11:00:00' WHERE id = ?", (second,))
+
+        with app.test_request_context('/'):
+            app.preprocess_request()
+            sessions = SessionService.get_recent_sessions_with_progress(4)
+            assert get_request_stats().count == 1
+
+        assert [s['id'] for s in sessions] == [second, first]
+        assert sessions[0]['session_date'] == '01-02-25 @ 11:00'
+        assert sessions[0]['subtopics_assessed'] == [
+            {'subtopic_name': 'Subtopic 1.1', 'old_level': 3, 'new_level': 7, 'notes': ''}]
+        assert sessions[1]['subtopics_assessed'] == [
+            {'subtopic_name': 'Subtopic 1.1', 'old_level': None, 'new_level': 3, 'notes': 'new'},
+            {'subtopic_name': 'Subtopic 2.1', 'old_level': None, 'new_level': 5, 'notes': ''}]
+        assert SessionService.get_recent_sessions_with_progress(4, limit=1)[0]['id'] == second
+
+        # Deleting a subtopic keeps what past sessions recorded for it
+        TopicService.delete_subtopic(6)
+        assert SessionService.get_recent_sessions_with_progress(4)[1]['subtopics_assessed'][1] == {
+            'subtopic_name': 'Deleted subtopic', 'old_level': None, 'new_level': 5, 'notes': ''}
+        TopicService.delete_main_topic(1)
+        assert [a['subtopic_name'] for a in SessionService.get_recent_sessions_with_progress(4)[0]['subtopics_assessed']] \
+            == ['Deleted subtopic']
+        StudentService.delete_student(4)
+        with get_db() as db:
+            assert db.execute("SELECT COUNT(*) AS count FROM session_assessments").fetchone()['count'] == 0
+
+
+WEEK = 7 * 24 * 3600
+
+
+def test_mastery_history_downsamples_years_of_sessions(app):
+    """Five years of weekly assessments come back as at most `points` buckets per series"""
+    start = 1_600_000_000
+    rng = random.Random(5)
+    expected = {}
+    with app.app_context():
+        with get_db() as db:
+            for week in range(260):
+                levels = {subtopic_id: rng.randint(1, 10) for subtopic_id in (1, 2, 6)}
+                mastery_history.record(db, 4, levels, ts=start + week * WEEK)
+                for subtopic_id, level in levels.items():
+                    expected.setdefault(subtopic_id, []).append((start + week * WEEK, level))
+            # Another student's history stays out of the series
+            mastery_history.record(db, 3, {1: 10}, ts=start)
+
+        until = start + 260 * WEEK
+        history = StudentService.get_mastery_history(4, start, until, by='subtopic', points=52)
+        bucket = history['bucket_seconds']
+        assert bucket == 5 * WEEK
+        assert [(s['id'], s['name'], len(s['points'])) for s in history['series']] == \
+            [(1, 'Subtopic 1.1', 52), (2, 'Subtopic 1.2', 52), (6, 'Subtopic 2.1', 52)]
+        for series in history['series']:
+            samples = expected[series['id']]
+            for index, (ts, mastery) in enumerate(series['points']):
+                in_bucket = [level for when, level in samples if (when - start) // bucket == index]
+                assert mastery == round(sum(in_bucket) / len(in_bucket), 1)
+                assert ts == max(when for when, _ in samples if (when - start) // bucket == index)
+
+        by_topic = StudentService.get_mastery_history(4, start, until, points=10)['series']
+        assert [(s['name'], len(s['points'])) for s in by_topic] == [('Topic 1', 10), ('Topic 2', 10)]
+        only = StudentService.get_mastery_history(4, start, start + 2 * 24 * 3600, by='subtopic', subtopic_id=6)
+        assert [s['id'] for s in only['series']] == [6] and only['bucket_seconds'] == 3600
+        with pytest.raises(ValueError):
+            StudentService.get_mastery_history(4, until, start)
+
+
+def test_sessions_append_to_mastery_history(app):
+    """Every assessment appends a point; the latest level is still in subtopic_progress"""
+    with app.app_context():
+        session_id = SessionService.create_session_with_progress(4, 1, 60, {1: {'level': 3}, 2: {'level': 5}})
+        SessionService.create_session_with_progress(4, 1, 60, {1: {'level': 6}})
+        with get_db() as db:
+            rows = db.execute("SELECT subtopic_id, mastery_level, session_id FROM mastery_history "
+                              "WHERE student_id = 4 ORDER BY rowid").fetchall()
+        assert [(r.subtopic_id, r.mastery_level) for r in rows] == [(1, 3), (2, 5), (1, 6)]
+        assert rows[0].session_id == session_id
+
+        TopicService.delete_subtopic(2)
+        StudentService.delete_student(4)
+        with get_db() as db:
+            assert db.execute("SELECT COUNT(*) AS count FROM mastery_history").fetchone()['count'] == 0
+
+
+def test_progress_etag_answers_304_without_running_the_view(app):
+    """An unchanged student gets a 304 from two keyed lookups; any write changes the tag"""
+    LoginManager(app).user_loader(lambda user_id: None)
+    calls = []
+
+    @app.route('/progress/<int:student_id>')
+    @progress_etag()
+    def progress_view(student_id):
+        calls.append(student_id)
+        return jsonify(SessionService.get_student_progress_summary(student_id))
+
+    client = app.test_client()
+    first = client.get('/progress/1')
+    tag = first.headers['ETag']
+    assert first.status_code == 200 and tag.startswith('W/')
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    again = client.get('/progress/1', headers={'If-None-Match': tag})
+    assert again.status_code == 304 and again.headers['ETag'] == tag and calls == [1]
+    assert 'desc="2 queries"' in again.headers['Server-Timing']
+
+    # Another student's tag differs, and a session changes this one's
+    assert client.get('/progress/2', headers={'If-None-Match': tag}).status_code == 200
+    with app.app_context():
+        SessionService.create_session_with_progress(1, 1, 30, {4: {'level': 6}})
+    changed = client.get('/progress/1', headers={'If-None-Match': tag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != tag
+
+    # Topic edits and student edits change it too
+    tag = changed.headers['ETag']
+    with app.app_context():
+        TopicService.update_main_topic(1, 'Topic One', color_code='#fff')
+    tag_after_topic = client.get('/progress/1').headers['ETag']
+    assert tag_after_topic != tag
+    with app.app_context():
+        StudentService.update_student(1, 'Ann', 11, 'Year 6')
+    assert client.get('/progress/1', headers={'If-None-Match': tag_after_topic}).status_code == 200
+
+    # Unknown students fall through to the view untagged
+    missing = client.get('/progress/99')
+    assert 'ETag' not in missing.headers
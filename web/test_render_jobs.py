@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""Test the background PDF render queue against a throwaway SQLite database"""
+
+import os
+import sys
+import time
+import sqlite3
+import threading
+from datetime import date
+
+import pytest
+from flask import Flask
+
+sys.path.append('.')
+from utils import db_pool, pdf_cache, render_jobs
+from utils.db_connection import get_db, init_app
+from worksheet import routes as worksheet_routes
+from worksheet.services import WorksheetService
+
+SCHEMA = '''
+    CREATE TABLE students (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL);
+    CREATE TABLE main_topics (id INTEGER PRIMARY KEY AUTOINCREMENT, topic_name TEXT NOT NULL);
+    CREATE TABLE subtopics (id INTEGER PRIMARY KEY AUTOINCREMENT, main_topic_id INTEGER,
+                            subtopic_name TEXT NOT NULL);
+    CREATE TABLE questions (id INTEGER PRIMARY KEY AUTOINCREMENT, subtopic_id INTEGER,
+                            question_text TEXT NOT NULL, answer TEXT, difficulty_level INTEGER,
+                            time_estimate_minutes INTEGER, space_required TEXT);
+    CREATE TABLE worksheets (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER, subtopic_id INTEGER,
+                             title TEXT, difficulty_level TEXT, generated_date TEXT DEFAULT CURRENT_TIMESTAMP,
+                             generated_by_tutor_id INTEGER, pdf_path TEXT, status TEXT DEFAULT 'draft',
+                             session_id INTEGER, notes TEXT);
+    CREATE TABLE worksheet_questions (id INTEGER PRIMARY KEY AUTOINCREMENT, worksheet_id INTEGER,
+                                      question_id INTEGER, question_order INTEGER,
+                                      custom_question_text TEXT, space_allocated TEXT);
+'''
+
+
+def fake_render(worksheet_data, filepath, render_date):
+    """Stands in for ReportLab; importable by the spawned pool processes"""
+    worksheet = worksheet_data['worksheet']
+    if worksheet['title'] == 'explode':
+        raise RuntimeError('layout failed')
+    with open(filepath, 'w') as f:
+        f.write('\n'.join([worksheet['student_name']] + [q['custom_question_text'] or q['original_text']
+                                                  for q in worksheet_data['questions']]))
+    with open(os.path.join(os.environ['RENDER_TEST_DIR'], 'renders.log'), 'a') as f:
+        f.write(f"{worksheet['id']} {render_date.isoformat()}\n")
+    return filepath
+
+
+def _render_count(tmp_path):
+    log = tmp_path / 'renders.log'
+    return len(log.read_text().splitlines()) if log.exists() else 0
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Four worksheets for Ann, two questions each; the last two have identical content"""
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    monkeypatch.setenv('RENDER_TEST_DIR', str(tmp_path))
+    monkeypatch.setattr(render_jobs, 'RENDERER', f"{__name__}:fake_render")
+    db_path = str(tmp_path / 'worksheets.db')
+
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    render_jobs.create_table(conn.cursor())
+    conn.execute("INSERT INTO students (name) VALUES ('Ann')")
+    conn.execute("INSERT INTO main_topics (topic_name) VALUES ('Number')")
+    conn.execute("INSERT INTO subtopics (main_topic_id, subtopic_name) VALUES (1, 'Addition')")
+    conn.execute("INSERT INTO questions (subtopic_id, question_text, space_required) VALUES (1, '1 + 1', 'none'), (1, '2 + 2', 'small')")
+    for n in range(4):
+        conn.execute("INSERT INTO worksheets (student_id, subtopic_id, title) VALUES (1, 1, ?)",
+                     (f"Sheet {min(n, 2)}",))
+        conn.execute("INSERT INTO worksheet_questions (worksheet_id, question_id, question_order) VALUES (?, 1, 1), (?, 2, 2)",
+                     (n + 1, n + 1))
+    conn.commit()
+    conn.close()
+
+    app = Flask(__name__)
+    app.config.update(DATABASE_PATH=db_path, SECRET_KEY='test', PDF_RENDER_WORKERS=0,
+                      PDF_CACHE_DIR=str(tmp_path / 'pdfs'))
+    pdf_cache.reset_stats()
+    init_app(app)
+
+    yield app
+    for pool in render_jobs._pools.values():
+        pool.shutdown()
+    render_jobs._pools.clear()
+    db_pool.close_pools()
+
+
+def _jobs():
+    with get_db() as db:
+        return {row.worksheet_id: row for row in db.execute('SELECT * FROM render_jobs').fetchall()}
+
+
+def test_inline_render_finalizes_the_worksheet(app):
+    with app.app_context():
+        WorksheetService.queue_pdf(1)
+        job = WorksheetService.get_pdf_job(1)
+        assert job.status == 'done' and job.attempts == 1 and job.error is None
+        worksheet = WorksheetService.get_worksheet(1)['worksheet']
+        assert worksheet['status'] == 'finalized' and worksheet['pdf_path'] == job.pdf_path
+        with open(job.pdf_path) as f:
+            assert f.read() == 'Ann\n1 + 1\n2 + 2'
+        assert WorksheetService.get_pdf_job(2) is None
+
+
+def test_failed_render_is_recorded_and_can_be_requeued(app):
+    with app.app_context():
+        with get_db() as db:
+            db.execute("UPDATE worksheets SET title = 'explode' WHERE id = 2")
+        WorksheetService.queue_pdf(2)
+        job = WorksheetService.get_pdf_job(2)
+        assert job.status == 'failed' and job.error == 'RuntimeError: layout failed'
+        assert WorksheetService.get_worksheet(2)['worksheet']['status'] == 'draft'
+
+        with get_db() as db:
+            db.execute("UPDATE worksheets SET title = 'Fixed' WHERE id = 2")
+        WorksheetService.queue_pdf(2)
+        assert WorksheetService.get_pdf_job(2).status == 'done'
+
+
+def test_claims_respect_the_concurrency_bound(app):
+    with app.app_context():
+        with get_db() as db:
+            for worksheet_id in (1, 2, 3):
+                render_jobs.enqueue(db, worksheet_id)
+        assert [render_jobs._claim(2)[0] for _ in range(2)] == [1, 2]
+        assert render_jobs._claim(2) is None
+        assert {w: job.status for w, job in _jobs().items()} == {1: 'running', 2: 'running', 3: 'queued'}
+
+
+def test_stale_jobs_are_retried_then_failed(app):
+    with app.app_context():
+        with get_db() as db:
+            render_jobs.enqueue(db, 1)
+        _, token = render_jobs._claim(1)
+
+        # A worker that dies mid-render leaves the job running until it goes stale
+        app.config['PDF_RENDER_TIMEOUT'] = -1
+        for attempt in range(2, render_jobs.MAX_ATTEMPTS + 1):
+            _, token = render_jobs._claim(1)
+            assert _jobs()[1].attempts == attempt
+        assert render_jobs._claim(1) is None
+        job = _jobs()[1]
+        assert job.status == 'failed' and job.error == 'Render did not finish'
+
+
+def test_requeue_while_running_ignores_the_stale_result(app):
+    with app.app_context():
+        with get_db() as db:
+            render_jobs.enqueue(db, 1)
+        _, old_token = render_jobs._claim(1)
+        with get_db() as db:
+            render_jobs.enqueue(db, 1)
+        render_jobs._record(1, old_token, pdf_path='old.pdf')
+        assert _jobs()[1].status == 'queued'
+        assert WorksheetService.get_worksheet(1)['worksheet']['pdf_path'] is None
+
+
+def test_process_pool_renders_in_the_background(app):
+    app.config['PDF_RENDER_WORKERS'] = 2
+    with app.app_context():
+        for worksheet_id in (1, 2, 3, 4):
+            WorksheetService.queue_pdf(worksheet_id)
+        assert {job.status for job in _jobs().values()} <= {'queued', 'running', 'done'}
+
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline and any(job.status != 'done' for job in _jobs().values()):
+            time.sleep(0.1)
+        jobs = _jobs()
+        assert all(job.status == 'done' for job in jobs.values()), jobs
+        for worksheet_id, job in jobs.items():
+            worksheet = WorksheetService.get_worksheet(worksheet_id)['worksheet']
+            assert worksheet['status'] == 'finalized' and os.path.exists(worksheet['pdf_path'])
+
+
+def test_concurrent_callers_share_one_executor():
+    pool = render_jobs.RenderPool(1)
+    barrier = threading.Barrier(8)
+    executors = []
+
+    def start():
+        barrier.wait()
+        executors.append(pool.executor())
+
+    threads = [threading.Thread(target=start) for _ in range(8)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len({id(executor) for executor in executors}) == 1
+
+        # Resetting an executor that was already replaced keeps the current one
+        current = pool.executor()
+        pool.reset(object())
+        assert pool.executor() is current
+        pool.reset(current)
+        assert pool.executor() is not current
+    finally:
+        pool.shutdown()
+
+
+def test_identical_content_is_rendered_once(app, tmp_path):
+    with app.app_context():
+        WorksheetService.queue_pdf(3)
+        WorksheetService.queue_pdf(3)
+        WorksheetService.queue_pdf(4)
+        assert _render_count(tmp_path) == 1
+        assert pdf_cache.stats() == {'hits': 2, 'misses': 1, 'hit_rate': 0.667}
+
+        paths = {WorksheetService.get_worksheet(w)['worksheet']['pdf_path'] for w in (3, 4)}
+        key = pdf_cache.content_key(WorksheetService.get_worksheet(3))
+        assert paths == {str(tmp_path / 'pdfs' / key[:2] / f"{key}.pdf")}
+
+        # Whitespace doesn't change the key; an edited question does
+        with get_db() as db:
+            db.execute("UPDATE worksheets SET title = '  Sheet   2 ' WHERE id = 4")
+        assert pdf_cache.content_key(WorksheetService.get_worksheet(4)) == key
+        with get_db() as db:
+            db.execute("UPDATE worksheet_questions SET custom_question_text = '3 + 3' WHERE worksheet_id = 4 AND question_order = 1")
+        WorksheetService.queue_pdf(4)
+        assert _render_count(tmp_path) == 2
+        with open(WorksheetService.get_pdf_job(4).pdf_path) as f:
+            assert f.read() == 'Ann\n3 + 3\n2 + 2'
+        assert pdf_cache.stats()['misses'] == 2
+        assert not list((tmp_path / 'pdfs').rglob('*.tmp'))
+
+
+def test_failed_render_leaves_no_cache_entry(app, tmp_path):
+    with app.app_context():
+        with get_db() as db:
+            db.execute("UPDATE worksheets SET title = 'explode' WHERE id = 1")
+        WorksheetService.queue_pdf(1)
+        WorksheetService.queue_pdf(1)
+        assert pdf_cache.stats()['misses'] == 2
+        assert not [path for path in (tmp_path / 'pdfs').rglob('*') if path.is_file()]
+
+
+def test_printed_date_is_the_cached_date(app, tmp_path, monkeypatch):
+    class Yesterday(date):
+        @classmethod
+        def today(cls):
+            return date(2025, 9, 1)
+
+    monkeypatch.setattr(render_jobs, 'date', Yesterday)
+    with app.app_context():
+        WorksheetService.queue_pdf(1)
+        key = pdf_cache.content_key(WorksheetService.get_worksheet(1), date(2025, 9, 1))
+        assert WorksheetService.get_pdf_job(1).pdf_path == pdf_cache.path_for(key)
+    assert (tmp_path / 'renders.log').read_text() == '1 2025-09-01\n'
+
+
+def test_status_polls_only_pump_stalled_jobs(app, monkeypatch):
+    pumps = []
+    with app.app_context():
+        with get_db() as db:
+            render_jobs.enqueue(db, 1)
+        assert render_jobs.is_stalled(_jobs()[1])
+        render_jobs._claim(1)
+        assert not render_jobs.is_stalled(_jobs()[1])
+
+        monkeypatch.setattr(render_jobs, 'pump', lambda: pumps.append(1))
+        with app.test_request_context('/worksheets/1/pdf-status'):
+            assert worksheet_routes.pdf_status.__wrapped__(1).get_json()['status'] == 'running'
+        assert pumps == []
+
+        # A render that outlived PDF_RENDER_TIMEOUT is stalled again
+        app.config['PDF_RENDER_TIMEOUT'] = -1
+        assert render_jobs.is_stalled(_jobs()[1])
+        with app.test_request_context('/worksheets/1/pdf-status'):
+            worksheet_routes.pdf_status.__wrapped__(1)
+        assert pumps == [1]
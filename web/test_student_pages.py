@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Test keyset pagination, filters and full-text search for the student list"""
+
+import sys
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask import Flask
+
+sys.path.append('.')
+from utils import db_pool, student_search
+from utils.database_init import STUDENT_LIST_INDEXES
+from utils.db_connection import get_db, init_app
+from student import routes as student_routes
+from student.services import StudentService, decode_cursor, encode_cursor
+
+SCHEMA = '''
+    CREATE TABLE students (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, age INTEGER,
+                           year_group TEXT, target_school TEXT, parent_contact TEXT, notes TEXT,
+                           created_date TEXT DEFAULT CURRENT_TIMESTAMP, last_session_date TEXT,
+                           active BOOLEAN DEFAULT 1);
+    CREATE TABLE sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER, tutor_id INTEGER,
+                           session_date TEXT DEFAULT CURRENT_TIMESTAMP, duration_minutes INTEGER,
+                           main_topics_covered TEXT, tutor_notes TEXT, homework_set TEXT);
+'''
+
+
+def _ago(days):
+    return (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App with 60 students; names repeat so pages split runs of equal names"""
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    db_path = str(tmp_path / 'students.db')
+
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    for index_sql in STUDENT_LIST_INDEXES:
+        conn.execute(index_sql)
+    for n in range(60):
+        conn.execute(
+            "INSERT INTO students (name, year_group, target_school, active, last_session_date) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (f"Student {n % 7}", f"Year {4 + n % 3}", 'Grammar' if n % 4 == 0 else None,
+             n % 5 != 0, None if n % 6 == 0 else _ago(n % 30)))
+    student_search.create_sqlite(conn.cursor())
+    conn.commit()
+    conn.close()
+
+    app = Flask(__name__)
+    app.config.update(DATABASE_PATH=db_path, SECRET_KEY='test')
+    init_app(app)
+
+    yield app
+    db_pool.close_pools()
+
+
+def _all_pages(**filters):
+    students, cursor, pages = [], None, 0
+    while True:
+        page = StudentService.get_students_page(after=cursor, limit=8, **filters)
+        students.extend(page['students'])
+        pages += 1
+        cursor = page['next_cursor']
+        if cursor is None:
+            return students, pages
+
+
+def _expected(where='1 = 1', params=()):
+    with get_db() as db:
+        return db.execute(f"SELECT * FROM students WHERE {where} ORDER BY name, id", params).fetchall()
+
+
+def test_pages_cover_every_student_once_in_order(app):
+    with app.app_context():
+        students, pages = _all_pages()
+        assert students == _expected()
+        assert pages == 8
+
+
+@pytest.mark.parametrize('filters, where, params', [
+    ({'year_group': 'Year 5'}, 'year_group = ?', ('Year 5',)),
+    ({'active': False}, 'active = 0', ()),
+    ({'target_school': 'Grammar', 'active': True}, 'target_school = ? AND active = 1', ('Grammar',)),
+    ({'no_session_days': 10}, '(last_session_date IS NULL OR last_session_date < ?)', (_ago(10),)),
+])
+def test_filters_match_sql(app, filters, where, params):
+    with app.app_context():
+        students, _ = _all_pages(**filters)
+        assert students and students == _expected(where, params)
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    assert decode_cursor(encode_cursor('Zoë O\'Neil', 42)) == ('Zoë O\'Neil', 42)
+    for bad in ('garbage', encode_cursor('Ann', 1)[:-3], 'WyJBbm4iXQ'):
+        with pytest.raises(ValueError):
+            decode_cursor(bad)
+
+
+def test_page_queries_seek_an_index(app):
+    """Every filter is served by an index range, never a table scan"""
+    with app.app_context(), get_db() as db:
+        for column in ('name', 'year_group', 'active', 'target_school'):
+            where = "(name, id) > ('Student 3', 10)"
+            if column != 'name':
+                where = f"{column} = 'x' AND {where}"
+            plan = ' '.join(row[3] for row in db.execute(
+                f"EXPLAIN QUERY PLAN SELECT * FROM students WHERE {where} ORDER BY name, id LIMIT 21"))
+            assert 'SEARCH students USING INDEX' in plan and 'TEMP B-TREE' not in plan
+
+
+def _search_names(query):
+    return [row.name for row in StudentService.search_students(query)]
+
+
+def _write(sql, params=()):
+    with get_db() as db:
+        db.execute(sql, params)
+        return db.cursor.lastrowid
+
+
+def test_match_query_makes_every_word_a_prefix():
+    assert student_search.match_query('Ann  "Sm') == '"ann"* "sm"*'
+    assert student_search.match_query("o'neil", is_postgres=True) == 'o:* & neil:*'
+    assert student_search.match_query(' ()" ') is None
+
+
+def test_search_index_follows_student_and_session_writes(app):
+    with app.app_context():
+        with get_db() as db:
+            assert student_search.rebuild(db) == 60
+        anna = _write("INSERT INTO students (name, target_school, parent_contact, notes) VALUES (?, ?, ?, ?)",
+                      ('Annabel Smith', 'Tiffin Girls', 'mum@example.com', 'Likes fractions'))
+        bob = _write("INSERT INTO students (name, notes) VALUES ('Bob Jones', 'Smith Road')")
+
+        # Prefix matching on every word, name hits ranked above notes hits
+        assert _search_names('ann sm') == ['Annabel Smith']
+        assert _search_names('smi') == ['Annabel Smith', 'Bob Jones']
+        assert _search_names('tiff') == _search_names('MUM') == ['Annabel Smith']
+        assert _search_names('') == []
+
+        session_id = _write("INSERT INTO sessions (student_id, tutor_notes) VALUES (?, 'Quadratics need work')", (bob,))
+        assert _search_names('quadr') == ['Bob Jones']
+        _write("UPDATE sessions SET tutor_notes = 'Fractions practice' WHERE id = ?", (session_id,))
+        assert _search_names('quadr') == []
+        assert _search_names('fraction') == ['Annabel Smith', 'Bob Jones']
+        _write("DELETE FROM sessions WHERE id = ?", (session_id,))
+        assert _search_names('fraction') == ['Annabel Smith']
+
+        _write("UPDATE students SET name = 'Anna Smythe' WHERE id = ?", (anna,))
+        assert _search_names('annabel') == []
+        assert _search_names('smythe') == ['Anna Smythe']
+        _write("DELETE FROM students WHERE id = ?", (anna,))
+        assert _search_names('smythe') == []
+
+        with get_db() as db:
+            assert student_search.rebuild(db) == 61
+        assert _search_names('smi') == ['Bob Jones']
+
+
+def test_search_applies_the_list_filters(app, monkeypatch):
+    with app.app_context():
+        with get_db() as db:
+            student_search.rebuild(db)
+
+        def search(**filters):
+            return [row.id for row in StudentService.search_students('student', 100, **filters)]
+
+        def page(**filters):
+            return sorted(row.id for row in StudentService.get_students_page(limit=100, **filters)['students'])
+
+        assert len(search()) == 60
+        for filters in ({'year_group': 'Year 5'}, {'active': False}, {'target_school': 'Grammar'},
+                        {'no_session_days': 10}, {'year_group': 'Year 4', 'active': True}):
+            assert sorted(search(**filters)) == page(**filters)
+
+        # The list view filters its search results too
+        monkeypatch.setattr(StudentService, 'get_roster_progress', lambda student_ids: {})
+        monkeypatch.setattr(student_routes, 'render_template', lambda template, **context: context)
+        with app.test_request_context('/students/?q=student&year_group=Year+6&active=true'):
+            context = student_routes.list_students.__wrapped__()
+        assert sorted(s['id'] for s in context['students']) == page(year_group='Year 6', active=True)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Test worksheet question sampling and the in-memory question index against a throwaway SQLite database"""
+
+import sys
+import sqlite3
+from collections import Counter
+
+import pytest
+from flask import Flask
+
+sys.path.append('.')
+from utils import db_pool, question_index
+from utils.db_connection import DatabaseConnection, get_db, init_app
+from worksheet.services import QuestionService, WorksheetService
+
+SCHEMA = '''
+    CREATE TABLE students (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL);
+    CREATE TABLE main_topics (id INTEGER PRIMARY KEY AUTOINCREMENT, topic_name TEXT NOT NULL);
+    CREATE TABLE subtopics (id INTEGER PRIMARY KEY AUTOINCREMENT, main_topic_id INTEGER,
+                            subtopic_name TEXT NOT NULL);
+    CREATE TABLE subtopic_progress (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER,
+                                    subtopic_id INTEGER, mastery_level INTEGER);
+    CREATE TABLE questions (id INTEGER PRIMARY KEY AUTOINCREMENT, subtopic_id INTEGER,
+                            question_text TEXT NOT NULL, answer TEXT, difficulty_level INTEGER,
+                            time_estimate_minutes INTEGER, space_required TEXT, question_type TEXT,
+                            created_date TEXT DEFAULT CURRENT_TIMESTAMP, created_by_tutor_id INTEGER,
+                            active BOOLEAN DEFAULT 1, is_template BOOLEAN DEFAULT 0,
+                            template_params TEXT);
+    CREATE TABLE worksheets (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER, subtopic_id INTEGER,
+                             title TEXT, difficulty_level TEXT, generated_date TEXT DEFAULT CURRENT_TIMESTAMP,
+                             generated_by_tutor_id INTEGER, pdf_path TEXT, status TEXT DEFAULT 'draft',
+                             session_id INTEGER, notes TEXT);
+    CREATE TABLE worksheet_questions (id INTEGER PRIMARY KEY AUTOINCREMENT, worksheet_id INTEGER,
+                                      question_id INTEGER, question_order INTEGER,
+                                      custom_question_text TEXT, space_allocated TEXT);
+'''
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Subtopic 1 has 10 easy, 6 medium and 3 hard questions (one inactive); subtopic 2 has 200 of each"""
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    db_path = str(tmp_path / 'questions.db')
+
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    conn.execute(question_index.CREATE_TABLE_SQL)
+    conn.execute("INSERT INTO students (name) VALUES ('Ann')")
+    conn.execute("INSERT INTO main_topics (topic_name) VALUES ('Number')")
+    conn.execute("INSERT INTO subtopics (main_topic_id, subtopic_name) VALUES (1, 'Addition'), (1, 'Subtraction')")
+    for subtopic_id, sizes in ((1, (10, 6, 3)), (2, (200, 200, 200))):
+        for level, size in enumerate(sizes, 1):
+            for n in range(size):
+                conn.execute(
+                    "INSERT INTO questions (subtopic_id, question_text, difficulty_level, space_required, "
+                    "active) VALUES (?, ?, ?, 'small', ?)",
+                    (subtopic_id, f"Q{subtopic_id}.{level}.{n}", level, not (subtopic_id == 1 and n == 9)))
+    conn.commit()
+    conn.close()
+
+    app = Flask(__name__)
+    app.config.update(DATABASE_PATH=db_path, SECRET_KEY='test')
+    init_app(app)
+
+    yield app
+    question_index.clear()
+    db_pool.close_pools()
+
+
+def test_sample_respects_counts_and_filters(app):
+    with app.app_context():
+        chosen = QuestionService.sample_questions(1, {1: 4, 2: 2, 3: 1})
+        assert [q.difficulty_level for q in chosen] == [1, 1, 1, 1, 2, 2, 3]
+        assert len({q.id for q in chosen}) == 7
+        assert all(q.question_text.startswith(f"Q1.{q.difficulty_level}.") for q in chosen)
+
+        # Not enough hard questions: all of them, never the inactive easy one
+        chosen = QuestionService.sample_questions(1, {1: 20, 2: 0, 3: 5})
+        counts = Counter(q.difficulty_level for q in chosen)
+        assert counts == {1: 9, 3: 3}
+        assert 'Q1.1.9' not in {q.question_text for q in chosen}
+        assert QuestionService.sample_questions(1, {1: 0}) == []
+
+
+def test_generate_worksheet_follows_the_distribution(app):
+    with app.app_context():
+        worksheet_id = WorksheetService.generate_worksheet(
+            1, 2, 1, difficulty_distribution={'easy': 50, 'medium': 30, 'hard': 20}, total_questions=10)
+        with get_db() as db:
+            rows = db.execute('''
+                SELECT q.difficulty_level FROM worksheet_questions wq
+                JOIN questions q ON q.id = wq.question_id
+                WHERE wq.worksheet_id = ? ORDER BY wq.question_order
+            ''', (worksheet_id,)).fetchall()
+        assert [row.difficulty_level for row in rows] == [1] * 5 + [2] * 3 + [3] * 2
+
+
+def _recording(monkeypatch):
+    statements = []
+    execute = DatabaseConnection.execute
+
+    def recording_execute(self, query, params=None, prepare=False):
+        statements.append(query)
+        return execute(self, query, params, prepare)
+
+    monkeypatch.setattr(DatabaseConnection, 'execute', recording_execute)
+    return statements
+
+
+def test_index_matches_sql_and_serves_from_memory(app, monkeypatch):
+    with app.app_context():
+        with get_db() as db:
+            stats = db.execute('''
+                SELECT difficulty_level, COUNT(*) AS count, AVG(time_estimate_minutes) AS avg_time
+                FROM questions WHERE subtopic_id = 1 AND active = true GROUP BY difficulty_level
+            ''').fetchall()
+            listed = db.execute('''
+                SELECT id FROM questions WHERE subtopic_id = 1 AND active = true
+                ORDER BY difficulty_level, created_date DESC, id DESC
+            ''').fetchall()
+        assert QuestionService.get_question_stats(1) == {
+            label: {'count': row.count, 'avg_time': row.avg_time or 0}
+            for label, row in zip(('easy', 'medium', 'hard'), stats)}
+        assert [q.id for q in QuestionService.get_questions_by_subtopic(1)] == [row.id for row in listed]
+        assert len(QuestionService.get_questions_by_subtopic(1, difficulty_level=3)) == 3
+
+        # Warm: only the version is read
+        statements = _recording(monkeypatch)
+        QuestionService.get_question_stats(1)
+        QuestionService.sample_questions(1, {1: 3, 2: 3})
+        assert statements and all('question_versions' in sql for sql in statements)
+
+
+def test_question_writes_invalidate_the_index(app):
+    with app.app_context():
+        assert QuestionService.get_question_stats(1)['hard']['count'] == 3
+        other = QuestionService.get_question_stats(2)
+        with get_db() as db:
+            other_version = question_index.get_version(db, 2)
+
+        question_id = QuestionService.create_question(1, 'New hard one', 3, 6, 'large', 1)
+        assert QuestionService.get_question_stats(1)['hard']['count'] == 4
+        assert QuestionService.get_questions_by_subtopic(1, 3)[0].question_text == 'New hard one'
+
+        QuestionService.update_question(question_id, difficulty_level=2, question_text='Now medium')
+        stats = QuestionService.get_question_stats(1)
+        assert stats['hard']['count'] == 3 and stats['medium']['count'] == 7
+        assert 'Now medium' in {q.question_text for q in QuestionService.get_questions_by_subtopic(1, 2)}
+
+        QuestionService.delete_question(question_id)
+        assert QuestionService.get_question_stats(1)['medium']['count'] == 6
+        assert 'Now medium' not in {q.question_text for q in QuestionService.sample_questions(1, {2: 10})}
+
+        # Other subtopics keep their index, until a bulk import bumps them all
+        with get_db() as db:
+            assert question_index.get_version(db, 2) == other_version
+            question_index.bump_all(db)
+            assert question_index.get_version(db, 2) != other_version
+        assert QuestionService.get_question_stats(2) == other
+
+
+def _add_students(count):
+    with get_db() as db:
+        ids = db.insert_many_returning_ids('students', ('name',), [(f"Student {n}",) for n in range(count)])
+        db.insert_many('subtopic_progress', ('student_id', 'subtopic_id', 'mastery_level'),
+                       [(student_id, 2, 9) for student_id in ids[::2]])
+    return ids
+
+
+def _statement_count(monkeypatch):
+    calls = []
+    for name in ('execute', 'executemany', 'insert_many', 'insert_many_returning_ids'):
+        method = getattr(DatabaseConnection, name)
+        monkeypatch.setattr(DatabaseConnection, name,
+                            lambda self, *args, _method=method, **kwargs: calls.append(1) or _method(self, *args, **kwargs))
+    return calls
+
+
+def test_batch_generation_uses_each_students_recommendation(app):
+    with app.app_context():
+        student_ids = _add_students(4)
+        worksheet_ids = WorksheetService.generate_worksheets(student_ids + [student_ids[0]], 2, 1, total_questions=10)
+        assert list(worksheet_ids) == student_ids
+
+        with get_db() as db:
+            rows = db.execute('''
+                SELECT w.id, w.student_id, w.title, q.difficulty_level, wq.question_order
+                FROM worksheets w
+                JOIN worksheet_questions wq ON wq.worksheet_id = w.id
+                JOIN questions q ON q.id = wq.question_id
+                ORDER BY w.id, wq.question_order
+            ''').fetchall()
+        by_worksheet = {}
+        for row in rows:
+            assert worksheet_ids[row.student_id] == row.id and row.title == 'Number - Subtraction Practice'
+            by_worksheet.setdefault(row.student_id, []).append(row.difficulty_level)
+
+        # Mastery 9 gets the challenge mix, unassessed students the easy one
+        challenge, easy = [1] + [2] * 3 + [3] * 6, [1] * 7 + [2] * 2 + [3]
+        assert [by_worksheet[student_id] for student_id in student_ids] == [challenge, easy, challenge, easy]
+
+
+def test_batch_generation_cost_does_not_grow_with_the_group(app, monkeypatch):
+    with app.app_context():
+        few, many = _add_students(2), _add_students(30)
+        QuestionService.get_question_stats(2)
+
+        calls = _statement_count(monkeypatch)
+        WorksheetService.generate_worksheets(few, 2, 1)
+        statements = len(calls)
+        WorksheetService.generate_worksheets(many, 2, 1)
+        assert len(calls) == 2 * statements
+
+        with get_db() as db:
+            assert db.execute('SELECT COUNT(*) AS n FROM worksheet_questions').fetchone().n == 32 * 20
+
+
+def test_batch_generation_rejects_unknown_students_atomically(app):
+    with app.app_context():
+        student_ids = _add_students(2)
+        with pytest.raises(ValueError, match='999'):
+            WorksheetService.generate_worksheets(student_ids + [999], 2, 1)
+        with pytest.raises(ValueError):
+            WorksheetService.generate_worksheets(student_ids, 99, 1)
+        with pytest.raises(ValueError):
+            WorksheetService.generate_worksheets([], 2, 1)
+        with get_db() as db:
+            assert db.execute('SELECT COUNT(*) AS n FROM worksheets').fetchone().n == 0
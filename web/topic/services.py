@@ -1,10 +1,11 @@
-from utils.database import get_db_connection
+from utils.db_connection import get_db
+from utils import mastery_history, progress_cache, progress_rollup
 
 class TopicService:
     @staticmethod
     def get_all_main_topics():
         """Get all main topics."""
-        with get_db_connection() as conn:
+        with get_db() as conn:
             return conn.execute('''
                 SELECT id, topic_name, description, target_year_groups, color_code
                 FROM main_topics
@@ -14,7 +15,7 @@ class TopicService:
     @staticmethod
     def get_main_topic(topic_id):
         """Get a main topic by ID."""
-        with get_db_connection() as conn:
+        with get_db() as conn:
             return conn.execute(
                 'SELECT * FROM main_topics WHERE id = ?', 
                 (topic_id,)
@@ -23,17 +24,17 @@ class TopicService:
     @staticmethod
     def create_main_topic(topic_name, description=None, target_year_groups=None, color_code=None):
         """Create a new main topic."""
-        with get_db_connection() as conn:
+        with get_db() as conn:
             conn.execute('''
                 INSERT INTO main_topics (topic_name, description, target_year_groups, color_code)
                 VALUES (?, ?, ?, ?)
             ''', (topic_name, description, target_year_groups, color_code))
-            conn.commit()
+            progress_cache.bump_all(conn)
     
     @staticmethod
     def get_subtopics_by_main_topic(main_topic_id):
         """Get all subtopics for a main topic."""
-        with get_db_connection() as conn:
+        with get_db() as conn:
             return conn.execute('''
                 SELECT id, subtopic_name, description, difficulty_order
                 FROM subtopics
@@ -44,7 +45,7 @@ class TopicService:
     @staticmethod
     def get_subtopic(subtopic_id):
         """Get a specific subtopic by ID."""
-        with get_db_connection() as conn:
+        with get_db() as conn:
             result = conn.execute('''
                 SELECT s.*, mt.topic_name, mt.color_code 
                 FROM subtopics s
@@ -52,56 +53,66 @@ class TopicService:
                 WHERE s.id = ?
             ''', (subtopic_id,)).fetchone()
             
-            return dict(result) if result else None
+            return result
     
     @staticmethod
     def create_subtopic(main_topic_id, subtopic_name, description=None, difficulty_order=1):
         """Create a new subtopic."""
-        with get_db_connection() as conn:
+        with get_db() as conn:
             conn.execute('''
                 INSERT INTO subtopics (main_topic_id, subtopic_name, description, difficulty_order)
                 VALUES (?, ?, ?, ?)
             ''', (main_topic_id, subtopic_name, description, difficulty_order))
-            conn.commit()
+            # A new subtopic lowers everyone's completion for this topic
+            progress_rollup.refresh_topic(conn, main_topic_id)
+            progress_cache.bump_all(conn)
     
     @staticmethod
     def update_main_topic(topic_id, topic_name, description=None, target_year_groups=None, color_code=None):
         """Update a main topic."""
-        with get_db_connection() as conn:
+        with get_db() as conn:
             conn.execute('''
                 UPDATE main_topics 
                 SET topic_name = ?, description = ?, target_year_groups = ?, color_code = ?
                 WHERE id = ?
             ''', (topic_name, description, target_year_groups, color_code, topic_id))
-            conn.commit()
+            progress_cache.bump_all(conn)
     
     @staticmethod
     def delete_main_topic(topic_id):
         """Delete a main topic and all its subtopics."""
-        with get_db_connection() as conn:
+        with get_db() as conn:
+            mastery_history.delete_subtopics(conn, 'main_topic_id = ?', (topic_id,))
             # First delete all subtopics
             conn.execute("DELETE FROM subtopics WHERE main_topic_id = ?", (topic_id,))
             # Then delete the main topic
             conn.execute("DELETE FROM main_topics WHERE id = ?", (topic_id,))
-            conn.commit()
+            progress_rollup.delete_topic(conn, topic_id)
+            progress_cache.bump_all(conn)
     
     @staticmethod
     def update_subtopic(subtopic_id, subtopic_name, description=None, difficulty_order=1):
         """Update a subtopic."""
-        with get_db_connection() as conn:
+        with get_db() as conn:
             conn.execute('''
                 UPDATE subtopics 
                 SET subtopic_name = ?, description = ?, difficulty_order = ?
                 WHERE id = ?
             ''', (subtopic_name, description, difficulty_order, subtopic_id))
-            conn.commit()
+            progress_cache.bump_all(conn)
     
     @staticmethod
     def delete_subtopic(subtopic_id):
         """Delete a subtopic."""
-        with get_db_connection() as conn:
+        with get_db() as conn:
+            subtopic = conn.execute(
+                "SELECT main_topic_id FROM subtopics WHERE id = ?", (subtopic_id,)
+            ).fetchone()
             # First delete any progress records for this subtopic
             conn.execute("DELETE FROM subtopic_progress WHERE subtopic_id = ?", (subtopic_id,))
+            mastery_history.delete_subtopics(conn, 'id = ?', (subtopic_id,))
             # Then delete the subtopic
             conn.execute("DELETE FROM subtopics WHERE id = ?", (subtopic_id,))
-            conn.commit()
\ No newline at end of file
+            if subtopic:
+                progress_rollup.refresh_topic(conn, subtopic.main_topic_id)
+            progress_cache.bump_all(conn)
@@ -75,12 +75,8 @@ def edit_tutor(tutor_id):
             return render_template('tutor/edit.html', tutor=tutor)
         
         # Get current tutor data to check role
-        if isinstance(tutor, dict):
-            current_username = tutor['username']
-            current_role = tutor.get('role', 'tutor')
-        else:
-            current_username = tutor[1]
-            current_role = tutor[5] if len(tutor) > 5 else 'tutor'
+        current_username = tutor['username']
+        current_role = tutor.get('role', 'tutor')
         
         try:
             TutorService.update_tutor(tutor_id, username, full_name, email, role)
@@ -108,12 +104,8 @@ def delete_tutor(tutor_id):
         return redirect(url_for('tutor.list_tutors'))
     
     # Get username from tutor data
-    if isinstance(tutor, dict):
-        tutor_username = tutor['username']
-        tutor_name = tutor['full_name']
-    else:
-        tutor_username = tutor[1]
-        tutor_name = tutor[2]
+    tutor_username = tutor['username']
+    tutor_name = tutor['full_name']
     
     if tutor_username == 'admin':
         flash('Cannot delete admin account!', 'error')
@@ -123,12 +123,7 @@ class TutorService:
                 (tutor_id,)
             ).fetchone()
             
-            if result:
-                if isinstance(result, dict):
-                    return result['role'] == 'admin'
-                else:
-                    return result[0] == 'admin'
-            return False
+            return bool(result) and result.role == 'admin'
     
     @staticmethod
     def update_tutor_status(tutor_id, active_status):
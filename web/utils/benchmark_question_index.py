@@ -0,0 +1,228 @@
+# web/utils/benchmark_question_index.py
+"""
+Question bank benchmark: in-memory question index vs. SQL.
+
+Builds a scratch SQLite database with a question bank, then times the three
+question-bank reads both ways:
+  * sample - picking a 20-question worksheet (10 easy, 6 medium, 4 hard)
+  * stats  - per-difficulty counts and average times
+  * list   - every active question of a subtopic, for the question bank page
+
+The SQL side is sample_from_db below (an indexed random-key query) and the
+queries the question bank used before utils.question_index; the index side
+is the QuestionService methods as served today (a version check plus memory).
+
+Usage:
+    python utils/benchmark_question_index.py [--subtopics 20] [--per-difficulty 500] [--iterations 500]
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+
+# Add web/ to path so the services are importable when run as a script
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from flask import Flask
+from utils import db_pool, question_index
+from utils.db_connection import get_db, init_app
+from worksheet.services import QuestionService
+
+WORKSHEET_COUNTS = {1: 10, 2: 6, 3: 4}
+
+# Covering index for sample_from_db: equality on the first three columns, a
+# range seek on random_key
+QUESTION_SAMPLING_INDEX = (
+    "CREATE INDEX IF NOT EXISTS idx_questions_sampling "
+    "ON questions(subtopic_id, difficulty_level, active, random_key, id)"
+)
+
+STATS_SQL = '''
+    SELECT difficulty_level, COUNT(*) as count, AVG(time_estimate_minutes) as avg_time
+    FROM questions
+    WHERE subtopic_id = ? AND active = true
+    GROUP BY difficulty_level
+'''
+
+LIST_SQL = '''
+    SELECT * FROM questions
+    WHERE subtopic_id = ? AND active = true
+    ORDER BY difficulty_level, created_date DESC
+'''
+
+
+def create_database(path, subtopics, per_difficulty):
+    """Create a scratch question bank with the app's indexes plus the one sample_from_db seeks."""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE questions (id INTEGER PRIMARY KEY AUTOINCREMENT, subtopic_id INTEGER,
+                                question_text TEXT NOT NULL, answer TEXT, difficulty_level INTEGER,
+                                time_estimate_minutes INTEGER, space_required TEXT, question_type TEXT,
+                                created_date TEXT DEFAULT CURRENT_TIMESTAMP, created_by_tutor_id INTEGER,
+                                active BOOLEAN DEFAULT 1, is_template BOOLEAN DEFAULT 0,
+                                template_params TEXT, random_key REAL);
+        CREATE INDEX idx_questions_subtopic ON questions(subtopic_id, difficulty_level);
+    ''')
+    conn.execute(QUESTION_SAMPLING_INDEX)
+    conn.execute(question_index.CREATE_TABLE_SQL)
+    conn.executemany(
+        "INSERT INTO questions (subtopic_id, question_text, difficulty_level, time_estimate_minutes, "
+        "space_required, active, random_key) VALUES (?, ?, ?, ?, 'medium', ?, ?)",
+        ((s, f"Question {s}.{level}.{n}: what is {n} + {level}?", level, level * 2,
+          n % 20 != 0, random.random())
+         for s in range(1, subtopics + 1) for level in (1, 2, 3) for n in range(per_difficulty))
+    )
+    conn.commit()
+    conn.close()
+
+
+def sample_from_db(subtopic_id, counts):
+    """Pick random active questions per difficulty in one query (the SQL baseline).
+
+    counts maps difficulty_level to how many questions to pick. Each
+    difficulty is an index seek on (subtopic_id, difficulty_level,
+    active, random_key) from a random start, wrapping around once, and
+    ROW_NUMBER() trims the two halves to the requested count. Only the
+    chosen rows are read from the table, so the cost follows the
+    worksheet size, not the size of the bank. The picked questions get
+    new keys so later draws don't repeat the same runs.
+
+    Returns the chosen rows ordered by difficulty; a difficulty with too
+    few questions returns all it has.
+    """
+    arms = []
+    params = []
+    for difficulty_level, count in sorted(counts.items()):
+        if count <= 0:
+            continue
+        start = random.random()
+        for wrapped, comparison in ((0, '>='), (1, '<')):
+            arms.append(f'''
+                SELECT * FROM (
+                    SELECT id, difficulty_level, random_key, {wrapped} AS wrapped
+                    FROM questions
+                    WHERE subtopic_id = ? AND difficulty_level = ? AND active = true
+                        AND random_key {comparison} ?
+                    ORDER BY random_key
+                    LIMIT ?
+                ) arm_{len(arms)}
+            ''')
+            params.extend([subtopic_id, difficulty_level, start, count])
+    if not arms:
+        return []
+
+    wanted = ' '.join(f"WHEN {int(level)} THEN {int(count)}" for level, count in counts.items())
+    with get_db() as db:
+        chosen = db.execute(f'''
+            WITH candidates AS ({' UNION ALL '.join(arms)})
+            SELECT q.id, q.difficulty_level, q.question_text, q.space_required,
+                   q.is_template, q.template_params
+            FROM (
+                SELECT id, difficulty_level,
+                       ROW_NUMBER() OVER (PARTITION BY difficulty_level ORDER BY wrapped, random_key) AS pick
+                FROM candidates
+            ) ranked
+            JOIN questions q ON q.id = ranked.id
+            WHERE ranked.pick <= CASE ranked.difficulty_level {wanted} ELSE 0 END
+            ORDER BY ranked.difficulty_level, ranked.pick
+        ''', params).fetchall()
+
+        if chosen:
+            db.executemany(
+                'UPDATE questions SET random_key = ? WHERE id = ?',
+                [(random.random(), question.id) for question in chosen]
+            )
+        return chosen
+
+
+def _sql_stats(subtopic_id):
+    with get_db(readonly=True) as db:
+        return db.execute(STATS_SQL, (subtopic_id,)).fetchall()
+
+
+def _sql_list(subtopic_id):
+    with get_db(readonly=True) as db:
+        return db.execute(LIST_SQL, (subtopic_id,)).fetchall()
+
+
+WORKLOADS = {
+    'sample': (lambda s: sample_from_db(s, WORKSHEET_COUNTS),
+               lambda s: QuestionService.sample_questions(s, WORKSHEET_COUNTS)),
+    'stats': (_sql_stats, QuestionService.get_question_stats),
+    'list': (_sql_list, QuestionService.get_questions_by_subtopic),
+}
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _time(fn, subtopics, iterations):
+    latencies = []
+    for _ in range(iterations):
+        subtopic_id = random.randint(1, subtopics)
+        start = time.perf_counter()
+        fn(subtopic_id)
+        latencies.append(time.perf_counter() - start)
+    return {
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p95_ms': _percentile(latencies, 95) * 1000,
+    }
+
+
+def run(subtopics, per_difficulty, iterations):
+    """Time every workload both ways; returns {workload: {'sql': ..., 'index': ...}}."""
+    with tempfile.TemporaryDirectory(prefix='tutorai_bench_') as workdir:
+        path = os.path.join(workdir, 'questions.db')
+        create_database(path, subtopics, per_difficulty)
+
+        app = Flask(__name__)
+        app.config.update(DATABASE_PATH=path, SECRET_KEY='benchmark', QUESTION_INDEX_SIZE=subtopics)
+        init_app(app)
+        try:
+            with app.app_context():
+                # Warm the index so the timings show the steady state
+                for subtopic_id in range(1, subtopics + 1):
+                    QuestionService.get_question_stats(subtopic_id)
+                return {
+                    name: {
+                        'sql': _time(sql_fn, subtopics, iterations),
+                        'index': _time(index_fn, subtopics, iterations),
+                    }
+                    for name, (sql_fn, index_fn) in WORKLOADS.items()
+                }
+        finally:
+            question_index.clear()
+            db_pool.close_pools()
+
+
+def main():
+    """Run the benchmark and print SQL vs. index latencies per workload."""
+    parser = argparse.ArgumentParser(description='Benchmark the in-memory question index against SQL')
+    parser.add_argument('--subtopics', type=int, default=20, help='Subtopics in the scratch bank')
+    parser.add_argument('--per-difficulty', type=int, default=500, help='Questions per subtopic and difficulty')
+    parser.add_argument('--iterations', type=int, default=500, help='Calls timed per workload and path')
+    args = parser.parse_args()
+
+    print(f"\n📊 Question bank benchmark ({args.subtopics} subtopics x {args.per_difficulty * 3} questions, "
+          f"{args.iterations} calls)")
+    print("-" * 72)
+    print(f"{'workload':<10}{'path':<8}{'p50 ms':>10}{'p95 ms':>10}{'speedup':>10}")
+
+    summary = run(args.subtopics, args.per_difficulty, args.iterations)
+    for name, paths in summary.items():
+        for label in ('sql', 'index'):
+            row = paths[label]
+            speedup = paths['sql']['p50_ms'] / row['p50_ms'] if row['p50_ms'] else 0
+            print(f"{name:<10}{label:<8}{row['p50_ms']:>10.3f}{row['p95_ms']:>10.3f}{speedup:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+# web/utils/benchmark_sqlite.py
+"""
+Read/write concurrency benchmark for the SQLite performance profile.
+
+Runs a mix of writer processes (session + progress upserts, like
+SessionService.create_session_with_progress) and reader processes (the
+topic summary aggregate) against a scratch database, first with SQLite's
+defaults and then with the PRAGMA profile from utils.db_connection.
+
+Usage:
+    python utils/benchmark_sqlite.py [--writers 2] [--readers 4] [--seconds 5]
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import multiprocessing
+from datetime import datetime
+
+# Add web/ to path so utils.db_connection is importable when run as a script
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.db_connection import SQLITE_DEFAULTS, apply_sqlite_profile
+
+STUDENTS = 50
+TOPICS = 4
+SUBTOPICS_PER_TOPIC = 10
+
+READ_QUERY = '''
+    SELECT
+        mt.id,
+        mt.topic_name,
+        COUNT(s.id) as total_subtopics,
+        COUNT(sp.id) as assessed_subtopics,
+        ROUND(AVG(CASE WHEN sp.mastery_level IS NOT NULL THEN sp.mastery_level ELSE 0 END), 1) as avg_mastery
+    FROM main_topics mt
+    LEFT JOIN subtopics s ON mt.id = s.main_topic_id
+    LEFT JOIN subtopic_progress sp ON s.id = sp.subtopic_id AND sp.student_id = ?
+    GROUP BY mt.id, mt.topic_name
+    ORDER BY mt.topic_name
+'''
+
+
+def create_database(path):
+    """Create a scratch database with the tables the workload touches."""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE main_topics (id INTEGER PRIMARY KEY AUTOINCREMENT, topic_name TEXT);
+        CREATE TABLE subtopics (id INTEGER PRIMARY KEY AUTOINCREMENT, main_topic_id INTEGER,
+                                subtopic_name TEXT, difficulty_order INTEGER);
+        CREATE TABLE sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER, tutor_id INTEGER,
+                               session_date TEXT, duration_minutes INTEGER, tutor_notes TEXT);
+        CREATE TABLE subtopic_progress (id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER,
+                                        subtopic_id INTEGER, mastery_level INTEGER, last_assessed TEXT,
+                                        notes TEXT, UNIQUE(student_id, subtopic_id));
+    ''')
+    for t in range(1, TOPICS + 1):
+        conn.execute("INSERT INTO main_topics (topic_name) VALUES (?)", (f"Topic {t}",))
+        for d in range(1, SUBTOPICS_PER_TOPIC + 1):
+            conn.execute("INSERT INTO subtopics (main_topic_id, subtopic_name, difficulty_order) VALUES (?, ?, ?)",
+                         (t, f"Subtopic {t}.{d}", d))
+    conn.commit()
+    conn.close()
+
+
+def _connect(path, tuned):
+    conn = sqlite3.connect(path, timeout=30)
+    if tuned:
+        apply_sqlite_profile(conn, SQLITE_DEFAULTS)
+    return conn
+
+
+def _writer(path, tuned, seconds, results):
+    conn = _connect(path, tuned)
+    latencies, errors = [], 0
+    total_subtopics = TOPICS * SUBTOPICS_PER_TOPIC
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        student_id = random.randint(1, STUDENTS)
+        start = time.perf_counter()
+        try:
+            now = datetime.now().isoformat()
+            conn.execute("INSERT INTO sessions (student_id, tutor_id, session_date, duration_minutes) VALUES (?, 1, ?, 60)",
+                         (student_id, now))
+            conn.executemany('''
+                INSERT INTO subtopic_progress (student_id, subtopic_id, mastery_level, last_assessed)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (student_id, subtopic_id)
+                DO UPDATE SET mastery_level = EXCLUDED.mastery_level, last_assessed = EXCLUDED.last_assessed
+            ''', [(student_id, random.randint(1, total_subtopics), random.randint(1, 10), now) for _ in range(10)])
+            conn.commit()
+            latencies.append(time.perf_counter() - start)
+        except sqlite3.OperationalError:
+            conn.rollback()
+            errors += 1
+    conn.close()
+    results.put(('write', latencies, errors))
+
+
+def _reader(path, tuned, seconds, results):
+    conn = _connect(path, tuned)
+    latencies, errors = [], 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.execute(READ_QUERY, (random.randint(1, STUDENTS),)).fetchall()
+            latencies.append(time.perf_counter() - start)
+        except sqlite3.OperationalError:
+            errors += 1
+    conn.close()
+    results.put(('read', latencies, errors))
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run(tuned, writers, readers, seconds):
+    """Run one round of the workload and return per-kind summaries."""
+    with tempfile.TemporaryDirectory(prefix='tutorai_bench_') as workdir:
+        return _run_in(os.path.join(workdir, 'bench.db'), tuned, writers, readers, seconds)
+
+
+def _run_in(path, tuned, writers, readers, seconds):
+    create_database(path)
+    if tuned:
+        # journal_mode=WAL is persistent, so set it before the workers start
+        _connect(path, tuned).close()
+
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_writer, args=(path, tuned, seconds, results)) for _ in range(writers)]
+    procs += [multiprocessing.Process(target=_reader, args=(path, tuned, seconds, results)) for _ in range(readers)]
+    for p in procs:
+        p.start()
+
+    summary = {'read': {'latencies': [], 'errors': 0}, 'write': {'latencies': [], 'errors': 0}}
+    for _ in procs:
+        kind, latencies, errors = results.get()
+        summary[kind]['latencies'].extend(latencies)
+        summary[kind]['errors'] += errors
+    for p in procs:
+        p.join()
+
+    for kind in summary:
+        latencies = summary[kind]['latencies']
+        summary[kind] = {
+            'ops_per_sec': len(latencies) / seconds,
+            'p50_ms': _percentile(latencies, 50) * 1000,
+            'p95_ms': _percentile(latencies, 95) * 1000,
+            'errors': summary[kind]['errors'],
+        }
+    return summary
+
+
+def main():
+    """Run the benchmark with default settings and with the tuned profile."""
+    parser = argparse.ArgumentParser(description='Benchmark the SQLite performance profile')
+    parser.add_argument('--writers', type=int, default=2, help='Concurrent writer processes')
+    parser.add_argument('--readers', type=int, default=4, help='Concurrent reader processes')
+    parser.add_argument('--seconds', type=float, default=5, help='Duration of each round')
+    args = parser.parse_args()
+
+    print(f"\n📊 SQLite concurrency benchmark ({args.writers} writers, {args.readers} readers, {args.seconds:g}s)")
+    print("-" * 72)
+    print(f"{'profile':<10}{'kind':<7}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+
+    for label, tuned in (('default', False), ('tuned', True)):
+        summary = run(tuned, args.writers, args.readers, args.seconds)
+        for kind in ('write', 'read'):
+            row = summary[kind]
+            print(f"{label:<10}{kind:<7}{row['ops_per_sec']:>10.1f}{row['p50_ms']:>10.2f}"
+                  f"{row['p95_ms']:>10.2f}{row['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,17 @@ try:
 except ImportError:
     psycopg2 = None
     print("⚠️ psycopg2 not installed - PostgreSQL support disabled")
+from utils import mastery_history, progress_cache, progress_rollup, question_index, render_jobs, student_search
+
+# Indexes behind the keyset-paginated, filtered student list; each filter
+# column leads a (column, name, id) index so a page is one range scan
+STUDENT_LIST_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_students_name_id ON students(name, id)",
+    "CREATE INDEX IF NOT EXISTS idx_students_year_group_name ON students(year_group, name, id)",
+    "CREATE INDEX IF NOT EXISTS idx_students_active_name ON students(active, name, id)",
+    "CREATE INDEX IF NOT EXISTS idx_students_target_school_name ON students(target_school, name, id)",
+    "CREATE INDEX IF NOT EXISTS idx_students_last_session ON students(last_session_date)",
+]
 
 def init_database():
     """Initialize database - PostgreSQL for production, SQLite for development"""
@@ -52,29 +63,29 @@ def init_postgresql(database_url):
         print(f"❌ PostgreSQL initialization failed: {e}")
         raise
 
-def init_sqlite():
+def init_sqlite(db_path=None):
     """Initialize SQLite database for local development"""
-    # Get the path relative to the web directory
-    web_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    project_root = os.path.dirname(web_dir)
-    data_dir = os.path.join(project_root, 'data')
-    
-    # Create data directory if it doesn't exist
-    os.makedirs(data_dir, exist_ok=True)
-    
-    db_path = os.path.join(data_dir, 'tutor_ai.db')
+    if db_path is None:
+        # Get the path relative to the web directory
+        web_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        project_root = os.path.dirname(web_dir)
+        data_dir = os.path.join(project_root, 'data')
+        
+        # Create data directory if it doesn't exist
+        os.makedirs(data_dir, exist_ok=True)
+        
+        db_path = os.path.join(data_dir, 'tutor_ai.db')
     
     # Check if database already exists
     if os.path.exists(db_path):
         print(f"✅ SQLite database exists at: {db_path}")
-        return db_path
-    
-    # Create new database
-    print(f"📝 Creating new SQLite database at: {db_path}")
+    else:
+        print(f"📝 Creating new SQLite database at: {db_path}")
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
-    # Create schema
+    # Create schema; it is idempotent, so an existing database picks up
+    # any tables added since it was created
     create_sqlite_schema(cursor)
     
     # Add default data
@@ -84,7 +95,7 @@ def init_sqlite():
     cursor.close()
     conn.close()
     
-    print(f"✅ SQLite database created at: {db_path}")
+    print(f"✅ SQLite database ready at: {db_path}")
     return db_path
 
 def create_postgresql_schema(cursor):
@@ -105,6 +116,8 @@ def create_postgresql_schema(cursor):
             active BOOLEAN DEFAULT true
         )
     """)
+    for index_sql in STUDENT_LIST_INDEXES:
+        cursor.execute(index_sql)
     
     # Tutors table
     cursor.execute("""
@@ -158,6 +171,26 @@ def create_postgresql_schema(cursor):
         )
     """)
     
+    # Per-student topic rollup (see utils/progress_rollup.py), backfilled
+    # from subtopic_progress the first time it is created
+    cursor.execute("SELECT to_regclass('student_topic_rollup')")
+    rollup_exists = cursor.fetchone()[0] is not None
+    cursor.execute(progress_rollup.CREATE_TABLE_SQL)
+    if not rollup_exists:
+        cursor.execute(progress_rollup.REBUILD_SQL)
+    
+    # Progress versions behind the summary cache (see utils/progress_cache.py)
+    progress_cache.create_table(cursor)
+    
+    # Append-only mastery history (see utils/mastery_history.py), seeded
+    # from subtopic_progress the first time it is created
+    cursor.execute("SELECT to_regclass('mastery_history')")
+    history_exists = cursor.fetchone()[0] is not None
+    cursor.execute(mastery_history.CREATE_TABLE_SQL)
+    cursor.execute(mastery_history.CREATE_INDEX_SQL)
+    if not history_exists:
+        mastery_history.backfill(cursor, placeholder='%s')
+    
     # Sessions table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS sessions (
@@ -172,6 +205,26 @@ def create_postgresql_schema(cursor):
         )
     """)
     
+    # Subtopics assessed in each session, with the level before and after.
+    # subtopic_id has no foreign key: history outlives a deleted subtopic
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS session_assessments (
+            id SERIAL PRIMARY KEY,
+            session_id INTEGER NOT NULL REFERENCES sessions(id),
+            subtopic_id INTEGER NOT NULL,
+            old_level INTEGER,
+            new_level INTEGER NOT NULL,
+            notes TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_assessments_session ON session_assessments(session_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_assessments_subtopic ON session_assessments(subtopic_id)")
+    
+    # Full-text search over students and session notes (see
+    # utils/student_search.py), backfilled the first time it is created
+    if student_search.create_postgresql(cursor):
+        cursor.execute(student_search.POSTGRES_REBUILD_SQL)
+    
     # Questions table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS questions (
@@ -191,6 +244,12 @@ def create_postgresql_schema(cursor):
         )
     """)
     
+    # Versions behind the in-memory question index (see utils/question_index.py)
+    cursor.execute(question_index.CREATE_TABLE_SQL)
+    
+    # Background PDF render queue (see utils/render_jobs.py)
+    render_jobs.create_table(cursor)
+    
     # Worksheets table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS worksheets (
@@ -222,8 +281,15 @@ def create_postgresql_schema(cursor):
     
     print("✅ PostgreSQL schema created")
 
+def _sqlite_table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
 def create_sqlite_schema(cursor):
-    """Create SQLite schema - same structure as PostgreSQL but with SQLite syntax"""
+    """Create SQLite schema - same structure as PostgreSQL but with SQLite syntax
+    
+    Runs on every startup, so every statement must be safe to repeat.
+    """
     
     # Students table
     cursor.execute("""
@@ -240,6 +306,8 @@ def create_sqlite_schema(cursor):
             active BOOLEAN DEFAULT 1
         )
     """)
+    for index_sql in STUDENT_LIST_INDEXES:
+        cursor.execute(index_sql)
     
     # Tutors table
     cursor.execute("""
@@ -278,6 +346,50 @@ def create_sqlite_schema(cursor):
         )
     """)
     
+    # Subtopics assessed in each session, with the level before and after.
+    # subtopic_id has no foreign key: history outlives a deleted subtopic
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS session_assessments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER NOT NULL REFERENCES sessions(id),
+            subtopic_id INTEGER NOT NULL,
+            old_level INTEGER,
+            new_level INTEGER NOT NULL,
+            notes TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_assessments_session ON session_assessments(session_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_assessments_subtopic ON session_assessments(subtopic_id)")
+    
+    # Per-student topic rollup (see utils/progress_rollup.py), backfilled
+    # from subtopic_progress the first time it is created
+    rollup_exists = _sqlite_table_exists(cursor, 'student_topic_rollup')
+    cursor.execute(progress_rollup.CREATE_TABLE_SQL)
+    if not rollup_exists and _sqlite_table_exists(cursor, 'subtopic_progress'):
+        cursor.execute(progress_rollup.REBUILD_SQL)
+    
+    # Progress versions behind the summary cache (see utils/progress_cache.py)
+    progress_cache.create_table(cursor)
+    
+    # Append-only mastery history (see utils/mastery_history.py), seeded
+    # from subtopic_progress the first time it is created
+    history_exists = _sqlite_table_exists(cursor, 'mastery_history')
+    cursor.execute(mastery_history.CREATE_TABLE_SQL)
+    cursor.execute(mastery_history.CREATE_INDEX_SQL)
+    if not history_exists and _sqlite_table_exists(cursor, 'subtopic_progress'):
+        mastery_history.backfill(cursor)
+    
+    # Versions behind the in-memory question index (see utils/question_index.py)
+    cursor.execute(question_index.CREATE_TABLE_SQL)
+    
+    # Background PDF render queue (see utils/render_jobs.py)
+    render_jobs.create_table(cursor)
+    
+    # Full-text search over students (see utils/student_search.py),
+    # backfilled the first time it is created
+    if student_search.create_sqlite(cursor):
+        student_search.rebuild_sqlite(cursor)
+    
     # Continue with other tables...
     # (Same structure as PostgreSQL but with SQLite syntax)
     
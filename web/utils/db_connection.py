@@ -1,106 +1,600 @@
 import os
+import random
 import sqlite3
+import time
+import hashlib
+import logging
+from functools import lru_cache
+from flask import g, has_request_context, session as user_session
+from utils.db_pool import ConnectionPool, get_pool
+from utils.db_rows import QueryResult
+from utils import query_stats
 try:
     import psycopg2
-    from psycopg2.extras import RealDictCursor
+    from psycopg2.extras import execute_batch, execute_values
+    from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 except ImportError:
     psycopg2 = None
 
+logger = logging.getLogger(__name__)
+
+# Pool defaults used when no Flask app config is available
+POOL_DEFAULTS = {
+    'DB_POOL_SIZE': 5,
+    'DB_POOL_TIMEOUT': 10.0,
+    'DB_POOL_RECYCLE': 1800,
+    'DB_POOL_PING_AFTER': 30.0,
+    'DB_POOL_WAIT_WARN_MS': 100.0,
+}
+
+STATEMENT_DEFAULTS = {
+    'DB_PREPARED_STATEMENTS': True,
+}
+
+# Read-replica routing: how long a user's reads stay on the primary after
+# they write, so they see their own changes despite replication lag
+REPLICA_DEFAULTS = {
+    'DB_READ_YOUR_WRITES_SECONDS': 5.0,
+}
+
+# Flask session key holding the time until which reads stay on the primary
+_PRIMARY_UNTIL_KEY = '_db_primary_until'
+
+_READ_KEYWORDS = ('SELECT', 'WITH', 'PRAGMA', 'EXPLAIN', 'SHOW')
+
+# SQLite performance profile, applied once to every new pooled connection.
+# Setting a value to None leaves SQLite's own default in place.
+SQLITE_DEFAULTS = {
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_CACHE_SIZE': -64000,      # negative = KiB, so ~64 MB
+    'SQLITE_MMAP_SIZE': 268435456,    # 256 MB
+    'SQLITE_TEMP_STORE': 'MEMORY',
+    'SQLITE_BUSY_TIMEOUT': 5000,      # ms
+}
+
+_JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+_SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+_TEMP_STORES = {'DEFAULT', 'FILE', 'MEMORY'}
+
+def _config_settings(defaults):
+    """Read settings from the Flask config, falling back to defaults."""
+    from flask import current_app, has_app_context
+    settings = dict(defaults)
+    if has_app_context():
+        for key in settings:
+            settings[key] = current_app.config.get(key, settings[key])
+    return settings
+
+def _pool_settings():
+    return _config_settings(POOL_DEFAULTS)
+
+def _postgres_url(url):
+    # Fix Railway's postgres:// URL
+    if url.startswith('postgres://'):
+        return url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+def replica_urls():
+    """PostgreSQL read replicas from DATABASE_REPLICA_URLS (comma-separated)."""
+    urls = os.environ.get('DATABASE_REPLICA_URLS', '')
+    return [_postgres_url(url.strip()) for url in urls.split(',') if url.strip()]
+
+@lru_cache(maxsize=1024)
+def _is_write(query):
+    """Whether a statement may modify data (anything but a plain read)."""
+    return not query.lstrip().upper().startswith(_READ_KEYWORDS)
+
+@lru_cache(maxsize=1024)
+def _translate_postgres(query):
+    """Rewrite '?' placeholders as psycopg2's '%s', cached per SQL text.
+
+    Literal '%' has to be doubled once psycopg2 is interpolating parameters.
+    """
+    return query.replace('%', '%%').replace('?', '%s')
+
+@lru_cache(maxsize=256)
+def _prepared_statement(query):
+    """Name, PREPARE body ('?' -> $1, $2, ...) and parameter count for a statement."""
+    parts = query.split('?')
+    body = parts[0] + ''.join(f"${i}{part}" for i, part in enumerate(parts[1:], 1))
+    name = 'tutorai_' + hashlib.md5(query.encode('utf-8')).hexdigest()[:16]
+    return name, body, len(parts) - 1
+
+def _choice(value, allowed, name):
+    """PRAGMA values can't be bound as parameters, so only accept known keywords."""
+    value = str(value).upper()
+    if value not in allowed:
+        raise ValueError(f"Invalid {name}: {value}")
+    return value
+
+def apply_sqlite_profile(conn, profile=None):
+    """Apply the SQLite PRAGMA profile to a freshly opened connection."""
+    if profile is None:
+        profile = _config_settings(SQLITE_DEFAULTS)
+
+    pragmas = []
+    # busy_timeout first so switching journal mode can wait out other writers
+    if profile.get('SQLITE_BUSY_TIMEOUT') is not None:
+        pragmas.append(f"busy_timeout = {int(profile['SQLITE_BUSY_TIMEOUT'])}")
+    if profile.get('SQLITE_JOURNAL_MODE'):
+        pragmas.append(f"journal_mode = {_choice(profile['SQLITE_JOURNAL_MODE'], _JOURNAL_MODES, 'SQLITE_JOURNAL_MODE')}")
+    if profile.get('SQLITE_SYNCHRONOUS'):
+        pragmas.append(f"synchronous = {_choice(profile['SQLITE_SYNCHRONOUS'], _SYNCHRONOUS_MODES, 'SQLITE_SYNCHRONOUS')}")
+    if profile.get('SQLITE_CACHE_SIZE') is not None:
+        pragmas.append(f"cache_size = {int(profile['SQLITE_CACHE_SIZE'])}")
+    if profile.get('SQLITE_MMAP_SIZE') is not None:
+        pragmas.append(f"mmap_size = {int(profile['SQLITE_MMAP_SIZE'])}")
+    if profile.get('SQLITE_TEMP_STORE'):
+        pragmas.append(f"temp_store = {_choice(profile['SQLITE_TEMP_STORE'], _TEMP_STORES, 'SQLITE_TEMP_STORE')}")
+
+    for pragma in pragmas:
+        conn.execute(f"PRAGMA {pragma}").fetchall()
+    return conn
+
+def _ping(raw):
+    """Cheap round trip to prove the connection is still alive."""
+    cursor = raw.cursor()
+    try:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    finally:
+        cursor.close()
+
+def _reset_postgres(raw):
+    """End any transaction left open so the next checkout starts clean."""
+    if raw.closed:
+        raise psycopg2.InterfaceError("connection already closed")
+    if raw.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+        raw.rollback()
+
+def _reset_sqlite(raw):
+    """End any transaction left open so the next checkout starts clean."""
+    if raw.in_transaction:
+        raw.rollback()
+
+def _postgres_pool(database_url, name='postgres'):
+    settings = _pool_settings()
+
+    def ping(raw):
+        if raw.closed:
+            raise psycopg2.InterfaceError("connection already closed")
+        _ping(raw)
+        # The ping opened a transaction; don't leave it idling
+        raw.rollback()
+
+    return ConnectionPool(
+        connect=lambda: psycopg2.connect(database_url),
+        ping=ping,
+        reset=_reset_postgres,
+        max_size=settings['DB_POOL_SIZE'],
+        timeout=settings['DB_POOL_TIMEOUT'],
+        recycle=settings['DB_POOL_RECYCLE'],
+        ping_after=settings['DB_POOL_PING_AFTER'],
+        wait_warn_ms=settings['DB_POOL_WAIT_WARN_MS'],
+        name=name,
+    )
+
+def _sqlite_pool(db_path):
+    settings = _pool_settings()
+    profile = _config_settings(SQLITE_DEFAULTS)
+
+    def connect():
+        # Pooled connections may be released from a different thread than
+        # the one that opened them; the pool serializes access.
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        return apply_sqlite_profile(conn, profile)
+
+    return ConnectionPool(
+        connect=connect,
+        ping=_ping,
+        reset=_reset_sqlite,
+        max_size=settings['DB_POOL_SIZE'],
+        timeout=settings['DB_POOL_TIMEOUT'],
+        recycle=settings['DB_POOL_RECYCLE'],
+        ping_after=settings['DB_POOL_PING_AFTER'],
+        wait_warn_ms=settings['DB_POOL_WAIT_WARN_MS'],
+        name='sqlite',
+    )
+
+class _SharedConnection:
+    """A checked-out pooled connection plus its transaction nesting state.
+
+    Inside a Flask request one of these lives on ``flask.g`` and every
+    ``get_db()`` scope in that request reuses it.
+    """
+
+    __slots__ = ('pool', 'pooled', 'is_postgres', 'depth', 'savepoint_seq', 'broken', 'pool_wait_ms',
+                 'prepare_statements', 'wrote')
+
+    def __init__(self, pool, pooled, is_postgres, pool_wait_ms, prepare_statements=False):
+        self.pool = pool
+        self.pooled = pooled
+        self.is_postgres = is_postgres
+        self.depth = 0
+        self.savepoint_seq = 0
+        self.broken = False
+        self.pool_wait_ms = pool_wait_ms
+        self.prepare_statements = prepare_statements
+        # Set once a data-modifying statement runs (drives read-your-writes)
+        self.wrote = False
+
+    @property
+    def raw(self):
+        return self.pooled.raw
+
+    def release(self):
+        if self.pooled is not None:
+            self.pool.release(self.pooled, discard=self.broken)
+            self.pooled = None
+
 class DatabaseConnection:
-    """Database connection wrapper that works with both SQLite and PostgreSQL"""
+    """Database connection wrapper that works with both SQLite and PostgreSQL.
+
+    Each ``with get_db() as db:`` block is a transaction scope. The outermost
+    scope commits or rolls back; nested scopes (a service calling another
+    service) use savepoints on the same connection.
     
-    def __init__(self):
+    Read-only scopes (``get_db(readonly=True)``) run on a read replica when
+    DATABASE_REPLICA_URLS is set, unless the request or the user's session
+    has written recently.
+    """
+    
+    def __init__(self, readonly=False):
         self.database_url = os.environ.get('DATABASE_URL')
+        self.readonly = readonly
+        self.replica = False
         self.connection = None
         self.cursor = None
         self.is_postgres = False
-        
-    def connect(self):
-        """Connect to database (PostgreSQL or SQLite)"""
+        self.shared = None
+        self.owns_connection = False
+        self.savepoint = None
+        self.pool_wait_ms = 0.0
+    
+    def _get_pool(self):
+        """Pick the pool for the configured database (PostgreSQL or SQLite)"""
         if self.database_url:
             # PostgreSQL for production
             if not psycopg2:
                 raise ImportError("psycopg2 required for PostgreSQL")
             
-            # Fix Railway's postgres:// URL
-            if self.database_url.startswith('postgres://'):
-                self.database_url = self.database_url.replace('postgres://', 'postgresql://', 1)
-            
-            self.connection = psycopg2.connect(self.database_url)
-            self.cursor = self.connection.cursor(cursor_factory=RealDictCursor)
-            self.is_postgres = True
+            self.database_url = _postgres_url(self.database_url)
+            database_url = self.database_url
+            return get_pool(('postgres', database_url), lambda: _postgres_pool(database_url)), True
+        
+        # SQLite for development
+        from flask import current_app
+        db_path = current_app.config.get('DATABASE_PATH', '../data/tutor_ai.db')
+        
+        if not os.path.isabs(db_path):
+            project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            db_path = os.path.join(project_root, db_path)
+        
+        return get_pool(('sqlite', db_path), lambda: _sqlite_pool(db_path)), False
+    
+    def _get_replica_pool(self, urls):
+        """Pick one replica pool at random for this checkout"""
+        index = random.randrange(len(urls))
+        url = urls[index]
+        name = f'replica{index}'
+        return get_pool(('postgres', url), lambda: _postgres_pool(url, name=name)), True
+    
+    def _checkout(self, replica_urls=None):
+        if replica_urls:
+            pool, is_postgres = self._get_replica_pool(replica_urls)
         else:
-            # SQLite for development
-            from flask import current_app
-            db_path = current_app.config.get('DATABASE_PATH', '../data/tutor_ai.db')
-            
-            if not os.path.isabs(db_path):
-                project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-                db_path = os.path.join(project_root, db_path)
-            
-            self.connection = sqlite3.connect(db_path)
-            self.connection.row_factory = sqlite3.Row
+            pool, is_postgres = self._get_pool()
+        pooled, wait_ms = pool.acquire()
+        prepare = is_postgres and _config_settings(STATEMENT_DEFAULTS)['DB_PREPARED_STATEMENTS']
+        return _SharedConnection(pool, pooled, is_postgres, wait_ms, prepare)
+    
+    def _use_replica(self):
+        """Whether this read-only scope can go to a replica"""
+        if not self.readonly or not self.database_url:
+            return None
+        urls = replica_urls()
+        if not urls:
+            return None
+        primary = g.get('_db_connection')
+        if primary is not None and (primary.depth or primary.wrote):
+            # Inside a transaction, or after a write in this request
+            return None
+        if user_session.get(_PRIMARY_UNTIL_KEY, 0) > time.time():
+            # This user wrote recently; replicas may not have caught up
+            return None
+        return urls
+    
+    def _replica_connection(self, urls):
+        shared = g.get('_db_replica_connection')
+        if shared is None or shared.broken:
+            if shared is not None:
+                shared.release()
+            try:
+                shared = self._checkout(urls)
+            except Exception as e:
+                # An unavailable replica shouldn't fail the read
+                logger.warning(f"Read replica unavailable, using primary: {e}")
+                return None
+            g._db_replica_connection = shared
+        return shared
+        
+    def connect(self):
+        """Attach to the request's connection, or check one out of the pool"""
+        if has_request_context():
+            urls = self._use_replica()
+            shared = self._replica_connection(urls) if urls else None
+            self.replica = shared is not None
+            if shared is None:
+                shared = g.get('_db_connection')
+                if shared is None or shared.broken:
+                    if shared is not None:
+                        shared.release()
+                    shared = self._checkout()
+                    g._db_connection = shared
+            self.owns_connection = False
+        else:
+            # Scripts and background work get a private connection per scope
+            shared = self._checkout()
+            self.owns_connection = True
+        
+        self.shared = shared
+        self.is_postgres = shared.is_postgres
+        self.connection = shared.raw
+        self.pool_wait_ms = shared.pool_wait_ms
+        try:
+            # Plain tuple cursors on both backends; QueryResult turns the
+            # tuples into Row objects without a dict per row
             self.cursor = self.connection.cursor()
-            self.is_postgres = False
+        except Exception:
+            shared.broken = True
+            self.close()
+            raise
         
         return self
     
-    def execute(self, query, params=None):
-        """Execute query with proper parameter formatting"""
+    def execute(self, query, params=None, prepare=False):
+        """Execute query with proper parameter formatting.
+        
+        Pass ``prepare=True`` for hot statements: on PostgreSQL they are
+        prepared server-side once per pooled connection and then run with
+        EXECUTE, so only the parameters cross the wire.
+        """
+        if not self.shared.wrote and _is_write(query):
+            self.shared.wrote = True
+        start = time.perf_counter()
         if self.is_postgres:
-            # PostgreSQL uses %s for parameters
-            if params and '?' in query:
-                query = query.replace('?', '%s')
-            self.cursor.execute(query, params or ())
+            if prepare and self.shared.prepare_statements:
+                self._execute_prepared(query, params)
+            elif params:
+                # PostgreSQL uses %s for parameters
+                self.cursor.execute(_translate_postgres(query), params)
+            else:
+                self.cursor.execute(query)
         else:
             # SQLite uses ? for parameters
             self.cursor.execute(query, params or ())
-        return self.cursor
+        return self._result(query, len(params) if params else 0, start)
+    
+    def _result(self, query, bind_count, start):
+        """Report the statement to query_stats and wrap the cursor"""
+        timing = query_stats.record(query, bind_count, (time.perf_counter() - start) * 1000)
+        return QueryResult(self.cursor, timing)
+    
+    def _execute_prepared(self, query, params):
+        """Run a statement through PREPARE/EXECUTE on this connection"""
+        name, body, param_count = _prepared_statement(query)
+        # Prepared statements live as long as the physical connection, so
+        # the set of names is kept with it and survives pool checkouts
+        prepared = self.shared.pooled.state.setdefault('prepared', set())
+        if name not in prepared:
+            self.cursor.execute(f"PREPARE {name} AS {body}")
+            prepared.add(name)
+        if param_count:
+            placeholders = ', '.join(['%s'] * param_count)
+            self.cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+        else:
+            self.cursor.execute(f"EXECUTE {name}")
+    
+    def insert_returning_id(self, query, params=None):
+        """Run an INSERT and return the new row's id without a second query.
+        
+        PostgreSQL appends ``RETURNING id``; SQLite reads cursor.lastrowid.
+        """
+        if self.is_postgres:
+            row = self.execute(query.rstrip().rstrip(';') + ' RETURNING id', params).fetchone()
+            return row['id'] if row else None
+        return self.execute(query, params).lastrowid
+    
+    def executemany(self, query, params_seq, page_size=100):
+        """Execute one statement for many parameter tuples in as few round trips as possible.
+        
+        SQLite uses cursor.executemany; PostgreSQL uses psycopg2's
+        execute_batch, which sends ``page_size`` statements per round trip.
+        """
+        params_seq = list(params_seq)
+        if not params_seq:
+            return QueryResult(self.cursor)
+        self.shared.wrote = True
+        start = time.perf_counter()
+        if self.is_postgres:
+            execute_batch(self.cursor, _translate_postgres(query), params_seq, page_size=page_size)
+        else:
+            self.cursor.executemany(query, params_seq)
+        return self._result(query, len(params_seq) * len(params_seq[0]), start)
     
+    def insert_many(self, table, columns, rows, suffix='', page_size=500):
+        """Insert many rows with one multi-row INSERT per page.
+        
+        Args:
+            table: Table name (trusted, not user input)
+            columns: Column names, in the order of each row tuple
+            rows: Iterable of row tuples
+            suffix: Optional SQL appended after VALUES, e.g. an ON CONFLICT clause
+            page_size: Rows per statement on PostgreSQL (execute_values)
+        """
+        rows = list(rows)
+        if not rows:
+            return QueryResult(self.cursor)
+        column_list = ', '.join(columns)
+        self.shared.wrote = True
+        start = time.perf_counter()
+        if self.is_postgres:
+            query = f"INSERT INTO {table} ({column_list}) VALUES %s {suffix}"
+            execute_values(self.cursor, query, rows, page_size=page_size)
+        else:
+            query = f"INSERT INTO {table} ({column_list}) VALUES ({', '.join(['?'] * len(columns))}) {suffix}"
+            self.cursor.executemany(query, rows)
+        return self._result(query, len(rows) * len(columns), start)
+
+    def insert_many_returning_ids(self, table, columns, rows, page_size=500):
+        """Insert many rows and return their new ids, in row order.
+
+        PostgreSQL sends one multi-row INSERT ... RETURNING id per page;
+        SQLite runs the prepared INSERT once per row in-process and reads
+        cursor.lastrowid, which costs no round trips.
+        """
+        rows = list(rows)
+        if not rows:
+            return []
+        column_list = ', '.join(columns)
+        self.shared.wrote = True
+        start = time.perf_counter()
+        if self.is_postgres:
+            query = f"INSERT INTO {table} ({column_list}) VALUES %s RETURNING id"
+            ids = [row[0] for row in execute_values(self.cursor, query, rows, page_size=page_size, fetch=True)]
+        else:
+            query = f"INSERT INTO {table} ({column_list}) VALUES ({', '.join(['?'] * len(columns))})"
+            ids = []
+            for row in rows:
+                self.cursor.execute(query, row)
+                ids.append(self.cursor.lastrowid)
+        self._result(query, len(rows) * len(columns), start)
+        return ids
+
     def fetchone(self):
-        """Fetch one result"""
-        result = self.cursor.fetchone()
-        if result and self.is_postgres:
-            # Convert to dict if PostgreSQL
-            return dict(result) if result else None
-        return result
+        """Fetch one result as a Row"""
+        return QueryResult(self.cursor).fetchone()
     
     def fetchall(self):
-        """Fetch all results"""
-        results = self.cursor.fetchall()
-        if results and self.is_postgres:
-            # Convert to list of dicts if PostgreSQL
-            return [dict(row) for row in results]
-        return results
+        """Fetch all results as Rows"""
+        return QueryResult(self.cursor).fetchall()
+    
+    def _control(self, statement):
+        """Run a transaction-control statement without touching self.cursor"""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(statement)
+        finally:
+            cursor.close()
+    
+    def begin(self):
+        """Open this handle's transaction scope (a savepoint when nested)"""
+        shared = self.shared
+        if shared.depth > 0:
+            shared.savepoint_seq += 1
+            self.savepoint = f"sp_{shared.savepoint_seq}"
+            if not self.is_postgres and not self.connection.in_transaction:
+                # sqlite3 only opens transactions lazily before writes; make
+                # sure the savepoint nests inside the outer scope's transaction
+                self._control('BEGIN')
+            self._control(f"SAVEPOINT {self.savepoint}")
+        shared.depth += 1
     
     def commit(self):
-        """Commit transaction"""
-        self.connection.commit()
+        """Commit the scope (releases and re-opens the savepoint when nested)"""
+        if self.savepoint:
+            self._control(f"RELEASE SAVEPOINT {self.savepoint}")
+            self._control(f"SAVEPOINT {self.savepoint}")
+        else:
+            self.connection.commit()
     
     def rollback(self):
-        """Rollback transaction"""
-        self.connection.rollback()
+        """Rollback the scope (back to the savepoint when nested)"""
+        if self.savepoint:
+            self._control(f"ROLLBACK TO SAVEPOINT {self.savepoint}")
+        else:
+            self.connection.rollback()
+    
+    def end(self, success):
+        """Close this handle's transaction scope"""
+        shared = self.shared
+        shared.depth -= 1
+        try:
+            if not self.savepoint:
+                if success:
+                    self.connection.commit()
+                else:
+                    self.connection.rollback()
+            else:
+                if not success:
+                    self._control(f"ROLLBACK TO SAVEPOINT {self.savepoint}")
+                self._control(f"RELEASE SAVEPOINT {self.savepoint}")
+        except Exception:
+            # A connection that can't commit or roll back is not reusable
+            shared.broken = True
+            raise
+        finally:
+            self.savepoint = None
     
     def close(self):
-        """Close connection"""
+        """Close the cursor and return a private connection to the pool"""
         if self.cursor:
-            self.cursor.close()
-        if self.connection:
-            self.connection.close()
+            try:
+                self.cursor.close()
+            except Exception:
+                self.shared.broken = True
+            self.cursor = None
+        if self.shared and self.owns_connection:
+            self.shared.release()
+        self.shared = None
+        self.connection = None
     
     def __enter__(self):
         """Context manager entry"""
         self.connect()
+        try:
+            self.begin()
+        except Exception:
+            self.shared.broken = True
+            self.close()
+            raise
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager exit"""
-        if exc_type:
-            self.rollback()
-        else:
-            self.commit()
-        self.close()
+        try:
+            self.end(success=exc_type is None)
+        except Exception:
+            if exc_type is None:
+                raise
+        finally:
+            self.close()
+
+def get_db(readonly=False):
+    """Get a database transaction scope for Flask app.
+    
+    Pass ``readonly=True`` for pure reads that may be served by a replica.
+    """
+    return DatabaseConnection(readonly=readonly)
+
+def release_request_connection(exc=None):
+    """Return the request's connections to their pools (teardown handler)"""
+    for key in ('_db_connection', '_db_replica_connection'):
+        shared = g.pop(key, None)
+        if shared is not None:
+            shared.release()
+
+def remember_primary_writes(response):
+    """Keep this user's reads on the primary for a while after a write"""
+    shared = g.get('_db_connection')
+    if shared is not None and shared.wrote and replica_urls():
+        window = _config_settings(REPLICA_DEFAULTS)['DB_READ_YOUR_WRITES_SECONDS']
+        user_session[_PRIMARY_UNTIL_KEY] = time.time() + window
+    return response
 
-def get_db():
-    """Get database connection for Flask app"""
-    return DatabaseConnection()
\ No newline at end of file
+def init_app(app):
+    """Release the request-scoped connection when each request ends."""
+    app.teardown_appcontext(release_request_connection)
+    app.after_request(remember_primary_writes)
+    query_stats.init_app(app)
@@ -0,0 +1,251 @@
+# web/utils/db_pool.py
+"""
+Per-process connection pool used by utils.db_connection.
+
+Each gunicorn worker owns its own pools (one per database target), so
+connections are never shared across a fork. Checkouts are bounded by
+``max_size``, idle connections are health-checked before being handed out
+and connections older than ``recycle`` seconds are replaced.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool timeout."""
+    pass
+
+
+class PooledConnection:
+    """A raw DB-API connection plus the bookkeeping the pool needs."""
+
+    __slots__ = ('raw', 'created_at', 'last_used', 'state')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # Per-connection scratch space that lives as long as the physical
+        # connection (e.g. prepared statement names)
+        self.state = {}
+
+
+class ConnectionPool:
+    """Bounded pool of DB-API connections for a single database target."""
+
+    def __init__(self, connect, ping, reset, max_size=5, timeout=10.0,
+                 recycle=1800, ping_after=30.0, wait_warn_ms=100.0, name='db'):
+        """
+        Args:
+            connect: Callable returning a new raw connection
+            ping: Callable(raw) raising if the connection is unusable
+            reset: Callable(raw) that ends any open transaction before reuse
+            max_size: Maximum number of open connections
+            timeout: Seconds to wait for a free connection before PoolTimeout
+            recycle: Maximum connection age in seconds (0 disables recycling)
+            ping_after: Only ping connections idle for at least this long
+            wait_warn_ms: Log a warning when a checkout waits longer than this
+            name: Label used in log messages
+        """
+        self._connect = connect
+        self._ping = ping
+        self._reset = reset
+        self.max_size = max(1, int(max_size))
+        self.timeout = float(timeout)
+        self.recycle = float(recycle or 0)
+        self.ping_after = float(ping_after)
+        self.wait_warn_ms = float(wait_warn_ms)
+        self.name = name
+
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition(threading.Lock())
+
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'failed_pings': 0,
+            'timeouts': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+        }
+
+    def acquire(self):
+        """Check out a healthy connection, waiting up to ``timeout`` seconds.
+
+        Returns a ``(PooledConnection, wait_ms)`` tuple.
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        while True:
+            pooled = None
+            create = False
+
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"No database connection available after {self.timeout:.1f}s "
+                            f"(pool '{self.name}' size {self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+
+            if create:
+                try:
+                    pooled = PooledConnection(self._connect())
+                except Exception:
+                    self._discard_slot()
+                    raise
+                with self._cond:
+                    self._stats['created'] += 1
+            elif not self._check(pooled):
+                continue
+
+            wait_ms = (time.monotonic() - start) * 1000
+            with self._cond:
+                self._stats['checkouts'] += 1
+                self._stats['total_wait_ms'] += wait_ms
+                if wait_ms > self._stats['max_wait_ms']:
+                    self._stats['max_wait_ms'] = wait_ms
+
+            if wait_ms > self.wait_warn_ms:
+                logger.warning(f"DB pool '{self.name}' checkout waited {wait_ms:.1f} ms")
+
+            return pooled, wait_ms
+
+    def release(self, pooled, discard=False):
+        """Return a connection to the pool, or close it if ``discard`` is set."""
+        if pooled is None:
+            return
+
+        if not discard:
+            try:
+                self._reset(pooled.raw)
+            except Exception as e:
+                logger.warning(f"DB pool '{self.name}' reset failed, discarding connection: {e}")
+                discard = True
+
+        if discard:
+            self._close(pooled)
+            self._discard_slot()
+            return
+
+        pooled.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    def stats(self):
+        """Snapshot of pool counters, including checkout wait times."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot['size'] = self._size
+            snapshot['idle'] = len(self._idle)
+            snapshot['max_size'] = self.max_size
+        checkouts = snapshot['checkouts']
+        snapshot['avg_wait_ms'] = snapshot['total_wait_ms'] / checkouts if checkouts else 0.0
+        return snapshot
+
+    def close_all(self):
+        """Close every idle connection (checked-out connections are closed on release)."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close(pooled)
+
+    def _check(self, pooled):
+        """Recycle old connections and ping long-idle ones. False means discarded."""
+        now = time.monotonic()
+
+        if self.recycle and now - pooled.created_at > self.recycle:
+            with self._cond:
+                self._stats['recycled'] += 1
+            self._close(pooled)
+            self._discard_slot()
+            return False
+
+        if now - pooled.last_used >= self.ping_after:
+            try:
+                self._ping(pooled.raw)
+            except Exception as e:
+                logger.warning(f"DB pool '{self.name}' health check failed: {e}")
+                with self._cond:
+                    self._stats['failed_pings'] += 1
+                self._close(pooled)
+                self._discard_slot()
+                return False
+
+        return True
+
+    def _discard_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close(pooled):
+        try:
+            pooled.raw.close()
+        except Exception:
+            pass
+
+
+# Pools are per process: a gunicorn worker forked from a parent that already
+# opened connections must not reuse the parent's sockets.
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, factory):
+    """Return the pool for ``key`` in this process, creating it with ``factory()``."""
+    global _pools, _pools_pid
+
+    pid = os.getpid()
+    with _pools_lock:
+        if _pools_pid != pid:
+            _pools = {}
+            _pools_pid = pid
+
+        pool = _pools.get(key)
+        if pool is None:
+            pool = factory()
+            _pools[key] = pool
+        return pool
+
+
+def get_pool_stats():
+    """Stats for every pool owned by this process, keyed by pool name."""
+    with _pools_lock:
+        pools = list(_pools.values()) if _pools_pid == os.getpid() else []
+    return {pool.name: pool.stats() for pool in pools}
+
+
+def close_pools():
+    """Close all idle pooled connections in this process."""
+    global _pools
+
+    with _pools_lock:
+        pools = list(_pools.values()) if _pools_pid == os.getpid() else []
+        _pools = {}
+    for pool in pools:
+        pool.close_all()
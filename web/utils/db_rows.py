@@ -0,0 +1,164 @@
+# web/utils/db_rows.py
+"""
+Row type returned by utils.db_connection for both SQLite and PostgreSQL.
+
+A Row is a plain tuple of column values plus a shared, per-result-shape
+class that maps column names to positions, so it supports ``row[0]``,
+``row['name']``, ``row.name`` and ``row.get('name')`` without allocating a
+dict per row. Call ``to_dict()`` only where a mutable copy is needed
+(e.g. before adding template-only keys).
+"""
+
+import time
+from functools import lru_cache
+
+
+def _make_row(fields, values):
+    """Rebuild a Row from its fields and values (used for pickling)."""
+    return row_class(fields)(values)
+
+
+class Row(tuple):
+    """Tuple of column values with key and attribute access by column name."""
+
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self._index[key]
+            except KeyError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def __getattr__(self, name):
+        try:
+            return tuple.__getitem__(self, self._index[name])
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __contains__(self, key):
+        # Behave like the dicts rows used to be: membership is by column name
+        return key in self._index
+
+    def get(self, key, default=None):
+        """Column value by name, or ``default`` if the column isn't present."""
+        index = self._index.get(key)
+        if index is None:
+            return default
+        return tuple.__getitem__(self, index)
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return zip(self._fields, self)
+
+    def to_dict(self):
+        """Mutable copy of the row as a plain dict."""
+        return dict(zip(self._fields, self))
+
+    def __reduce__(self):
+        return (_make_row, (self._fields, tuple(self)))
+
+    def __repr__(self):
+        return 'Row(' + ', '.join(f"{name}={value!r}" for name, value in zip(self._fields, self)) + ')'
+
+
+_TUPLE_METHODS = {'count', 'index'}
+
+
+@lru_cache(maxsize=512)
+def row_class(fields):
+    """Row subclass for one result shape; cached so each shape is built once."""
+    index = {}
+    for position, name in enumerate(fields):
+        # Like dict(row), a repeated column name resolves to the last one
+        index[name] = position
+    namespace = {'__slots__': (), '_fields': fields, '_index': index}
+    # Columns such as "count" would otherwise resolve to tuple methods
+    # (row.count in a template); let the column win for these names.
+    for name in _TUPLE_METHODS.intersection(index):
+        namespace[name] = property(lambda row, i=index[name]: tuple.__getitem__(row, i))
+    return type('Row', (Row,), namespace)
+
+
+class QueryResult:
+    """Cursor wrapper returned by DatabaseConnection.execute.
+
+    Fetch methods return Row objects; everything else is delegated to the
+    underlying DB-API cursor. When a ``timing`` (utils.query_stats) is given,
+    fetch time is added to the statement's DB time, since SQLite does most
+    of a query's work while rows are being fetched.
+    """
+
+    __slots__ = ('cursor', '_row_class', '_timing')
+
+    def __init__(self, cursor, timing=None):
+        self.cursor = cursor
+        self._row_class = None
+        self._timing = timing
+
+    def _rows(self):
+        if self._row_class is None:
+            description = self.cursor.description or ()
+            self._row_class = row_class(tuple(column[0] for column in description))
+        return self._row_class
+
+    def _timed(self, fetch, *args):
+        if self._timing is None:
+            return fetch(*args)
+        start = time.perf_counter()
+        values = fetch(*args)
+        self._timing.add((time.perf_counter() - start) * 1000)
+        return values
+
+    def fetchone(self):
+        values = self._timed(self.cursor.fetchone)
+        if values is None:
+            return None
+        return self._rows()(values)
+
+    def fetchall(self):
+        values = self._timed(self.cursor.fetchall)
+        if not values:
+            return []
+        cls = self._rows()
+        return [cls(row) for row in values]
+
+    def fetchmany(self, size=None):
+        if size is None:
+            values = self._timed(self.cursor.fetchmany)
+        else:
+            values = self._timed(self.cursor.fetchmany, size)
+        if not values:
+            return []
+        cls = self._rows()
+        return [cls(row) for row in values]
+
+    def __iter__(self):
+        cls = None
+        for values in self.cursor:
+            if cls is None:
+                cls = self._rows()
+            yield cls(values)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    @property
+    def description(self):
+        return self.cursor.description
@@ -8,9 +8,10 @@ Date: 2025
 """
 
 from functools import wraps, lru_cache
-from flask import abort, flash, redirect, url_for, request, g
+from flask import abort, flash, redirect, url_for, request, g, make_response, session
 from flask_login import current_user
 import time
+import hashlib
 import logging
 
 logger = logging.getLogger(__name__)
@@ -176,6 +177,65 @@ def cache_result(timeout=300):
     return decorator
 
 
+def progress_etag(vary=None):
+    """
+    Decorator for conditional GETs on per-student progress views.
+    
+    The ETag is built from the student's progress version, their row and
+    the logged-in user, so it changes whenever a session, a topic change or
+    an edit could change the page. A matching If-None-Match gets a 304
+    before the view (and its progress queries) runs. Responses are marked
+    ``private, no-cache`` so browsers revalidate on every view.
+    
+    Args:
+        vary: Optional callable returning extra parts for the tag, for views
+              whose output also depends on something else (e.g. the time)
+    
+    Usage:
+        @app.route('/students/<int:student_id>')
+        @login_required
+        @progress_etag()
+        def student_detail(student_id):
+            ...
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(student_id, *args, **kwargs):
+            # Pending flash messages belong in the next response; don't 304 them away
+            if request.method != 'GET' or session.get('_flashes'):
+                return f(student_id, *args, **kwargs)
+            
+            tag = _progress_etag(student_id, vary() if vary else ())
+            if tag is None:
+                return f(student_id, *args, **kwargs)
+            if request.if_none_match.contains_weak(tag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(student_id, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(tag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+
+def _progress_etag(student_id, extra):
+    """ETag value for a student's progress views, or None if there is no such student."""
+    from utils.db_connection import get_db
+    from utils import progress_cache
+    
+    with get_db(readonly=True) as db:
+        student = db.execute('SELECT * FROM students WHERE id = ?', (student_id,), prepare=True).fetchone()
+        if student is None:
+            return None
+        version = progress_cache.get_version(db, student_id)
+    parts = [version, sorted((k, str(v)) for k, v in student.to_dict().items()),
+             current_user.get_id(), *extra]
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
 def validate_form_data(*required_fields):
     """
     Decorator to validate that required form fields are present.
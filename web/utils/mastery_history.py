@@ -0,0 +1,157 @@
+# web/utils/mastery_history.py
+"""
+Append-only mastery history.
+
+subtopic_progress only keeps the latest level, so every assessment also
+appends a (student_id, subtopic_id, ts, mastery_level) row here. ts is Unix
+seconds (UTC), which keeps the time-bucketing below plain integer arithmetic
+on both SQLite and PostgreSQL.
+
+series() downsamples a student's history into at most ``points`` buckets per
+topic or subtopic, averaging the levels recorded in each bucket, so chart
+payloads stay small however long the history is.
+"""
+
+import time
+from datetime import datetime
+
+CREATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS mastery_history (
+        student_id INTEGER NOT NULL,
+        subtopic_id INTEGER NOT NULL,
+        ts BIGINT NOT NULL,
+        mastery_level INTEGER NOT NULL,
+        session_id INTEGER
+    )
+'''
+
+CREATE_INDEX_SQL = '''
+    CREATE INDEX IF NOT EXISTS idx_mastery_history_student
+    ON mastery_history (student_id, subtopic_id, ts)
+'''
+
+# Existing progress rows that seed one point each; see backfill()
+_BACKFILL_SELECT_SQL = '''
+    SELECT student_id, subtopic_id, last_assessed, mastery_level
+    FROM subtopic_progress
+    WHERE last_assessed IS NOT NULL AND mastery_level IS NOT NULL
+'''
+
+MAX_POINTS = 500
+MIN_BUCKET_SECONDS = 3600
+
+_SERIES_SQL = {
+    'subtopic': '''
+        SELECT
+            s.id AS series_id,
+            s.subtopic_name AS name,
+            (h.ts - ?) / ? AS bucket,
+            MAX(h.ts) AS ts,
+            AVG(h.mastery_level) AS mastery
+        FROM mastery_history h
+        JOIN subtopics s ON s.id = h.subtopic_id
+        WHERE h.student_id = ? AND h.ts >= ? AND h.ts < ? {where}
+        GROUP BY s.id, s.subtopic_name, bucket
+        ORDER BY s.id, bucket
+    ''',
+    'topic': '''
+        SELECT
+            mt.id AS series_id,
+            mt.topic_name AS name,
+            (h.ts - ?) / ? AS bucket,
+            MAX(h.ts) AS ts,
+            AVG(h.mastery_level) AS mastery
+        FROM mastery_history h
+        JOIN subtopics s ON s.id = h.subtopic_id
+        JOIN main_topics mt ON mt.id = s.main_topic_id
+        WHERE h.student_id = ? AND h.ts >= ? AND h.ts < ? {where}
+        GROUP BY mt.id, mt.topic_name, bucket
+        ORDER BY mt.id, bucket
+    ''',
+}
+
+
+def record(db, student_id, levels, session_id=None, ts=None):
+    """Append one history row per {subtopic_id: mastery_level} entry."""
+    ts = int(time.time()) if ts is None else int(ts)
+    db.insert_many(
+        'mastery_history',
+        ('student_id', 'subtopic_id', 'ts', 'mastery_level', 'session_id'),
+        [(student_id, subtopic_id, ts, level, session_id) for subtopic_id, level in levels.items()]
+    )
+
+
+def _local_timestamp(value):
+    # last_assessed is a naive local time written with datetime.now(), so it
+    # is read back the same way rather than as UTC
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace(' ', 'T'))
+    return int(value.timestamp())
+
+
+def backfill(cursor, placeholder='?'):
+    """Seed one point per existing subtopic_progress row.
+
+    Runs on a raw DB-API cursor at schema setup; ``placeholder`` is the
+    driver's parameter marker ('%s' for psycopg2). Rows whose last_assessed
+    cannot be parsed are skipped.
+    """
+    cursor.execute(_BACKFILL_SELECT_SQL)
+    rows = []
+    for student_id, subtopic_id, last_assessed, mastery_level in cursor.fetchall():
+        try:
+            rows.append((student_id, subtopic_id, _local_timestamp(last_assessed), mastery_level))
+        except (TypeError, ValueError):
+            continue
+    if rows:
+        cursor.executemany(
+            'INSERT INTO mastery_history (student_id, subtopic_id, ts, mastery_level) '
+            f'VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder})',
+            rows
+        )
+
+
+def delete_student(db, student_id):
+    db.execute('DELETE FROM mastery_history WHERE student_id = ?', (student_id,))
+
+
+def delete_subtopics(db, where, params):
+    """Drop history for the subtopics selected by ``where`` on subtopics."""
+    db.execute(f'''
+        DELETE FROM mastery_history
+        WHERE subtopic_id IN (SELECT id FROM subtopics WHERE {where})
+    ''', params)
+
+
+def series(db, student_id, since, until, by='topic', points=60, main_topic_id=None, subtopic_id=None):
+    """Downsampled mastery series for one student between two Unix times.
+
+    Returns (bucket_seconds, [{'id', 'name', 'points': [[ts, mastery], ...]}]),
+    where ts is the latest assessment in the bucket and mastery the average
+    level recorded in it, to one decimal.
+    """
+    if by not in _SERIES_SQL:
+        raise ValueError("by must be 'topic' or 'subtopic'")
+    since, until = int(since), int(until)
+    if until <= since:
+        raise ValueError('until must be after since')
+    points = max(1, min(int(points), MAX_POINTS))
+    bucket_seconds = max(MIN_BUCKET_SECONDS, -(-(until - since) // points))
+
+    where, extra = '', []
+    if main_topic_id is not None:
+        where += ' AND s.main_topic_id = ?'
+        extra.append(main_topic_id)
+    if subtopic_id is not None:
+        where += ' AND h.subtopic_id = ?'
+        extra.append(subtopic_id)
+
+    params = [since, bucket_seconds, student_id, since, until, *extra]
+    rows = db.execute(_SERIES_SQL[by].format(where=where), params).fetchall()
+
+    result = []
+    for row in rows:
+        if not result or result[-1]['id'] != row.series_id:
+            result.append({'id': row.series_id, 'name': row.name, 'points': []})
+        result[-1]['points'].append([int(row.ts), round(float(row.mastery), 1)])
+    return bucket_seconds, result
@@ -90,6 +90,13 @@ class DatabaseOptimizer:
             ("idx_sessions_student_date", 
              "CREATE INDEX IF NOT EXISTS idx_sessions_student_date ON sessions(student_id, session_date DESC)"),
             
+            # Session assessments - recent sessions join on session_id
+            ("idx_session_assessments_session", 
+             "CREATE INDEX IF NOT EXISTS idx_session_assessments_session ON session_assessments(session_id)"),
+            
+            ("idx_session_assessments_subtopic", 
+             "CREATE INDEX IF NOT EXISTS idx_session_assessments_subtopic ON session_assessments(subtopic_id)"),
+            
             # Subtopic progress - critical for performance views
             ("idx_subtopic_progress_student", 
              "CREATE INDEX IF NOT EXISTS idx_subtopic_progress_student ON subtopic_progress(student_id)"),
@@ -122,6 +129,22 @@ class DatabaseOptimizer:
             ("idx_students_active", 
              "CREATE INDEX IF NOT EXISTS idx_students_active ON students(active)"),
             
+            # Students - keyset pages on (name, id), optionally filtered
+            ("idx_students_name_id", 
+             "CREATE INDEX IF NOT EXISTS idx_students_name_id ON students(name, id)"),
+            
+            ("idx_students_year_group_name", 
+             "CREATE INDEX IF NOT EXISTS idx_students_year_group_name ON students(year_group, name, id)"),
+            
+            ("idx_students_active_name", 
+             "CREATE INDEX IF NOT EXISTS idx_students_active_name ON students(active, name, id)"),
+            
+            ("idx_students_target_school_name", 
+             "CREATE INDEX IF NOT EXISTS idx_students_target_school_name ON students(target_school, name, id)"),
+            
+            ("idx_students_last_session", 
+             "CREATE INDEX IF NOT EXISTS idx_students_last_session ON students(last_session_date)"),
+            
             # Tutors - for login
             ("idx_tutors_username", 
              "CREATE INDEX IF NOT EXISTS idx_tutors_username ON tutors(username)"),
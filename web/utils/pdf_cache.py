@@ -0,0 +1,110 @@
+# web/utils/pdf_cache.py
+"""
+Content-addressed cache of rendered worksheet PDFs.
+
+A worksheet PDF depends only on its title, the student's name, the question
+texts and the space left after each, plus the date printed in the header.
+Those are normalized into a payload and hashed (SHA-256); the PDF is stored
+at <PDF_CACHE_DIR>/<hash[:2]>/<hash>.pdf. Re-finalizing a worksheet, or
+finalizing another with identical content on the same day, finds the file
+and skips ReportLab entirely.
+
+Files are written to a temporary name and renamed into place, so a
+concurrent reader never sees a half-written PDF and two renders of the same
+content simply replace one another with identical bytes.
+
+Hit and miss counters are per process; read them with stats().
+"""
+
+import os
+import json
+import hashlib
+import threading
+from datetime import date
+from flask import current_app, has_app_context
+
+# Used when no Flask app config is available
+CACHE_DEFAULTS = {
+    'PDF_CACHE_DIR': os.path.join('web', 'static', 'worksheets'),
+}
+
+_counters = {'hits': 0, 'misses': 0}
+_counter_lock = threading.Lock()
+
+
+def _setting(key):
+    if has_app_context():
+        return current_app.config.get(key, CACHE_DEFAULTS[key])
+    return CACHE_DEFAULTS[key]
+
+
+def _normalize_text(text):
+    return ' '.join((text or '').split())
+
+
+def payload(worksheet_data, render_date=None):
+    """The parts of a worksheet that appear in its PDF, normalized."""
+    worksheet = worksheet_data['worksheet']
+    return {
+        'title': _normalize_text(worksheet['title']),
+        'student_name': _normalize_text(worksheet['student_name']),
+        'date': (render_date or date.today()).isoformat(),
+        'questions': [
+            [_normalize_text(question['custom_question_text'] or question['original_text']),
+             question['space_allocated'] or question['space_required']]
+            for question in worksheet_data['questions']
+        ],
+    }
+
+
+def content_key(worksheet_data, render_date=None):
+    """SHA-256 of the normalized payload."""
+    encoded = json.dumps(payload(worksheet_data, render_date), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def path_for(key):
+    return os.path.join(_setting('PDF_CACHE_DIR'), key[:2], f"{key}.pdf")
+
+
+def lookup(worksheet_data, render_date):
+    """(path, hit) for the worksheet's PDF printed on ``render_date``.
+
+    On a miss, render to ``path`` with the same render_date, so the date in
+    the file always matches the one in its key.
+    """
+    path = path_for(content_key(worksheet_data, render_date))
+    hit = os.path.exists(path)
+    with _counter_lock:
+        _counters['hits' if hit else 'misses'] += 1
+    return path, hit
+
+
+def write(path, render):
+    """Call ``render(tmp_path)`` and move the result to ``path`` atomically."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        render(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def stats():
+    """This process's hit and miss counts."""
+    with _counter_lock:
+        hits, misses = _counters['hits'], _counters['misses']
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+    }
+
+
+def reset_stats():
+    with _counter_lock:
+        _counters.update(hits=0, misses=0)
@@ -0,0 +1,220 @@
+# web/utils/progress_cache.py
+"""
+Versioned cache for student progress summaries.
+
+progress_versions holds an opaque version per student plus a global one
+(student_id 0) for topic and subtopic changes. Writers bump the version in
+the same transaction as the change, so a summary cached under
+(student_id, progress_version) is valid for as long as that version is
+current and nothing ever has to be deleted.
+
+Two tiers:
+  * a bounded in-process LRU (PROGRESS_CACHE_SIZE entries per worker)
+  * an optional SQLite file shared by every worker on the host
+    (PROGRESS_CACHE_PATH), holding the latest summary per student
+
+Cached summaries are shared between requests; treat them as read-only.
+"""
+
+import json
+import os
+import secrets
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+# Used when no Flask app config is available
+CACHE_DEFAULTS = {
+    'PROGRESS_CACHE_SIZE': 512,
+    'PROGRESS_CACHE_PATH': '',
+}
+
+# Row holding the version for topic/subtopic changes, which affect everyone
+GLOBAL_VERSION_ID = 0
+
+CREATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS progress_versions (
+        student_id INTEGER PRIMARY KEY,
+        version VARCHAR(32) NOT NULL
+    )
+'''
+
+_BUMP_SQL = '''
+    INSERT INTO progress_versions (student_id, version) VALUES (?, ?)
+    ON CONFLICT (student_id) DO UPDATE SET version = EXCLUDED.version
+'''
+
+
+def _new_version():
+    # Random rather than a counter, so a recreated database never reuses a
+    # version that a shared cache file still holds
+    return secrets.token_hex(8)
+
+
+def create_table(cursor):
+    """Create progress_versions and seed the global version."""
+    cursor.execute(CREATE_TABLE_SQL)
+    cursor.execute(f'''
+        INSERT INTO progress_versions (student_id, version) VALUES ({GLOBAL_VERSION_ID}, '{_new_version()}')
+        ON CONFLICT (student_id) DO NOTHING
+    ''')
+
+
+def get_version(db, student_id):
+    """Current progress version for a student, including topic changes."""
+    rows = db.execute(
+        'SELECT student_id, version FROM progress_versions WHERE student_id IN (?, ?)',
+        (GLOBAL_VERSION_ID, student_id), prepare=True
+    ).fetchall()
+    versions = {row.student_id: row.version for row in rows}
+    return f"{versions.get(GLOBAL_VERSION_ID, '0')}.{versions.get(student_id, '0')}"
+
+
+def bump(db, student_id):
+    """Invalidate a student's cached progress; call inside the writing transaction."""
+    db.execute(_BUMP_SQL, (student_id, _new_version()))
+
+
+def bump_all(db):
+    """Invalidate every student's cached progress (topic or subtopic change)."""
+    bump(db, GLOBAL_VERSION_ID)
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with a fixed number of entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedCache:
+    """Latest summary per student in a SQLite file shared across processes.
+
+    One row per student, replaced on every store, so the file stays bounded
+    by the number of students. Connections are per thread and per process,
+    so gunicorn's forked workers never share one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS progress_cache (
+                    student_id INTEGER PRIMARY KEY,
+                    version TEXT NOT NULL,
+                    summary TEXT NOT NULL
+                )
+            ''')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, student_id, version):
+        row = self._connection().execute(
+            'SELECT summary FROM progress_cache WHERE student_id = ? AND version = ?',
+            (student_id, version)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, student_id, version, summary):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO progress_cache (student_id, version, summary) VALUES (?, ?, ?)',
+            # Decimals (PostgreSQL NUMERIC) are stored as floats
+            (student_id, version, json.dumps(summary, default=float))
+        )
+
+
+_local_cache = None
+_shared_caches = {}
+_setup_lock = threading.Lock()
+
+
+def _setting(key):
+    if has_app_context():
+        return current_app.config.get(key, CACHE_DEFAULTS[key])
+    return CACHE_DEFAULTS[key]
+
+
+def _tiers():
+    global _local_cache
+    if _local_cache is None:
+        with _setup_lock:
+            if _local_cache is None:
+                _local_cache = LRUCache(int(_setting('PROGRESS_CACHE_SIZE')))
+    path = _setting('PROGRESS_CACHE_PATH')
+    shared = None
+    if path:
+        shared = _shared_caches.get(path)
+        if shared is None:
+            with _setup_lock:
+                shared = _shared_caches.setdefault(path, SharedCache(path))
+    return _local_cache, shared
+
+
+def get(student_id, version):
+    """Cached summary for (student_id, version), or None."""
+    local, shared = _tiers()
+    summary = local.get((student_id, version))
+    if summary is None and shared is not None:
+        try:
+            summary = shared.get(student_id, version)
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Shared progress cache read failed: {e}")
+        if summary is not None:
+            local.put((student_id, version), summary)
+    return summary
+
+
+def put(student_id, version, summary):
+    """Store a summary computed at ``version`` in both tiers."""
+    local, shared = _tiers()
+    local.put((student_id, version), summary)
+    if shared is not None:
+        try:
+            shared.put(student_id, version, summary)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            # Not cached in the shared tier; the request still gets its summary
+            logger.warning(f"Shared progress cache write failed: {e}")
+
+
+def clear_local():
+    """Empty this process's LRU tier (tests, or after a config change)."""
+    global _local_cache
+    with _setup_lock:
+        _local_cache = None
@@ -0,0 +1,117 @@
+# web/utils/progress_rollup.py
+"""
+Per-student, per-topic progress rollup.
+
+student_topic_rollup holds, for every (student, main topic) with any
+progress, the number of assessed subtopics, the sum of their mastery
+levels and the completion percentage. Writers refresh the affected keys
+in the same transaction as the progress change, so topic summaries are a
+keyed lookup instead of an aggregate over subtopic_progress.
+
+Backfill or repair with:
+    python utils/progress_rollup.py --rebuild
+"""
+
+import os
+import sys
+import argparse
+
+CREATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS student_topic_rollup (
+        student_id INTEGER NOT NULL,
+        main_topic_id INTEGER NOT NULL,
+        assessed_subtopics INTEGER NOT NULL DEFAULT 0,
+        mastery_sum INTEGER NOT NULL DEFAULT 0,
+        completion_percentage DOUBLE PRECISION NOT NULL DEFAULT 0,
+        PRIMARY KEY (student_id, main_topic_id)
+    )
+'''
+
+# Recomputes rollup rows from subtopic_progress; callers add a WHERE clause
+# (starting with AND) to limit it to the keys they changed
+_REFRESH_SQL = '''
+    INSERT INTO student_topic_rollup
+        (student_id, main_topic_id, assessed_subtopics, mastery_sum, completion_percentage)
+    SELECT
+        sp.student_id,
+        s.main_topic_id,
+        COUNT(*),
+        SUM(COALESCE(sp.mastery_level, 0)),
+        ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM subtopics t WHERE t.main_topic_id = s.main_topic_id), 1)
+    FROM subtopic_progress sp
+    JOIN subtopics s ON sp.subtopic_id = s.id
+    JOIN main_topics mt ON s.main_topic_id = mt.id
+    WHERE 1 = 1 {where}
+    GROUP BY sp.student_id, s.main_topic_id
+'''
+
+REBUILD_SQL = _REFRESH_SQL.format(where='')
+
+
+def _in_list(values):
+    return ', '.join(['?'] * len(values))
+
+
+def refresh_student_topics(db, student_id, topic_ids):
+    """Recompute one student's rollup rows for the given main topics."""
+    topic_ids = list(topic_ids)
+    if not topic_ids:
+        return
+    params = [student_id, *topic_ids]
+    db.execute(f'''
+        DELETE FROM student_topic_rollup
+        WHERE student_id = ? AND main_topic_id IN ({_in_list(topic_ids)})
+    ''', params)
+    db.execute(_REFRESH_SQL.format(
+        where=f"AND sp.student_id = ? AND s.main_topic_id IN ({_in_list(topic_ids)})"
+    ), params)
+
+
+def refresh_topic(db, main_topic_id):
+    """Recompute every student's rollup row for one main topic.
+
+    Needed when the topic gains or loses subtopics, since that changes
+    everyone's completion percentage.
+    """
+    db.execute('DELETE FROM student_topic_rollup WHERE main_topic_id = ?', (main_topic_id,))
+    db.execute(_REFRESH_SQL.format(where="AND s.main_topic_id = ?"), (main_topic_id,))
+
+
+def delete_student(db, student_id):
+    db.execute('DELETE FROM student_topic_rollup WHERE student_id = ?', (student_id,))
+
+
+def delete_topic(db, main_topic_id):
+    db.execute('DELETE FROM student_topic_rollup WHERE main_topic_id = ?', (main_topic_id,))
+
+
+def rebuild(db):
+    """Recreate every rollup row from subtopic_progress; returns the row count."""
+    db.execute(CREATE_TABLE_SQL)
+    db.execute('DELETE FROM student_topic_rollup')
+    db.execute(REBUILD_SQL)
+    return db.execute('SELECT COUNT(*) AS count FROM student_topic_rollup').fetchone()['count']
+
+
+def main():
+    """Rebuild the rollup table for the configured database."""
+    parser = argparse.ArgumentParser(description='Maintain the student_topic_rollup table')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute every row from subtopic_progress')
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    # Add web/ to path so the app is importable when run as a script
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from app import app
+    from utils.db_connection import get_db
+
+    with app.app_context():
+        with get_db() as db:
+            rows = rebuild(db)
+    print(f"✅ Rebuilt student_topic_rollup: {rows} rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+# web/utils/query_stats.py
+"""
+Per-request database instrumentation.
+
+DatabaseConnection reports every statement it runs here. For each request
+we keep the query count, total DB time and the slowest statement, send them
+back as a Server-Timing header and write one structured log line. Any
+statement slower than DB_SLOW_QUERY_MS is logged with its SQL template and
+bind count (never the bound values).
+
+Opt-in N+1 detection: with DB_N_PLUS_ONE_THRESHOLD set, a statement that runs
+more than that many times in one request is reported with the call site
+that issued it, or raises NPlusOneQueryError when DB_N_PLUS_ONE_RAISE is on
+(meant for tests).
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+from flask import current_app, g, has_app_context, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+# Used when no Flask app config is available
+STATS_DEFAULTS = {
+    'DB_QUERY_STATS': True,
+    'DB_SLOW_QUERY_MS': 200.0,
+    'DB_N_PLUS_ONE_THRESHOLD': 0,
+    'DB_N_PLUS_ONE_RAISE': False,
+}
+
+# Frames in these files are skipped when looking for a statement's call site
+_WEB_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_DB_LAYER_FILES = {
+    os.path.join(_WEB_ROOT, 'utils', name)
+    for name in ('db_connection.py', 'db_rows.py', 'query_stats.py')
+}
+
+
+class NPlusOneQueryError(Exception):
+    """One statement ran more often in a request than DB_N_PLUS_ONE_THRESHOLD allows."""
+
+
+def _setting(key):
+    if has_app_context():
+        return current_app.config.get(key, STATS_DEFAULTS[key])
+    return STATS_DEFAULTS[key]
+
+
+def sql_template(sql):
+    """Collapse a statement's whitespace so it fits on one log line."""
+    return ' '.join(sql.split())
+
+
+class QueryStats:
+    """Query count, DB time and slowest statement for one request."""
+
+    __slots__ = ('count', 'total_ms', 'slowest_ms', 'slowest_sql', 'slow_ms', 'started',
+                 'repeat_limit', 'repeat_raise', 'fingerprints')
+
+    def __init__(self, slow_ms, repeat_limit=0, repeat_raise=False):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql = None
+        self.slow_ms = slow_ms
+        self.started = time.perf_counter()
+        self.repeat_limit = repeat_limit
+        self.repeat_raise = repeat_raise
+        # Executions per SQL text; statements are parameterized, so the
+        # text itself is the fingerprint
+        self.fingerprints = {} if repeat_limit else None
+
+    def count_repeat(self, sql):
+        """Count one execution of ``sql`` and report it once it passes the limit."""
+        seen = self.fingerprints.get(sql, 0) + 1
+        self.fingerprints[sql] = seen
+        if seen == self.repeat_limit + 1:
+            _report_repeat(sql, seen, self.repeat_raise)
+
+    def server_timing(self, request_ms):
+        """Server-Timing header value for this request."""
+        parts = [f'db;dur={self.total_ms:.2f};desc="{self.count} queries"']
+        if self.count:
+            parts.append(f'db-slowest;dur={self.slowest_ms:.2f}')
+        parts.append(f'app;dur={request_ms:.2f}')
+        return ', '.join(parts)
+
+
+class StatementTiming:
+    """Time spent on one statement, from execute through its fetches."""
+
+    __slots__ = ('sql', 'bind_count', 'ms', 'stats', 'slow_ms', 'logged')
+
+    def __init__(self, sql, bind_count, stats, slow_ms):
+        self.sql = sql
+        self.bind_count = bind_count
+        self.ms = 0.0
+        self.stats = stats
+        self.slow_ms = slow_ms
+        self.logged = False
+
+    def add(self, elapsed_ms):
+        """Add execute or fetch time to this statement and its request."""
+        self.ms += elapsed_ms
+        stats = self.stats
+        if stats is not None:
+            stats.total_ms += elapsed_ms
+            if self.ms > stats.slowest_ms:
+                stats.slowest_ms = self.ms
+                stats.slowest_sql = self.sql
+        if self.slow_ms and self.ms >= self.slow_ms and not self.logged:
+            self.logged = True
+            logger.warning(json.dumps({
+                'event': 'slow_query',
+                'ms': round(self.ms, 2),
+                'binds': self.bind_count,
+                'sql': sql_template(self.sql),
+                'path': request.path if has_request_context() else None,
+            }))
+
+
+def call_site(depth=2):
+    """The innermost application frames outside the DB layer, as 'file:line in func'."""
+    frame = sys._getframe(1)
+    sites = []
+    while frame is not None and len(sites) < depth:
+        filename = frame.f_code.co_filename
+        if filename not in _DB_LAYER_FILES and filename.startswith(_WEB_ROOT):
+            sites.append(f"{os.path.relpath(filename, _WEB_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return ' <- '.join(sites) or 'unknown'
+
+
+def _report_repeat(sql, count, fail):
+    site = call_site()
+    if fail:
+        raise NPlusOneQueryError(f"Statement ran {count} times in one request ({site}): {sql_template(sql)}")
+    logger.warning(json.dumps({
+        'event': 'n_plus_one',
+        'count': count,
+        'sql': sql_template(sql),
+        'call_site': site,
+        'path': request.path if has_request_context() else None,
+    }))
+
+
+def record(sql, bind_count, elapsed_ms):
+    """Record one executed statement; returns its timing, or None if disabled.
+
+    The returned StatementTiming is handed to QueryResult so fetch time is
+    counted against the same statement.
+    """
+    stats = g.get('_query_stats') if has_app_context() else None
+    if stats is not None:
+        stats.count += 1
+        if stats.fingerprints is not None:
+            stats.count_repeat(sql)
+        timing = StatementTiming(sql, bind_count, stats, stats.slow_ms)
+    elif not _setting('DB_QUERY_STATS'):
+        return None
+    else:
+        # Outside a request (scripts, CLI) only the slow-query log applies
+        timing = StatementTiming(sql, bind_count, None, _setting('DB_SLOW_QUERY_MS'))
+    timing.add(elapsed_ms)
+    return timing
+
+
+def get_request_stats():
+    """QueryStats for the current request, or None."""
+    return g.get('_query_stats') if has_app_context() else None
+
+
+def _start_request():
+    if current_app.config.get('DB_QUERY_STATS', STATS_DEFAULTS['DB_QUERY_STATS']):
+        g._query_stats = QueryStats(
+            _setting('DB_SLOW_QUERY_MS'),
+            repeat_limit=_setting('DB_N_PLUS_ONE_THRESHOLD'),
+            repeat_raise=_setting('DB_N_PLUS_ONE_RAISE'),
+        )
+
+
+def _finish_request(response):
+    stats = g.pop('_query_stats', None)
+    if stats is None:
+        return response
+    request_ms = (time.perf_counter() - stats.started) * 1000
+    response.headers['Server-Timing'] = stats.server_timing(request_ms)
+    if stats.count:
+        logger.info(json.dumps({
+            'event': 'db_request',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(stats.total_ms, 2),
+            'slowest_ms': round(stats.slowest_ms, 2),
+            'slowest_sql': sql_template(stats.slowest_sql),
+            'request_ms': round(request_ms, 2),
+        }))
+    return response
+
+
+def init_app(app):
+    """Collect query stats for every request."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
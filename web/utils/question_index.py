@@ -0,0 +1,200 @@
+# web/utils/question_index.py
+"""
+Per-process index of the question bank.
+
+The bank changes rarely but is read on every question-bank page, every
+generate form and every worksheet. This keeps each subtopic's active
+questions in memory, bucketed by difficulty, with the columns needed to
+list and render them and per-bucket stats precomputed, so sampling and
+stats need no query against questions.
+
+question_versions holds an opaque version per subtopic plus a global one
+(subtopic_id 0) for bulk imports. QuestionService bumps it in the same
+transaction as every create, update and delete, and a subtopic's index is
+reloaded whenever its version has moved. Checking the version is one
+primary-key read, so every worker sees a write on its next request.
+
+Indexed rows are shared between requests; treat them as read-only.
+"""
+
+import random
+import secrets
+import threading
+from flask import current_app, has_app_context
+
+from utils.progress_cache import LRUCache
+
+# Used when no Flask app config is available
+INDEX_DEFAULTS = {
+    'QUESTION_INDEX_SIZE': 256,
+}
+
+# Row holding the version for changes that may touch any subtopic
+GLOBAL_VERSION_ID = 0
+
+CREATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS question_versions (
+        subtopic_id INTEGER PRIMARY KEY,
+        version VARCHAR(32) NOT NULL
+    )
+'''
+
+_BUMP_SQL = '''
+    INSERT INTO question_versions (subtopic_id, version) VALUES (?, ?)
+    ON CONFLICT (subtopic_id) DO UPDATE SET version = EXCLUDED.version
+'''
+
+# SQLite needs the WHERE clause to parse ON CONFLICT after a SELECT
+_BUMP_QUESTION_SQL = '''
+    INSERT INTO question_versions (subtopic_id, version)
+    SELECT subtopic_id, ? FROM questions WHERE id = ? AND subtopic_id IS NOT NULL
+    ON CONFLICT (subtopic_id) DO UPDATE SET version = EXCLUDED.version
+'''
+
+QUESTION_COLUMNS = (
+    'id', 'difficulty_level', 'question_text', 'answer', 'time_estimate_minutes',
+    'space_required', 'question_type', 'is_template', 'template_params', 'created_date',
+)
+
+# Same order as the question bank page: by difficulty, newest first
+_LOAD_SQL = f'''
+    SELECT {', '.join(QUESTION_COLUMNS)}
+    FROM questions
+    WHERE subtopic_id = ? AND active = true
+    ORDER BY difficulty_level, created_date DESC, id DESC
+'''
+
+DIFFICULTY_LABELS = {1: 'easy', 2: 'medium', 3: 'hard'}
+
+
+def _new_version():
+    return secrets.token_hex(8)
+
+
+def get_version(db, subtopic_id):
+    """Current version of a subtopic's questions, including bulk imports."""
+    rows = db.execute(
+        'SELECT subtopic_id, version FROM question_versions WHERE subtopic_id IN (?, ?)',
+        (GLOBAL_VERSION_ID, subtopic_id), prepare=True
+    ).fetchall()
+    versions = {row.subtopic_id: row.version for row in rows}
+    return f"{versions.get(GLOBAL_VERSION_ID, '0')}.{versions.get(subtopic_id, '0')}"
+
+
+def bump(db, subtopic_id):
+    """Invalidate a subtopic's index; call inside the writing transaction."""
+    db.execute(_BUMP_SQL, (subtopic_id, _new_version()))
+
+
+def bump_question(db, question_id):
+    """Invalidate the index of the subtopic a question belongs to."""
+    db.execute(_BUMP_QUESTION_SQL, (_new_version(), question_id))
+
+
+def bump_all(db):
+    """Invalidate every subtopic's index (bulk imports)."""
+    bump(db, GLOBAL_VERSION_ID)
+
+
+class Bucket:
+    """Active questions of one difficulty, with their stats."""
+
+    __slots__ = ('questions', 'count', 'avg_time')
+
+    def __init__(self, questions):
+        self.questions = tuple(questions)
+        self.count = len(self.questions)
+        times = [q.time_estimate_minutes for q in self.questions if q.time_estimate_minutes is not None]
+        # Matches SQL AVG(): NULL estimates are ignored
+        self.avg_time = sum(times) / len(times) if times else 0
+
+
+class SubtopicIndex:
+    """One subtopic's questions bucketed by difficulty, at one version."""
+
+    __slots__ = ('version', 'buckets')
+
+    def __init__(self, version, rows):
+        self.version = version
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row.difficulty_level, []).append(row)
+        self.buckets = {level: Bucket(questions) for level, questions in grouped.items()}
+
+    def questions(self, difficulty_level=None):
+        """Questions of one difficulty, or all of them in difficulty order."""
+        if difficulty_level is not None:
+            bucket = self.buckets.get(difficulty_level)
+            return list(bucket.questions) if bucket else []
+        return [q for level in sorted(self.buckets) for q in self.buckets[level].questions]
+
+    def sample(self, counts, rng=random):
+        """Random questions per {difficulty_level: count}, ordered by difficulty.
+
+        Costs O(count) per difficulty whatever the bucket size; a bucket
+        with too few questions gives all it has.
+        """
+        chosen = []
+        for level, count in sorted(counts.items()):
+            bucket = self.buckets.get(level)
+            if not bucket or count <= 0:
+                continue
+            positions = rng.sample(range(bucket.count), min(count, bucket.count))
+            chosen.extend(bucket.questions[position] for position in positions)
+        return chosen
+
+    def stats(self):
+        """{'easy': {'count', 'avg_time'}, ...} like QuestionService.get_question_stats."""
+        result = {label: {'count': 0, 'avg_time': 0} for label in DIFFICULTY_LABELS.values()}
+        for level, label in DIFFICULTY_LABELS.items():
+            bucket = self.buckets.get(level)
+            if bucket:
+                result[label] = {'count': bucket.count, 'avg_time': bucket.avg_time}
+        return result
+
+
+def load(db, subtopic_id, version):
+    """Build a subtopic's index from the database."""
+    return SubtopicIndex(version, db.execute(_LOAD_SQL, (subtopic_id,), prepare=True).fetchall())
+
+
+_cache = None
+_setup_lock = threading.Lock()
+
+
+def _setting(key):
+    if has_app_context():
+        return current_app.config.get(key, INDEX_DEFAULTS[key])
+    return INDEX_DEFAULTS[key]
+
+
+def _subtopics():
+    global _cache
+    if _cache is None:
+        with _setup_lock:
+            if _cache is None:
+                _cache = LRUCache(int(_setting('QUESTION_INDEX_SIZE')))
+    return _cache
+
+
+def get(db, subtopic_id):
+    """Current index for a subtopic, reloading it if its version has moved.
+
+    The version is read before the questions, so a write landing in
+    between leaves a newer index under the older version and the next call
+    reloads it; an index is never older than the version it is stored under.
+    """
+    version = get_version(db, subtopic_id)
+    subtopics = _subtopics()
+    index = subtopics.get(subtopic_id)
+    if index is None or index.version != version:
+        index = load(db, subtopic_id, version)
+        subtopics.put(subtopic_id, index)
+    return index
+
+
+def clear():
+    """Drop this process's index (tests, or after a config change)."""
+    global _cache
+    with _setup_lock:
+        _cache = None
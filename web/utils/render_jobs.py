@@ -0,0 +1,366 @@
+# web/utils/render_jobs.py
+"""
+Background PDF rendering for worksheets.
+
+Finalizing a worksheet used to lay the PDF out with ReportLab inside the
+request, holding a gunicorn worker for the whole render. Now it only queues
+a job; renders run in a local process pool.
+
+render_jobs holds one row per worksheet (queued -> running -> done | failed).
+Each app process claims queued rows and hands them to its pool, and a
+finished render updates the job and the worksheet in one transaction.
+Because the queue lives in the database:
+  * any process can render a job another one queued
+  * jobs survive restarts: queued rows are picked up by the next process
+    that serves a worksheet request, and rows a dead process left
+    'running' are requeued after PDF_RENDER_TIMEOUT seconds (and marked
+    failed after MAX_ATTEMPTS)
+  * PDF_RENDER_WORKERS bounds concurrent renders across all processes,
+    since a job is only claimed while fewer than that many are running
+    (claims are serialized: SQLite's single writer, a transaction-level
+    advisory lock on PostgreSQL)
+
+Each enqueue gets a fresh token, so a worksheet re-finalized while it is
+rendering ignores the stale result and renders again.
+
+Renders go through utils.pdf_cache: a job whose content was rendered before
+is completed from the cached file without touching the pool.
+
+PDF_RENDER_WORKERS = 0 renders inline in the calling thread instead (tests
+and single-process tools).
+"""
+
+import os
+import time
+import secrets
+import logging
+import importlib
+import threading
+import multiprocessing
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, has_app_context
+
+from utils import pdf_cache
+from utils.db_connection import get_db
+
+logger = logging.getLogger(__name__)
+
+# Used when no Flask app config is available
+RENDER_DEFAULTS = {
+    'PDF_RENDER_WORKERS': 2,
+    'PDF_RENDER_TIMEOUT': 300,
+}
+
+# "module:function" called in the pool with WorksheetService.get_worksheet()
+# data, the path to write the PDF to and the date to print on it
+RENDERER = 'worksheet.pdf_generator:generate_worksheet_pdf'
+
+MAX_ATTEMPTS = 3
+
+PENDING = ('queued', 'running')
+
+CREATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS render_jobs (
+        worksheet_id INTEGER PRIMARY KEY,
+        token VARCHAR(32) NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        pdf_path TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at BIGINT NOT NULL,
+        started_at BIGINT,
+        finished_at BIGINT
+    )
+'''
+
+CREATE_INDEX_SQL = '''
+    CREATE INDEX IF NOT EXISTS idx_render_jobs_status
+    ON render_jobs (status, created_at)
+'''
+
+_ENQUEUE_SQL = '''
+    INSERT INTO render_jobs (worksheet_id, token, status, created_at) VALUES (?, ?, 'queued', ?)
+    ON CONFLICT (worksheet_id) DO UPDATE SET
+        token = EXCLUDED.token, status = 'queued', pdf_path = NULL, error = NULL,
+        attempts = 0, created_at = EXCLUDED.created_at, started_at = NULL, finished_at = NULL
+'''
+
+_REQUEUE_STALE_SQL = '''
+    UPDATE render_jobs
+    SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+        error = CASE WHEN attempts >= ? THEN 'Render did not finish' ELSE error END
+    WHERE status = 'running' AND started_at < ?
+'''
+
+# Advisory lock key serializing claims on PostgreSQL, where READ COMMITTED
+# would otherwise let two processes both see a free slot
+_CLAIM_LOCK_ID = 7_208_011
+
+_CLAIM_SQL = '''
+    UPDATE render_jobs SET status = 'running', started_at = ?, attempts = attempts + 1
+    WHERE worksheet_id = ? AND token = ? AND status = 'queued'
+        AND (SELECT COUNT(*) FROM render_jobs WHERE status = 'running') < ?
+'''
+
+
+def _setting(key):
+    if has_app_context():
+        return current_app.config.get(key, RENDER_DEFAULTS[key])
+    return RENDER_DEFAULTS[key]
+
+
+def create_table(cursor):
+    cursor.execute(CREATE_TABLE_SQL)
+    cursor.execute(CREATE_INDEX_SQL)
+
+
+def enqueue(db, worksheet_id):
+    """Queue (or re-queue) a worksheet's render; call pump() once this commits."""
+    db.execute(_ENQUEUE_SQL, (worksheet_id, secrets.token_hex(8), int(time.time())))
+
+
+def get_job(db, worksheet_id):
+    """The worksheet's render job row, or None if it was never queued."""
+    return db.execute(
+        'SELECT * FROM render_jobs WHERE worksheet_id = ?', (worksheet_id,), prepare=True
+    ).fetchone()
+
+
+def is_stalled(job):
+    """True if no render is making progress on ``job``.
+
+    That is a queued job, or one left 'running' past PDF_RENDER_TIMEOUT;
+    pump() is what picks either up.
+    """
+    if job.status == 'queued':
+        return True
+    return (job.status == 'running' and job.started_at is not None
+            and job.started_at < int(time.time()) - int(_setting('PDF_RENDER_TIMEOUT')))
+
+
+def render(renderer, worksheet_data, filepath, render_date):
+    """Run ``renderer`` ("module:function") on the worksheet into filepath; runs in the pool."""
+    module_name, function_name = renderer.split(':')
+    function = getattr(importlib.import_module(module_name), function_name)
+    return pdf_cache.write(
+        filepath, lambda tmp_path: function(worksheet_data, tmp_path, render_date=render_date))
+
+
+class RenderPool:
+    """This process's render pool and the number of renders it has in flight."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self._executor = None
+
+    def executor(self):
+        # Request threads and done-callbacks both get here; the lock keeps
+        # them from starting (and leaking) a second set of workers
+        with self.lock:
+            # spawn, not fork: app processes are threaded and hold DB connections
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def reset(self, broken=None):
+        """Drop a broken executor so the next render starts a new one.
+
+        Pass the executor that failed; if another thread has already
+        replaced it, the new one is kept.
+        """
+        with self.lock:
+            executor = self._executor
+            if executor is None or (broken is not None and executor is not broken):
+                return
+            self._executor = None
+        executor.shutdown(wait=False)
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+_pools = {}
+_resumed = set()
+_setup_lock = threading.Lock()
+
+
+def _pool(workers):
+    # Keyed by pid so a forked gunicorn worker never reuses its parent's pool
+    key = (os.getpid(), workers)
+    pool = _pools.get(key)
+    if pool is None:
+        with _setup_lock:
+            pool = _pools.setdefault(key, RenderPool(workers))
+    return pool
+
+
+def _claim(limit):
+    """Mark the oldest queued job running, if under ``limit``; returns (worksheet_id, token) or None."""
+    now = int(time.time())
+    with get_db() as db:
+        if db.is_postgres:
+            # Released when the transaction commits
+            db.execute('SELECT pg_advisory_xact_lock(?)', (_CLAIM_LOCK_ID,))
+        db.execute(_REQUEUE_STALE_SQL, (MAX_ATTEMPTS, MAX_ATTEMPTS, now - int(_setting('PDF_RENDER_TIMEOUT'))))
+        # Another process may claim the same row first; try the next one
+        for _ in range(3):
+            job = db.execute('''
+                SELECT worksheet_id, token FROM render_jobs
+                WHERE status = 'queued'
+                ORDER BY created_at, worksheet_id
+                LIMIT 1
+            ''').fetchone()
+            if job is None:
+                return None
+            if db.execute(_CLAIM_SQL, (now, job.worksheet_id, job.token, limit)).rowcount:
+                return job.worksheet_id, job.token
+            running = db.execute("SELECT COUNT(*) AS count FROM render_jobs WHERE status = 'running'").fetchone()
+            if running.count >= limit:
+                return None
+    return None
+
+
+def _load(worksheet_id):
+    from worksheet.services import WorksheetService
+    return WorksheetService.get_worksheet(worksheet_id)
+
+
+def _record(worksheet_id, token, pdf_path=None, error=None):
+    """Store a render's outcome; a job re-queued since it was claimed is left alone."""
+    now = int(time.time())
+    with get_db() as db:
+        if error is not None:
+            db.execute('''
+                UPDATE render_jobs SET status = 'failed', error = ?, finished_at = ?
+                WHERE worksheet_id = ? AND token = ?
+            ''', (error, now, worksheet_id, token))
+            return
+        updated = db.execute('''
+            UPDATE render_jobs SET status = 'done', pdf_path = ?, error = NULL, finished_at = ?
+            WHERE worksheet_id = ? AND token = ?
+        ''', (pdf_path, now, worksheet_id, token)).rowcount
+        if updated:
+            db.execute('''
+                UPDATE worksheets SET status = ?, pdf_path = ? WHERE id = ?
+            ''', ('finalized', pdf_path, worksheet_id))
+
+
+def _describe(error):
+    return f"{type(error).__name__}: {error}"
+
+
+def _run_inline():
+    while True:
+        job = _claim(1)
+        if job is None:
+            return
+        worksheet_id, token = job
+        try:
+            worksheet_data = _load(worksheet_id)
+            if worksheet_data is None:
+                raise LookupError('worksheet no longer exists')
+            # Chosen once, so a render that straddles midnight prints the
+            # date it is cached under
+            render_date = date.today()
+            pdf_path, hit = pdf_cache.lookup(worksheet_data, render_date)
+            if not hit:
+                render(RENDERER, worksheet_data, pdf_path, render_date)
+            _record(worksheet_id, token, pdf_path=pdf_path)
+        except Exception as e:
+            logger.warning(f"PDF render for worksheet {worksheet_id} failed: {e}")
+            _record(worksheet_id, token, error=_describe(e))
+
+
+def _finished(app, pool, executor, worksheet_id, token, future):
+    """Pool callback: record the result, free the slot and start the next job."""
+    with app.app_context():
+        try:
+            try:
+                _record(worksheet_id, token, pdf_path=future.result())
+            except BrokenProcessPool as e:
+                pool.reset(executor)
+                _record(worksheet_id, token, error=_describe(e))
+            except Exception as e:
+                logger.warning(f"PDF render for worksheet {worksheet_id} failed: {e}")
+                _record(worksheet_id, token, error=_describe(e))
+        except Exception:
+            # The job stays 'running' and is requeued once it goes stale
+            logger.exception(f"Could not record the render of worksheet {worksheet_id}")
+        finally:
+            with pool.lock:
+                pool.in_flight -= 1
+        pump()
+
+
+def pump():
+    """Start queued renders until the concurrency bound is reached.
+
+    Call it after enqueue() commits and when a render finishes; status
+    polls only call it for a job that is_stalled().
+    """
+    workers = int(_setting('PDF_RENDER_WORKERS'))
+    if workers <= 0:
+        _run_inline()
+        return
+
+    app = current_app._get_current_object()
+    pool = _pool(workers)
+    while True:
+        with pool.lock:
+            if pool.in_flight >= workers:
+                return
+            pool.in_flight += 1
+        submitted = False
+        try:
+            job = _claim(workers)
+            if job is None:
+                return
+            worksheet_id, token = job
+            worksheet_data = _load(worksheet_id)
+            if worksheet_data is None:
+                _record(worksheet_id, token, error='LookupError: worksheet no longer exists')
+                continue
+            render_date = date.today()
+            pdf_path, hit = pdf_cache.lookup(worksheet_data, render_date)
+            if hit:
+                _record(worksheet_id, token, pdf_path=pdf_path)
+                continue
+            executor = pool.executor()
+            try:
+                future = executor.submit(render, RENDERER, worksheet_data, pdf_path, render_date)
+            except BrokenProcessPool:
+                # A pool process died since the last render; start a fresh pool
+                pool.reset(executor)
+                executor = pool.executor()
+                future = executor.submit(render, RENDERER, worksheet_data, pdf_path, render_date)
+            future.add_done_callback(
+                lambda done, executor=executor, worksheet_id=worksheet_id, token=token:
+                    _finished(app, pool, executor, worksheet_id, token, done))
+            submitted = True
+        finally:
+            if not submitted:
+                with pool.lock:
+                    pool.in_flight -= 1
+
+
+def resume():
+    """Pick up jobs left by earlier processes; runs once per process."""
+    pid = os.getpid()
+    if pid in _resumed:
+        return
+    with _setup_lock:
+        if pid in _resumed:
+            return
+        _resumed.add(pid)
+    try:
+        pump()
+    except Exception as e:
+        logger.warning(f"Could not resume PDF render jobs: {e}")
@@ -41,14 +41,7 @@ def get_current_user_role():
     try:
         tutor = TutorService.get_tutor(current_user.id)
         if tutor:
-            if isinstance(tutor, dict):
-                return tutor.get('role', 'tutor')
-            else:
-                # Handle Row object - find role column
-                try:
-                    return tutor['role']
-                except (KeyError, TypeError):
-                    return 'tutor'  # Default to tutor if role not found
+            return tutor.get('role', 'tutor')
         return 'tutor'
     except Exception:
         return 'tutor'
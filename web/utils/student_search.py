@@ -0,0 +1,292 @@
+# web/utils/student_search.py
+"""
+Full-text search over students.
+
+One search document per student covers name, target school, parent contact,
+notes and the tutor notes from all of their sessions. On SQLite it is an
+FTS5 table keyed by student id; on PostgreSQL a weighted tsvector with a GIN
+index. Triggers on students and sessions keep it in sync, so writers need no
+changes.
+
+Matches are ranked (name > school > contact/notes > session notes) and every
+search word is a prefix, so "ann sm" finds "Anna Smith".
+
+Create or repair the index with:
+    python utils/student_search.py --rebuild
+"""
+
+import os
+import re
+import sys
+import argparse
+
+# --- SQLite (FTS5) -------------------------------------------------------
+
+_SQLITE_TABLE_SQL = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS student_search USING fts5(
+        name, target_school, parent_contact, notes, tutor_notes,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+'''
+
+# Column weights for bm25; stored in the table so ORDER BY rank uses them
+_SQLITE_RANK_SQL = "INSERT INTO student_search (student_search, rank) VALUES ('rank', 'bm25(10.0, 4.0, 2.0, 2.0, 1.0)')"
+
+# Re-index one student; {student_id} is an expression such as NEW.id
+_SQLITE_REFRESH_SQL = '''
+    DELETE FROM student_search WHERE rowid = {student_id};
+    INSERT INTO student_search (rowid, name, target_school, parent_contact, notes, tutor_notes)
+    SELECT id, name, target_school, parent_contact, notes,
+           (SELECT group_concat(tutor_notes, ' ') FROM sessions WHERE student_id = students.id)
+    FROM students WHERE id = {student_id};
+'''
+
+_SQLITE_STUDENT_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS students_search_insert AFTER INSERT ON students BEGIN
+        {_SQLITE_REFRESH_SQL.format(student_id='NEW.id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS students_search_update
+    AFTER UPDATE OF name, target_school, parent_contact, notes ON students BEGIN
+        {_SQLITE_REFRESH_SQL.format(student_id='NEW.id')}
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS students_search_delete AFTER DELETE ON students BEGIN
+        DELETE FROM student_search WHERE rowid = OLD.id;
+    END
+    ''',
+]
+
+_SQLITE_SESSION_TRIGGERS = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS sessions_search_insert AFTER INSERT ON sessions
+    WHEN NEW.tutor_notes IS NOT NULL BEGIN
+        {_SQLITE_REFRESH_SQL.format(student_id='NEW.student_id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS sessions_search_update
+    AFTER UPDATE OF student_id, tutor_notes ON sessions BEGIN
+        {_SQLITE_REFRESH_SQL.format(student_id='OLD.student_id')}
+        {_SQLITE_REFRESH_SQL.format(student_id='NEW.student_id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS sessions_search_delete AFTER DELETE ON sessions
+    WHEN OLD.tutor_notes IS NOT NULL BEGIN
+        {_SQLITE_REFRESH_SQL.format(student_id='OLD.student_id')}
+    END
+    ''',
+]
+
+_SQLITE_REBUILD_SQL = '''
+    INSERT INTO student_search (rowid, name, target_school, parent_contact, notes, tutor_notes)
+    SELECT id, name, target_school, parent_contact, notes,
+           (SELECT group_concat(tutor_notes, ' ') FROM sessions WHERE student_id = students.id)
+    FROM students
+'''
+
+# Databases without a sessions table yet index the student fields alone
+_SQLITE_REBUILD_STUDENTS_SQL = '''
+    INSERT INTO student_search (rowid, name, target_school, parent_contact, notes)
+    SELECT id, name, target_school, parent_contact, notes
+    FROM students
+'''
+
+_SQLITE_SEARCH_SQL = '''
+    SELECT s.*, student_search.rank AS search_rank
+    FROM student_search
+    JOIN students s ON s.id = student_search.rowid
+    WHERE student_search MATCH ? {where}
+    ORDER BY student_search.rank
+    LIMIT ?
+'''
+
+# --- PostgreSQL (tsvector) -----------------------------------------------
+
+POSTGRES_SCHEMA_SQL = [
+    '''
+    CREATE TABLE IF NOT EXISTS student_search (
+        student_id INTEGER PRIMARY KEY,
+        document TSVECTOR NOT NULL
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_student_search_document ON student_search USING GIN (document)",
+    '''
+    CREATE OR REPLACE FUNCTION student_search_document(sid INTEGER) RETURNS TSVECTOR AS $$
+        SELECT setweight(to_tsvector('simple', COALESCE(s.name, '')), 'A')
+            || setweight(to_tsvector('simple', COALESCE(s.target_school, '')), 'B')
+            || setweight(to_tsvector('simple', COALESCE(s.parent_contact, '') || ' ' || COALESCE(s.notes, '')), 'C')
+            || setweight(to_tsvector('simple', COALESCE(
+                   (SELECT string_agg(tutor_notes, ' ') FROM sessions WHERE student_id = s.id), '')), 'D')
+        FROM students s WHERE s.id = sid
+    $$ LANGUAGE sql STABLE
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION refresh_student_search(sid INTEGER) RETURNS VOID AS $$
+        DELETE FROM student_search WHERE student_id = sid;
+        INSERT INTO student_search (student_id, document)
+        SELECT id, student_search_document(id) FROM students WHERE id = sid;
+    $$ LANGUAGE sql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION students_search_trigger() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM student_search WHERE student_id = OLD.id;
+        ELSE
+            PERFORM refresh_student_search(NEW.id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION sessions_search_trigger() RETURNS TRIGGER AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            PERFORM refresh_student_search(OLD.student_id);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.tutor_notes IS NOT NULL THEN
+            PERFORM refresh_student_search(NEW.student_id);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    "DROP TRIGGER IF EXISTS students_search ON students",
+    '''
+    CREATE TRIGGER students_search
+    AFTER INSERT OR DELETE OR UPDATE OF name, target_school, parent_contact, notes ON students
+    FOR EACH ROW EXECUTE FUNCTION students_search_trigger()
+    ''',
+    "DROP TRIGGER IF EXISTS sessions_search ON sessions",
+    '''
+    CREATE TRIGGER sessions_search
+    AFTER INSERT OR DELETE OR UPDATE OF student_id, tutor_notes ON sessions
+    FOR EACH ROW EXECUTE FUNCTION sessions_search_trigger()
+    ''',
+]
+
+POSTGRES_REBUILD_SQL = '''
+    INSERT INTO student_search (student_id, document)
+    SELECT id, student_search_document(id) FROM students
+'''
+
+_POSTGRES_SEARCH_SQL = '''
+    SELECT s.*, ts_rank(ss.document, q.query) AS search_rank
+    FROM student_search ss
+    CROSS JOIN (SELECT to_tsquery('simple', ?) AS query) q
+    JOIN students s ON s.id = ss.student_id
+    WHERE ss.document @@ q.query {where}
+    ORDER BY search_rank DESC, s.name, s.id
+    LIMIT ?
+'''
+
+
+def _search_words(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def match_query(text, is_postgres=False):
+    """Prefix query matching every word of ``text``, or None if it has none."""
+    words = _search_words(text)
+    if not words:
+        return None
+    if is_postgres:
+        return ' & '.join(f"{word}:*" for word in words)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _sqlite_table_exists(cursor, name):
+    return cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = ?", (name,)
+    ).fetchone() is not None
+
+
+def create_sqlite(cursor):
+    """Create the FTS5 table and its triggers; returns True if the table is new.
+
+    Session triggers are only added once the sessions table exists.
+    """
+    created = not _sqlite_table_exists(cursor, 'student_search')
+    cursor.execute(_SQLITE_TABLE_SQL)
+    if created:
+        cursor.execute(_SQLITE_RANK_SQL)
+    for trigger_sql in _SQLITE_STUDENT_TRIGGERS:
+        cursor.execute(trigger_sql)
+    if _sqlite_table_exists(cursor, 'sessions'):
+        for trigger_sql in _SQLITE_SESSION_TRIGGERS:
+            cursor.execute(trigger_sql)
+    return created
+
+
+def rebuild_sqlite(cursor):
+    """Index every student into an empty FTS5 table."""
+    if _sqlite_table_exists(cursor, 'sessions'):
+        cursor.execute(_SQLITE_REBUILD_SQL)
+    else:
+        cursor.execute(_SQLITE_REBUILD_STUDENTS_SQL)
+
+
+def create_postgresql(cursor):
+    """Create the search table, GIN index, functions and triggers; returns True if the table is new."""
+    cursor.execute("SELECT to_regclass('student_search')")
+    created = cursor.fetchone()[0] is None
+    for statement in POSTGRES_SCHEMA_SQL:
+        cursor.execute(statement)
+    return created
+
+
+def rebuild(db):
+    """Recreate every search document; returns the number indexed."""
+    if db.is_postgres:
+        create_postgresql(db.cursor)
+        db.execute('DELETE FROM student_search')
+        db.execute(POSTGRES_REBUILD_SQL)
+    else:
+        create_sqlite(db.cursor)
+        db.execute('DELETE FROM student_search')
+        rebuild_sqlite(db.cursor)
+    return db.execute('SELECT COUNT(*) AS count FROM student_search').fetchone()['count']
+
+
+def search(db, text, limit=20, conditions=(), params=()):
+    """Students matching every word of ``text`` as a prefix, best match first.
+
+    ``conditions`` are extra SQL filters on the students table (aliased
+    ``s``), with their ``params``.
+    """
+    query = match_query(text, db.is_postgres)
+    if query is None:
+        return []
+    sql = _POSTGRES_SEARCH_SQL if db.is_postgres else _SQLITE_SEARCH_SQL
+    where = ''.join(f" AND {condition}" for condition in conditions)
+    return db.execute(sql.format(where=where), (query, *params, limit)).fetchall()
+
+
+def main():
+    """Rebuild the search index for the configured database."""
+    parser = argparse.ArgumentParser(description='Maintain the student full-text search index')
+    parser.add_argument('--rebuild', action='store_true', help='Create the index and re-index every student')
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    # Add web/ to path so the app is importable when run as a script
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from app import app
+    from utils.db_connection import get_db
+
+    with app.app_context():
+        with get_db() as db:
+            rows = rebuild(db)
+    print(f"✅ Rebuilt student_search: {rows} students indexed")
+
+
+if __name__ == '__main__':
+    main()
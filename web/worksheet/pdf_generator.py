@@ -4,22 +4,30 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch, cm
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from datetime import datetime
+from datetime import date, datetime
 import os
 
-def generate_worksheet_pdf(worksheet_data):
-    """Generate a PDF worksheet with proper spacing for different question types."""
+def generate_worksheet_pdf(worksheet_data, filepath=None, render_date=None):
+    """Generate a PDF worksheet with proper spacing for different question types.
+    
+    Writes to ``filepath`` when given (utils.pdf_cache passes its
+    content-addressed path), otherwise to a timestamped file. The header
+    shows ``render_date`` (default today); the cache passes the date its
+    key was built with.
+    """
     
     worksheet = worksheet_data['worksheet']
     questions = worksheet_data['questions']
+    render_date = render_date or date.today()
     
-    # Create PDF directory if it doesn't exist
-    pdf_dir = os.path.join('web', 'static', 'worksheets')
-    os.makedirs(pdf_dir, exist_ok=True)
-    
-    # Generate filename
-    filename = f"worksheet_{worksheet['id']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    filepath = os.path.join(pdf_dir, filename)
+    if filepath is None:
+        # Create PDF directory if it doesn't exist
+        pdf_dir = os.path.join('web', 'static', 'worksheets')
+        os.makedirs(pdf_dir, exist_ok=True)
+        
+        # Generate filename
+        filename = f"worksheet_{worksheet['id']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        filepath = os.path.join(pdf_dir, filename)
     
     # Create PDF document
     doc = SimpleDocTemplate(filepath, pagesize=A4, 
@@ -61,7 +69,7 @@ def generate_worksheet_pdf(worksheet_data):
     # Add header
     elements.append(Paragraph(worksheet['title'], title_style))
     elements.append(Paragraph(
-        f"Student: {worksheet['student_name']} | Date: {datetime.now().strftime('%d %B %Y')}", 
+        f"Student: {worksheet['student_name']} | Date: {render_date.strftime('%d %B %Y')}", 
         subtitle_style
     ))
     elements.append(Spacer(1, 0.5*inch))
@@ -1,9 +1,11 @@
 # web/worksheet/routes.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, jsonify
 from flask_login import login_required, current_user
 from .services import WorksheetService, QuestionService
 from student.services import StudentService
 from topic.services import TopicService
+from utils import pdf_cache, render_jobs
+from utils.decorators import admin_required
 import os
 
 worksheet_bp = Blueprint('worksheet', __name__, url_prefix='/worksheets')
@@ -97,6 +99,7 @@ def edit_question(question_id):
                 question.get('template_params')
             )
             examples.append(generated_text)
+        question = question.to_dict()
         question['examples'] = examples
         
     if request.method == 'POST':
@@ -172,17 +175,11 @@ def generate_worksheet(student_id, subtopic_id):
                          recommended_dist=recommended_dist,
                          stats=stats)
 
-@worksheet_bp.route('/generate', methods=['POST'])
-@login_required
-def create_worksheet():
-    """Actually generate the worksheet."""
-    student_id = request.form.get('student_id', type=int)
-    subtopic_id = request.form.get('subtopic_id', type=int)
-    
-    # Get difficulty distribution
-    easy_pct = request.form.get('easy_percentage', type=int) or 40
-    medium_pct = request.form.get('medium_percentage', type=int) or 40
-    hard_pct = request.form.get('hard_percentage', type=int) or 20
+def _difficulty_distribution(values):
+    """Easy/medium/hard percentages from form or JSON values, normalized to 100."""
+    easy_pct = _int_value(values, 'easy_percentage') or 40
+    medium_pct = _int_value(values, 'medium_percentage') or 40
+    hard_pct = _int_value(values, 'hard_percentage') or 20
     
     # Ensure they add up to 100
     total = easy_pct + medium_pct + hard_pct
@@ -192,11 +189,27 @@ def create_worksheet():
         medium_pct = int(medium_pct * 100 / total)
         hard_pct = 100 - easy_pct - medium_pct
     
-    difficulty_dist = {
+    return {
         'easy': easy_pct,
         'medium': medium_pct,
         'hard': hard_pct
     }
+
+def _int_value(values, key):
+    try:
+        return int(values.get(key))
+    except (TypeError, ValueError):
+        return None
+
+@worksheet_bp.route('/generate', methods=['POST'])
+@login_required
+def create_worksheet():
+    """Actually generate the worksheet."""
+    student_id = request.form.get('student_id', type=int)
+    subtopic_id = request.form.get('subtopic_id', type=int)
+    
+    # Get difficulty distribution
+    difficulty_dist = _difficulty_distribution(request.form)
     
     total_questions = request.form.get('total_questions', type=int) or 20
     title = request.form.get('title', '').strip() or None
@@ -216,6 +229,83 @@ def create_worksheet():
                               student_id=student_id, 
                               subtopic_id=subtopic_id))
 
+@worksheet_bp.route('/generate/batch/<int:subtopic_id>', methods=['GET', 'POST'])
+@login_required
+def generate_batch(subtopic_id):
+    """Generate the same subtopic worksheet for a group of students."""
+    subtopic = TopicService.get_subtopic(subtopic_id)
+    if not subtopic:
+        flash('Subtopic not found!', 'error')
+        return redirect(url_for('topic.list_topics'))
+    
+    students = [student for student in StudentService.get_all_students() if student['active']]
+    generated = []
+    
+    if request.method == 'POST':
+        student_ids = request.form.getlist('student_ids', type=int)
+        difficulty_dist = None
+        if not request.form.get('use_recommended'):
+            difficulty_dist = _difficulty_distribution(request.form)
+        
+        try:
+            worksheet_ids = WorksheetService.generate_worksheets(
+                student_ids, subtopic_id, current_user.id, difficulty_dist,
+                request.form.get('total_questions', type=int) or 20,
+                request.form.get('title', '').strip() or None
+            )
+            names = {student['id']: student['name'] for student in students}
+            generated = [{'student_id': student_id, 'student_name': names.get(student_id, student_id),
+                          'worksheet_id': worksheet_id}
+                         for student_id, worksheet_id in worksheet_ids.items()]
+            flash(f'{len(generated)} worksheets generated!', 'success')
+        except ValueError as e:
+            flash(f'Error generating worksheets: {e}', 'error')
+    
+    return render_template('worksheet/batch_generate.html',
+                         subtopic=subtopic,
+                         students=students,
+                         stats=QuestionService.get_question_stats(subtopic_id),
+                         generated=generated)
+
+@worksheet_bp.route('/api/generate-batch', methods=['POST'])
+@login_required
+def generate_batch_json():
+    """Generate worksheets for many students from a JSON body.
+    
+    Body: {"subtopic_id", "student_ids": [...], optional "total_questions",
+    "title" and "easy/medium/hard_percentage" (omit them to use each
+    student's recommended mix)}.
+    """
+    body = request.get_json(silent=True) or {}
+    student_ids = body.get('student_ids')
+    subtopic_id = _int_value(body, 'subtopic_id')
+    if not isinstance(student_ids, list) or subtopic_id is None:
+        return jsonify({'error': 'subtopic_id and a list of student_ids are required'}), 400
+    
+    try:
+        student_ids = [int(student_id) for student_id in student_ids]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'student_ids must be integers'}), 400
+    
+    difficulty_dist = None
+    if any(key in body for key in ('easy_percentage', 'medium_percentage', 'hard_percentage')):
+        difficulty_dist = _difficulty_distribution(body)
+    
+    try:
+        worksheet_ids = WorksheetService.generate_worksheets(
+            student_ids, subtopic_id, current_user.id,
+            difficulty_dist, _int_value(body, 'total_questions') or 20,
+            (body.get('title') or '').strip() or None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'subtopic_id': subtopic_id,
+        'worksheets': [{'student_id': student_id, 'worksheet_id': worksheet_id}
+                       for student_id, worksheet_id in worksheet_ids.items()]
+    }), 201
+
 @worksheet_bp.route('/<int:worksheet_id>/edit')
 @login_required
 def edit_worksheet(worksheet_id):
@@ -248,31 +338,54 @@ def update_worksheet(worksheet_id):
     flash('Worksheet updated!', 'success')
     return redirect(url_for('worksheet.edit_worksheet', worksheet_id=worksheet_id))
 
+@worksheet_bp.before_request
+def _resume_render_jobs():
+    """Once per process, pick up PDF renders queued before it started."""
+    render_jobs.resume()
+
 @worksheet_bp.route('/<int:worksheet_id>/finalize')
 @login_required
 def finalize_worksheet(worksheet_id):
-    """Generate PDF and finalize worksheet."""
-    from .pdf_generator import generate_worksheet_pdf
-    
+    """Queue the worksheet's PDF; it is finalized once the render finishes."""
     worksheet_data = WorksheetService.get_worksheet(worksheet_id)
     if not worksheet_data:
         flash('Worksheet not found!', 'error')
         return redirect(url_for('student.list_students'))
     
     try:
-        # Generate PDF
-        pdf_path = generate_worksheet_pdf(worksheet_data)
-        
-        # Update worksheet status
-        WorksheetService.finalize_worksheet(worksheet_id, pdf_path)
-        
-        flash('Worksheet finalized! PDF ready for download.', 'success')
+        WorksheetService.queue_pdf(worksheet_id)
+        flash('Generating PDF - it will be ready to download shortly.', 'success')
         return redirect(url_for('worksheet.view_worksheet', worksheet_id=worksheet_id))
         
     except Exception as e:
         flash(f'Error generating PDF: {e}', 'error')
         return redirect(url_for('worksheet.edit_worksheet', worksheet_id=worksheet_id))
 
+@worksheet_bp.route('/<int:worksheet_id>/pdf-status')
+@login_required
+def pdf_status(worksheet_id):
+    """Render job status as JSON, for polling after finalize."""
+    job = WorksheetService.get_pdf_job(worksheet_id)
+    if not job:
+        return jsonify({'worksheet_id': worksheet_id, 'status': 'none'}), 404
+    if render_jobs.is_stalled(job):
+        # Nothing is rendering it (all slots were busy, or a worker died);
+        # try to start it, then report the fresh state
+        render_jobs.pump()
+        job = WorksheetService.get_pdf_job(worksheet_id)
+    
+    result = {'worksheet_id': worksheet_id, 'status': job.status, 'error': job.error}
+    if job.status == 'done':
+        result['download_url'] = url_for('worksheet.download_worksheet', worksheet_id=worksheet_id)
+    return jsonify(result)
+
+@worksheet_bp.route('/pdf-cache')
+@login_required
+@admin_required
+def pdf_cache_stats():
+    """PDF render cache hits and misses for this worker process, as JSON."""
+    return jsonify(pdf_cache.stats())
+
 @worksheet_bp.route('/<int:worksheet_id>')
 @login_required
 def view_worksheet(worksheet_id):
@@ -284,7 +397,8 @@ def view_worksheet(worksheet_id):
     
     return render_template('worksheet/view.html',
                          worksheet=worksheet_data['worksheet'],
-                         questions=worksheet_data['questions'])
+                         questions=worksheet_data['questions'],
+                         pdf_job=WorksheetService.get_pdf_job(worksheet_id))
 
 @worksheet_bp.route('/<int:worksheet_id>/download')
 @login_required
@@ -292,7 +406,13 @@ def download_worksheet(worksheet_id):
     """Download worksheet PDF."""
     worksheet_data = WorksheetService.get_worksheet(worksheet_id)
     if not worksheet_data or not worksheet_data['worksheet']['pdf_path']:
-        flash('PDF not found!', 'error')
+        job = WorksheetService.get_pdf_job(worksheet_id) if worksheet_data else None
+        if job and job.status in render_jobs.PENDING:
+            flash('PDF is still being generated - try again in a moment.', 'info')
+        elif job and job.status == 'failed':
+            flash(f'Error generating PDF: {job.error}', 'error')
+        else:
+            flash('PDF not found!', 'error')
         return redirect(url_for('worksheet.view_worksheet', worksheet_id=worksheet_id))
     
     pdf_path = worksheet_data['worksheet']['pdf_path']
@@ -301,4 +421,4 @@ def download_worksheet(worksheet_id):
                         download_name=f"worksheet_{worksheet_id}.pdf")
     else:
         flash('PDF file not found!', 'error')
-        return redirect(url_for('worksheet.view_worksheet', worksheet_id=worksheet_id))
\ No newline at end of file
+        return redirect(url_for('worksheet.view_worksheet', worksheet_id=worksheet_id))
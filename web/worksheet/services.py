@@ -1,5 +1,6 @@
 # web/worksheet/services.py
 from utils.db_connection import get_db
+from utils import question_index, render_jobs
 import json
 import random
 from datetime import datetime
@@ -11,23 +12,16 @@ class QuestionService:
                        question_type=None, answer=None, is_template=False, template_params=None):
         """Add a new question to the bank with optional template support."""
         with get_db() as db:
-            db.execute('''
-                INSERT INTO questions 
-                (subtopic_id, question_text, answer, difficulty_level, 
-                 time_estimate_minutes, space_required, question_type, 
+            question_index.bump(db, subtopic_id)
+            return db.insert_returning_id('''
+                INSERT INTO questions
+                (subtopic_id, question_text, answer, difficulty_level,
+                 time_estimate_minutes, space_required, question_type,
                  created_by_tutor_id, active, is_template, template_params)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (subtopic_id, question_text, answer, difficulty_level, 
-                  time_estimate, space_required, question_type, tutor_id, 
+            ''', (subtopic_id, question_text, answer, difficulty_level,
+                  time_estimate, space_required, question_type, tutor_id,
                   True, is_template, template_params))
-            
-            # Get the inserted ID
-            result = db.execute("SELECT id FROM questions WHERE subtopic_id = ? AND question_text = ? ORDER BY id DESC LIMIT 1", 
-                              (subtopic_id, question_text)).fetchone()
-            if isinstance(result, dict):
-                return result['id']
-            else:
-                return result[0] if result else None
 
     @staticmethod
     def parse_template_variables(question_text):
@@ -100,29 +94,24 @@ class QuestionService:
     
     @staticmethod
     def get_questions_by_subtopic(subtopic_id, difficulty_level=None):
-        """Get questions for a subtopic, optionally filtered by difficulty."""
-        with get_db() as db:
-            if difficulty_level:
-                result = db.execute('''
-                    SELECT * FROM questions 
-                    WHERE subtopic_id = ? AND difficulty_level = ? AND active = true
-                    ORDER BY created_date DESC
-                ''', (subtopic_id, difficulty_level))
-            else:
-                result = db.execute('''
-                    SELECT * FROM questions 
-                    WHERE subtopic_id = ? AND active = true
-                    ORDER BY difficulty_level, created_date DESC
-                ''', (subtopic_id,))
-            
-            questions = result.fetchall()
-            
-            # Convert to list of dictionaries
-            if questions and isinstance(questions[0], dict):
-                return questions
-            else:
-                # Handle Row objects - convert to dict
-                return [dict(q) for q in questions]
+        """Get questions for a subtopic, optionally filtered by difficulty.
+        
+        Served from the in-memory question index; rows carry the columns in
+        question_index.QUESTION_COLUMNS.
+        """
+        with get_db(readonly=True) as db:
+            return question_index.get(db, subtopic_id).questions(difficulty_level or None)
+    
+    @staticmethod
+    def sample_questions(subtopic_id, counts):
+        """Pick random active questions per difficulty from the question index.
+        
+        counts maps difficulty_level to how many questions to pick. Returns
+        the chosen rows ordered by difficulty; a difficulty with too few
+        questions returns all it has.
+        """
+        with get_db(readonly=True) as db:
+            return question_index.get(db, subtopic_id).sample(counts)
     
     @staticmethod
     def update_question(question_id, question_text=None, answer=None,
@@ -156,6 +145,7 @@ class QuestionService:
                 params.append(question_id)
                 query = f"UPDATE questions SET {', '.join(updates)} WHERE id = ?"
                 db.execute(query, params)
+                question_index.bump_question(db, question_id)
     
     @staticmethod
     def get_question(question_id):
@@ -164,61 +154,39 @@ class QuestionService:
             result = db.execute('''
                 SELECT * FROM questions WHERE id = ?
             ''', (question_id,))
-            question = result.fetchone()
-            
-            if question:
-                return dict(question) if isinstance(question, dict) else dict(question)
-            return None
+            return result.fetchone()
     
     @staticmethod
     def delete_question(question_id):
         """Soft delete a question (mark as inactive)."""
         with get_db() as db:
             db.execute('UPDATE questions SET active = false WHERE id = ?', (question_id,))
+            question_index.bump_question(db, question_id)
     
     @staticmethod
     def get_question_stats(subtopic_id):
-        """Get statistics about questions for a subtopic."""
-        with get_db() as db:
-            result_query = db.execute('''
-                SELECT 
-                    difficulty_level,
-                    COUNT(*) as count,
-                    AVG(time_estimate_minutes) as avg_time
-                FROM questions 
-                WHERE subtopic_id = ? AND active = true
-                GROUP BY difficulty_level
-            ''', (subtopic_id,))
-            stats = result_query.fetchall()
-            
-            # Convert to dictionary format with default values
-            result = {
-                'easy': {'count': 0, 'avg_time': 0},
-                'medium': {'count': 0, 'avg_time': 0},
-                'hard': {'count': 0, 'avg_time': 0}
-            }
-            
-            for stat in stats:
-                if isinstance(stat, dict):
-                    difficulty = stat['difficulty_level']
-                    count = stat['count']
-                    avg_time = stat['avg_time']
-                else:
-                    difficulty = stat[0]
-                    count = stat[1]
-                    avg_time = stat[2]
-                
-                if difficulty == 1:
-                    result['easy'] = {'count': count, 'avg_time': avg_time or 0}
-                elif difficulty == 2:
-                    result['medium'] = {'count': count, 'avg_time': avg_time or 0}
-                elif difficulty == 3:
-                    result['hard'] = {'count': count, 'avg_time': avg_time or 0}
-            
-            return result
+        """Get statistics about questions for a subtopic.
+        
+        Returns {'easy'|'medium'|'hard': {'count', 'avg_time'}}, from the
+        in-memory question index.
+        """
+        with get_db(readonly=True) as db:
+            return question_index.get(db, subtopic_id).stats()
 
 
 class WorksheetService:
+    @staticmethod
+    def _distribution_for_mastery(mastery):
+        """Recommended (level, distribution) for a mastery level (None = not assessed)."""
+        if not mastery or mastery <= 3:
+            return 'easy', {'easy': 70, 'medium': 25, 'hard': 5}
+        elif mastery <= 6:
+            return 'medium', {'easy': 30, 'medium': 50, 'hard': 20}
+        elif mastery <= 8:
+            return 'hard', {'easy': 20, 'medium': 40, 'hard': 40}
+        else:
+            return 'challenge', {'easy': 10, 'medium': 30, 'hard': 60}
+    
     @staticmethod
     def get_recommended_difficulty(student_id, subtopic_id):
         """Recommend worksheet difficulty based on student's current mastery."""
@@ -230,25 +198,67 @@ class WorksheetService:
             ''', (student_id, subtopic_id))
             progress = result.fetchone()
             
-            if not progress:
-                return 'easy', {'easy': 70, 'medium': 25, 'hard': 5}
-            
-            if isinstance(progress, dict):
-                mastery = progress['mastery_level']
-            else:
-                mastery = progress[0]
-            
-            if not mastery or mastery == 0:
-                return 'easy', {'easy': 70, 'medium': 25, 'hard': 5}
-            
-            if mastery <= 3:
-                return 'easy', {'easy': 70, 'medium': 25, 'hard': 5}
-            elif mastery <= 6:
-                return 'medium', {'easy': 30, 'medium': 50, 'hard': 20}
-            elif mastery <= 8:
-                return 'hard', {'easy': 20, 'medium': 40, 'hard': 40}
-            else:
-                return 'challenge', {'easy': 10, 'medium': 30, 'hard': 60}
+            return WorksheetService._distribution_for_mastery(progress.mastery_level if progress else None)
+    
+    @staticmethod
+    def get_recommended_difficulties(student_ids, subtopic_id):
+        """Recommend worksheet difficulty for many students in one query.
+        
+        Returns {student_id: (level, distribution)} for the students that
+        exist; unknown ids are left out.
+        """
+        student_ids = list(student_ids)
+        if not student_ids:
+            return {}
+        placeholders = ', '.join(['?'] * len(student_ids))
+        with get_db() as db:
+            rows = db.execute(f'''
+                SELECT s.id, sp.mastery_level
+                FROM students s
+                LEFT JOIN subtopic_progress sp ON sp.student_id = s.id AND sp.subtopic_id = ?
+                WHERE s.id IN ({placeholders})
+            ''', [subtopic_id, *student_ids]).fetchall()
+            
+            return {row.id: WorksheetService._distribution_for_mastery(row.mastery_level) for row in rows}
+    
+    @staticmethod
+    def _question_counts(difficulty_distribution, total_questions):
+        """{difficulty_level: count} for a percentage distribution; hard takes the rounding."""
+        easy_count = int(total_questions * difficulty_distribution['easy'] / 100)
+        medium_count = int(total_questions * difficulty_distribution['medium'] / 100)
+        hard_count = total_questions - easy_count - medium_count
+        return {1: easy_count, 2: medium_count, 3: hard_count}
+    
+    @staticmethod
+    def _warn_shortfall(counts, selected_questions):
+        for level, label in ((1, 'easy'), (2, 'medium'), (3, 'hard')):
+            available = sum(1 for question in selected_questions if question.difficulty_level == level)
+            if available < counts[level]:
+                print(f"Warning: Only {available} {label} questions available")
+    
+    @staticmethod
+    def _worksheet_question_rows(worksheet_id, selected_questions):
+        """worksheet_questions rows for the chosen questions, instantiating templates."""
+        question_rows = []
+        for i, question in enumerate(selected_questions, 1):
+            custom_text = None
+            if question.get('is_template'):
+                # Generate a specific instance from the template
+                custom_text, generated_answer, values = QuestionService.generate_question_from_template(
+                    question['question_text'],
+                    question.get('template_params')
+                )
+            question_rows.append((worksheet_id, question['id'], i, question['space_required'], custom_text))
+        return question_rows
+    
+    @staticmethod
+    def _get_subtopic_names(db, subtopic_id):
+        return db.execute('''
+            SELECT s.subtopic_name, mt.topic_name 
+            FROM subtopics s
+            JOIN main_topics mt ON s.main_topic_id = mt.id
+            WHERE s.id = ?
+        ''', (subtopic_id,)).fetchone()
     
     @staticmethod
     def generate_worksheet(student_id, subtopic_id, tutor_id, 
@@ -259,121 +269,112 @@ class WorksheetService:
             # Get student and subtopic info
             student_result = db.execute('SELECT name FROM students WHERE id = ?', (student_id,))
             student = student_result.fetchone()
-            
-            subtopic_result = db.execute('''
-                SELECT s.subtopic_name, mt.topic_name 
-                FROM subtopics s
-                JOIN main_topics mt ON s.main_topic_id = mt.id
-                WHERE s.id = ?
-            ''', (subtopic_id,))
-            subtopic = subtopic_result.fetchone()
+            subtopic = WorksheetService._get_subtopic_names(db, subtopic_id)
             
             if not student or not subtopic:
                 raise ValueError("Invalid student or subtopic")
             
-            # Convert results to consistent format
-            if isinstance(student, dict):
-                student_name = student['name']
-            else:
-                student_name = student[0]
-            
-            if isinstance(subtopic, dict):
-                topic_name = subtopic['topic_name']
-                subtopic_name = subtopic['subtopic_name']
-            else:
-                subtopic_name = subtopic[0]
-                topic_name = subtopic[1]
+            subtopic_name, topic_name = subtopic
             
             # Get recommended difficulty if not provided
             if not difficulty_distribution:
                 _, difficulty_distribution = WorksheetService.get_recommended_difficulty(
                     student_id, subtopic_id)
             
-            # Calculate number of questions per difficulty
-            easy_count = int(total_questions * difficulty_distribution['easy'] / 100)
-            medium_count = int(total_questions * difficulty_distribution['medium'] / 100)
-            hard_count = total_questions - easy_count - medium_count
-            
-            # Get questions from the bank
-            selected_questions = []
-            
-            # Get easy questions
-            easy_questions = QuestionService.get_questions_by_subtopic(subtopic_id, 1)
-            if len(easy_questions) >= easy_count:
-                selected_questions.extend(random.sample(easy_questions, easy_count))
-            else:
-                selected_questions.extend(easy_questions)
-                print(f"Warning: Only {len(easy_questions)} easy questions available")
-            
-            # Get medium questions
-            medium_questions = QuestionService.get_questions_by_subtopic(subtopic_id, 2)
-            if len(medium_questions) >= medium_count:
-                selected_questions.extend(random.sample(medium_questions, medium_count))
-            else:
-                selected_questions.extend(medium_questions)
-                print(f"Warning: Only {len(medium_questions)} medium questions available")
-            
-            # Get hard questions
-            hard_questions = QuestionService.get_questions_by_subtopic(subtopic_id, 3)
-            if len(hard_questions) >= hard_count:
-                selected_questions.extend(random.sample(hard_questions, hard_count))
-            else:
-                selected_questions.extend(hard_questions)
-                print(f"Warning: Only {len(hard_questions)} hard questions available")
+            # Pick questions from the bank, all difficulties at once
+            counts = WorksheetService._question_counts(difficulty_distribution, total_questions)
+            selected_questions = QuestionService.sample_questions(subtopic_id, counts)
+            WorksheetService._warn_shortfall(counts, selected_questions)
             
             # Create worksheet record
             if not title:
                 title = f"{topic_name} - {subtopic_name} Practice"
             
-            db.execute('''
-                INSERT INTO worksheets 
-                (student_id, subtopic_id, title, difficulty_level, 
+            worksheet_id = db.insert_returning_id('''
+                INSERT INTO worksheets
+                (student_id, subtopic_id, title, difficulty_level,
                  generated_by_tutor_id, status)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (student_id, subtopic_id, title, 'mixed', tutor_id, 'draft'))
+
+            # Save all questions in one batch
+            db.insert_many(
+                'worksheet_questions',
+                ('worksheet_id', 'question_id', 'question_order', 'space_allocated', 'custom_question_text'),
+                WorksheetService._worksheet_question_rows(worksheet_id, selected_questions)
+            )
+
+            return worksheet_id
+    
+    @staticmethod
+    def generate_worksheets(student_ids, subtopic_id, tutor_id,
+                            difficulty_distribution=None, total_questions=20,
+                            title=None):
+        """Generate the same subtopic worksheet for a group of students.
+        
+        Recommendations come from one query, every student's questions are
+        sampled from one load of the question index, and all worksheets and
+        their questions are inserted in one transaction, so the cost barely
+        grows with the group. Without difficulty_distribution each student
+        gets their own recommended mix.
+        
+        Returns {student_id: worksheet_id} in the order given; raises
+        ValueError (and creates nothing) if any student or the subtopic is
+        unknown.
+        """
+        student_ids = list(dict.fromkeys(student_ids))
+        if not student_ids:
+            raise ValueError("No students selected")
+        
+        with get_db() as db:
+            subtopic = WorksheetService._get_subtopic_names(db, subtopic_id)
+            if not subtopic:
+                raise ValueError("Invalid subtopic")
             
-            # Get the inserted worksheet ID
-            worksheet_result = db.execute('''
-                SELECT id FROM worksheets 
-                WHERE student_id = ? AND subtopic_id = ? AND title = ?
-                ORDER BY id DESC LIMIT 1
-            ''', (student_id, subtopic_id, title))
-            worksheet_row = worksheet_result.fetchone()
+            recommended = WorksheetService.get_recommended_difficulties(student_ids, subtopic_id)
+            missing = [student_id for student_id in student_ids if student_id not in recommended]
+            if missing:
+                raise ValueError(f"Invalid student(s): {', '.join(str(student_id) for student_id in missing)}")
             
-            if isinstance(worksheet_row, dict):
-                worksheet_id = worksheet_row['id']
-            else:
-                worksheet_id = worksheet_row[0]
+            subtopic_name, topic_name = subtopic
+            if not title:
+                title = f"{topic_name} - {subtopic_name} Practice"
             
-            # Add questions to worksheet
-            for i, question in enumerate(selected_questions, 1):
-                if question.get('is_template'):
-                    # Generate a specific instance from the template
-                    generated_text, generated_answer, values = QuestionService.generate_question_from_template(
-                        question['question_text'],
-                        question.get('template_params')
-                    )
-                    
-                    # Save with generated text
-                    db.execute('''
-                        INSERT INTO worksheet_questions 
-                        (worksheet_id, question_id, question_order, space_allocated, custom_question_text)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (worksheet_id, question['id'], i, question['space_required'], generated_text))
-                else:
-                    # Regular static question
-                    db.execute('''
-                        INSERT INTO worksheet_questions 
-                        (worksheet_id, question_id, question_order, space_allocated)
-                        VALUES (?, ?, ?, ?)
-                    ''', (worksheet_id, question['id'], i, question['space_required']))
+            # One pool for the whole group
+            pool = question_index.get(db, subtopic_id)
+            selections = []
+            needed = {1: 0, 2: 0, 3: 0}
+            for student_id in student_ids:
+                distribution = difficulty_distribution or recommended[student_id][1]
+                counts = WorksheetService._question_counts(distribution, total_questions)
+                selections.append(pool.sample(counts))
+                needed = {level: max(needed[level], counts[level]) for level in needed}
+            available = pool.stats()
+            for level, label in ((1, 'easy'), (2, 'medium'), (3, 'hard')):
+                if available[label]['count'] < needed[level]:
+                    print(f"Warning: Only {available[label]['count']} {label} questions available")
+            
+            worksheet_ids = db.insert_many_returning_ids(
+                'worksheets',
+                ('student_id', 'subtopic_id', 'title', 'difficulty_level', 'generated_by_tutor_id', 'status'),
+                [(student_id, subtopic_id, title, 'mixed', tutor_id, 'draft') for student_id in student_ids]
+            )
             
-            return worksheet_id
+            question_rows = []
+            for worksheet_id, selected_questions in zip(worksheet_ids, selections):
+                question_rows.extend(WorksheetService._worksheet_question_rows(worksheet_id, selected_questions))
+            db.insert_many(
+                'worksheet_questions',
+                ('worksheet_id', 'question_id', 'question_order', 'space_allocated', 'custom_question_text'),
+                question_rows
+            )
+            
+            return dict(zip(student_ids, worksheet_ids))
     
     @staticmethod
     def get_worksheet(worksheet_id):
         """Get worksheet with all questions."""
-        with get_db() as db:
+        with get_db(readonly=True) as db:
             # Get worksheet info
             worksheet_result = db.execute('''
                 SELECT w.*, s.name as student_name, sub.subtopic_name, mt.topic_name
@@ -402,21 +403,9 @@ class WorksheetService:
                 WHERE wq.worksheet_id = ?
                 ORDER BY wq.question_order
             ''', (worksheet_id,))
-            questions = questions_result.fetchall()
-            
-            # Convert to consistent format
-            worksheet_dict = dict(worksheet) if isinstance(worksheet, dict) else dict(worksheet)
-            questions_list = []
-            
-            for q in questions:
-                if isinstance(q, dict):
-                    questions_list.append(q)
-                else:
-                    questions_list.append(dict(q))
-            
             return {
-                'worksheet': worksheet_dict,
-                'questions': questions_list
+                'worksheet': worksheet,
+                'questions': questions_result.fetchall()
             }
     
     @staticmethod
@@ -442,11 +431,18 @@ class WorksheetService:
                 db.execute(query, params)
     
     @staticmethod
-    def finalize_worksheet(worksheet_id, pdf_path):
-        """Mark worksheet as finalized with PDF path."""
+    def queue_pdf(worksheet_id):
+        """Queue the worksheet's PDF render and start it if a render slot is free.
+        
+        The worksheet is marked finalized with its pdf_path once the render
+        finishes; poll get_pdf_job() for progress.
+        """
+        with get_db() as db:
+            render_jobs.enqueue(db, worksheet_id)
+        render_jobs.pump()
+    
+    @staticmethod
+    def get_pdf_job(worksheet_id):
+        """The worksheet's render job (status, error, pdf_path), or None if never queued."""
         with get_db() as db:
-            db.execute('''
-                UPDATE worksheets 
-                SET status = ?, pdf_path = ?
-                WHERE id = ?
-            ''', ('finalized', pdf_path, worksheet_id))
\ No newline at end of file
+            return render_jobs.get_job(db, worksheet_id)